@@ -0,0 +1,161 @@
+# admin.py - Privileged diagnostics endpoints
+#
+# Every route requires the X-Admin-Token header to match ADMIN_TOKEN; when
+# ADMIN_TOKEN is unset the routes are disabled.
+
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+from admission import admission_report
+from stage_guard import breaker_report
+from audio_decoder import decoder_report
+from live_audio import live_report
+from logs import log_report, set_level
+from resources import resource_report
+from jobs import queue_report
+from similarity import session_matches
+from session_store import load_session
+from profiling import list_artifacts, artifact_summary, artifact_path
+from memory import (
+    memory_report, enforce_budgets, set_budget, start_tracing, stop_tracing,
+    take_baseline, snapshot_diff
+)
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(403, "Admin token required")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+# -------------------------
+# Profiles
+# -------------------------
+@router.get("/profiles")
+async def get_profiles():
+    return {"profiles": list_artifacts()}
+
+@router.get("/profiles/{artifact_id}")
+async def get_profile(artifact_id: str, top: int = 40):
+    summary = artifact_summary(artifact_id, top)
+    if not summary: raise HTTPException(404, "Profile not found")
+    return summary
+
+@router.get("/profiles/{artifact_id}/raw")
+async def get_profile_raw(artifact_id: str):
+    path = artifact_path(artifact_id, ".prof")
+    if not path: raise HTTPException(404, "Profile not found")
+    return FileResponse(path, media_type="application/octet-stream",
+                        filename=os.path.basename(path))
+
+
+# -------------------------
+# Memory
+# -------------------------
+@router.get("/memory")
+async def get_memory():
+    return memory_report()
+
+@router.post("/memory/evict")
+async def evict_memory():
+    return {"evicted": enforce_budgets(force=True)}
+
+@router.put("/memory/budgets/{cache_name}")
+async def put_memory_budget(cache_name: str, budget_bytes: int):
+    try:
+        set_budget(cache_name, budget_bytes)
+    except KeyError:
+        raise HTTPException(404, "Unknown cache")
+    return {"evicted": enforce_budgets(force=True)}
+
+@router.post("/memory/tracemalloc/start")
+async def start_tracemalloc(frames: int = 1):
+    start_tracing(frames)
+    return {"tracing": True}
+
+@router.post("/memory/tracemalloc/stop")
+async def stop_tracemalloc():
+    stop_tracing()
+    return {"tracing": False}
+
+@router.post("/memory/snapshot")
+async def memory_snapshot():
+    return {"baseline_traces": take_baseline()}
+
+@router.get("/memory/snapshot/diff")
+async def memory_snapshot_diff(top: int = 20, key_type: str = "lineno"):
+    if key_type not in ("lineno", "filename", "traceback"):
+        raise HTTPException(400, "key_type must be lineno, filename or traceback")
+    diff = snapshot_diff(top, key_type)
+    if diff is None: raise HTTPException(409, "tracemalloc is not tracing")
+    return {"top": diff}
+
+
+# -------------------------
+# Admission
+# -------------------------
+@router.get("/admission")
+async def get_admission():
+    return admission_report()
+
+
+# -------------------------
+# Stage breakers
+# -------------------------
+@router.get("/breakers")
+async def get_breakers():
+    return breaker_report()
+
+@router.get("/decoders")
+async def get_decoders():
+    return decoder_report()
+
+@router.get("/live-audio")
+async def get_live_audio():
+    return live_report()
+
+@router.get("/resources")
+async def get_resources():
+    return resource_report()
+
+
+# -------------------------
+# Logging
+# -------------------------
+@router.get("/logs")
+async def get_logs():
+    return log_report()
+
+@router.put("/logs/levels/{logger_name}")
+async def put_log_level(logger_name: str, level: str):
+    try:
+        set_level(logger_name, level)
+    except ValueError:
+        raise HTTPException(400, "Unknown log level")
+    return log_report()
+
+
+# -------------------------
+# Jobs
+# -------------------------
+@router.get("/jobs")
+async def get_jobs():
+    return {"jobs": queue_report()}
+
+
+# -------------------------
+# Similarity
+# -------------------------
+@router.get("/similarity/{session_id}")
+async def get_similarity(session_id: str):
+    session = await run_in_threadpool(load_session, session_id)
+    if not session: raise HTTPException(404, "Session not found")
+    return {"session_id": session_id,
+            "questions": await run_in_threadpool(session_matches, session)}
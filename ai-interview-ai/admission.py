@@ -0,0 +1,210 @@
+# admission.py - Admission control and load shedding by request cost class
+#
+# Every evaluation is admitted into a cost class with its own concurrency
+# budget and queue. All classes also share ADMISSION_TOTAL slots; when a
+# slot frees up, waiters are served cheapest class first, and the last
+# ADMISSION_TEXT_RESERVED shared slots are kept for text-only requests so
+# media floods cannot starve them. Requests that cannot be queued, or wait
+# longer than ADMISSION_MAX_WAIT_SECONDS, are rejected with Retry-After.
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+
+from starlette.concurrency import run_in_threadpool
+
+from profiling import profiled_call
+
+# Lower value = cheaper = served first
+COST_CLASSES = {
+    "text": {"priority": 0, "limit": 16, "queue": 64},
+    "pdf": {"priority": 1, "limit": 2, "queue": 8},
+    "image": {"priority": 2, "limit": 4, "queue": 16},
+    "audio": {"priority": 3, "limit": 2, "queue": 8},
+}
+for _name, _cls in COST_CLASSES.items():
+    _cls["limit"] = int(os.getenv(f"ADMISSION_LIMIT_{_name.upper()}", _cls["limit"]))
+    _cls["queue"] = int(os.getenv(f"ADMISSION_QUEUE_{_name.upper()}", _cls["queue"]))
+
+TOTAL_SLOTS = int(os.getenv("ADMISSION_TOTAL", "16"))
+TEXT_RESERVED = int(os.getenv("ADMISSION_TEXT_RESERVED", "4"))
+MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10"))
+MAX_RETRY_AFTER = 60
+
+_state = {
+    name: {"active": 0, "waiting": 0, "admitted": 0, "rejected": 0, "avg_seconds": 1.0}
+    for name in COST_CLASSES
+}
+_total_active = 0
+_waiters = []              # heap of (priority, seq, cost_class, future)
+_seq = itertools.count()
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def cost_class_for(image=None, audio=None) -> str:
+    """The most expensive stage a request will run decides its class."""
+    if audio is not None:
+        return "audio"
+    if image is not None:
+        return "image"
+    return "text"
+
+
+# ============================
+# SLOTS
+# ============================
+def _has_capacity(cost_class: str) -> bool:
+    if _state[cost_class]["active"] >= COST_CLASSES[cost_class]["limit"]:
+        return False
+    shared = TOTAL_SLOTS if cost_class == "text" else TOTAL_SLOTS - TEXT_RESERVED
+    return _total_active < shared
+
+
+def _take(cost_class: str):
+    global _total_active
+    _state[cost_class]["active"] += 1
+    _state[cost_class]["admitted"] += 1
+    _total_active += 1
+
+
+def _dispatch():
+    """Hand free slots to queued requests, cheapest class first."""
+    blocked = []
+    while _waiters:
+        entry = heapq.heappop(_waiters)
+        _, _, cost_class, future = entry
+        if future.done():
+            continue
+        if _has_capacity(cost_class):
+            _take(cost_class)
+            future.set_result(True)
+        else:
+            blocked.append(entry)
+    for entry in blocked:
+        heapq.heappush(_waiters, entry)
+
+
+def _release(cost_class: str, seconds: float):
+    global _total_active
+    state = _state[cost_class]
+    state["active"] -= 1
+    _total_active -= 1
+    # Smoothed service time, used to estimate Retry-After
+    state["avg_seconds"] = 0.8 * state["avg_seconds"] + 0.2 * seconds
+    _dispatch()
+
+
+def retry_after(cost_class: str) -> int:
+    state = _state[cost_class]
+    limit = max(COST_CLASSES[cost_class]["limit"], 1)
+    backlog = state["waiting"] + state["active"]
+    estimate = state["avg_seconds"] * backlog / limit
+    return int(min(max(estimate, 1), MAX_RETRY_AFTER))
+
+
+def _reject(cost_class: str, status: int, detail: str):
+    _state[cost_class]["rejected"] += 1
+    return AdmissionRejected(status, detail, retry_after(cost_class))
+
+
+# ============================
+# ADMISSION
+# ============================
+async def acquire(cost_class: str):
+    state = _state[cost_class]
+    if not _waiters and _has_capacity(cost_class):
+        _take(cost_class)
+        return
+
+    if state["waiting"] >= COST_CLASSES[cost_class]["queue"]:
+        raise _reject(cost_class, 429, f"Too many {cost_class} evaluations queued")
+
+    # Join the queue and let the dispatcher decide, so a cheaper waiter
+    # is never overtaken but an idle class is not held up either
+    future = asyncio.get_running_loop().create_future()
+    priority = COST_CLASSES[cost_class]["priority"]
+    heapq.heappush(_waiters, (priority, next(_seq), cost_class, future))
+    _dispatch()
+    if future.done():
+        return
+    state["waiting"] += 1
+    try:
+        await asyncio.wait_for(asyncio.shield(future), MAX_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        if future.done() and not future.cancelled():
+            # Granted just as the wait ran out; the slot is ours
+            return
+        future.cancel()
+        raise _reject(cost_class, 503, f"Server busy with {cost_class} evaluations")
+    except asyncio.CancelledError:
+        if future.done() and not future.cancelled():
+            _release(cost_class, 0.0)
+        future.cancel()
+        raise
+    finally:
+        state["waiting"] -= 1
+
+
+class Ticket:
+    """A held admission slot; releasing it twice is a no-op."""
+
+    def __init__(self, cost_class: str):
+        self.cost_class = cost_class
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            _release(self.cost_class, time.monotonic() - self.started)
+
+    async def aclose(self):
+        # Waiters are resolved on the event loop, never from a worker thread
+        self.release()
+
+
+async def admit(cost_class: str) -> Ticket:
+    await acquire(cost_class)
+    return Ticket(cost_class)
+
+
+@asynccontextmanager
+async def admitted(cost_class: str):
+    ticket = await admit(cost_class)
+    try:
+        yield ticket
+    finally:
+        ticket.release()
+
+
+async def run_admitted(cost_class: str, fn, *args):
+    """
+    Run a blocking evaluation under the class budget, off the event loop so
+    cheap requests keep being admitted while it runs.
+    """
+    async with admitted(cost_class):
+        return await run_in_threadpool(profiled_call, fn, *args)
+
+
+def admission_report() -> dict:
+    return {
+        "total_slots": TOTAL_SLOTS,
+        "total_active": _total_active,
+        "text_reserved": TEXT_RESERVED,
+        "max_wait_seconds": MAX_WAIT_SECONDS,
+        "classes": {
+            name: dict(_state[name], limit=cls["limit"], queue=cls["queue"],
+                       avg_seconds=round(_state[name]["avg_seconds"], 3))
+            for name, cls in COST_CLASSES.items()
+        },
+    }
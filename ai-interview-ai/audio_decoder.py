@@ -0,0 +1,318 @@
+# audio_decoder.py - Long-lived audio decoder workers and a WAV fast path
+#
+# Every audio upload ends up as 16 kHz mono 16-bit PCM. Integer PCM WAV is
+# converted in-process with numpy/scipy and never leaves the worker. Any
+# other container (webm/ogg/mp4/mp3/flac, float WAV) goes over a pipe to
+# one of AUDIO_DECODER_WORKERS decoder processes, which decode it with
+# libav (PyAV) and send the PCM back, so no ffmpeg process is spawned per
+# conversion.
+#
+# Decoder processes are started with "spawn" after the web worker boots.
+# They are pinged every AUDIO_DECODER_HEALTH_SECONDS, replaced when they
+# crash, miss a ping or overrun the decode deadline (the audio_decoder
+# stage deadline), and recycled after AUDIO_DECODER_MAX_JOBS decodes.
+
+import io
+import os
+import math
+import time
+import wave
+import queue
+import threading
+import multiprocessing
+
+import numpy as np
+
+from stage_guard import ENGINES
+from logs import get_logger
+
+SAMPLE_RATE = 16000
+POOL_SIZE = max(int(os.getenv("AUDIO_DECODER_WORKERS", "2")), 1)
+HEALTH_SECONDS = float(os.getenv("AUDIO_DECODER_HEALTH_SECONDS", "30"))
+MAX_JOBS = int(os.getenv("AUDIO_DECODER_MAX_JOBS", "500"))
+DECODE_TIMEOUT = ENGINES["audio_decoder"]["deadline"]
+PING_TIMEOUT = 2.0
+
+log = get_logger(__name__)
+
+_fast_path = {"decodes": 0}
+
+_PCM_TYPES = {1: np.uint8, 2: np.dtype("<i2"), 4: np.dtype("<i4")}
+
+
+class DecodeError(Exception):
+    pass
+
+
+# ============================
+# WAV FAST PATH
+# ============================
+def wav_to_pcm(data: bytes):
+    """16 kHz mono s16 PCM from integer PCM WAV bytes, or None if unsupported."""
+    try:
+        with wave.open(io.BytesIO(data)) as w:
+            channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+            frames = w.readframes(w.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    if width not in _PCM_TYPES or not channels or not rate:
+        return None
+    if channels == 1 and width == 2 and rate == SAMPLE_RATE:
+        return frames
+
+    samples = np.frombuffer(frames[:len(frames) - len(frames) % (width * channels)],
+                            dtype=_PCM_TYPES[width]).astype(np.float32)
+    if width == 1:
+        samples -= 128.0
+    samples /= float(2 ** (8 * width - 1))
+    return samples_to_pcm(samples, channels, rate)
+
+
+def samples_to_pcm(samples, channels: int, rate: int) -> bytes:
+    """16 kHz mono s16 PCM from interleaved float samples in [-1, 1]."""
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE:
+        from scipy.signal import resample_poly
+        g = math.gcd(rate, SAMPLE_RATE)
+        samples = resample_poly(samples, SAMPLE_RATE // g, rate // g)
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+class PcmResampler:
+    """
+    samples_to_pcm for a stream that arrives in chunks. Resampling each
+    chunk on its own zero-pads both of its edges (a click at every chunk
+    boundary) and rounds its output length (drift). Instead, input is
+    buffered and resampled in blocks of whole multiples of the rate ratio,
+    each with `pad` samples of real context either side, so the output is
+    the same as resampling the whole recording at once, `pad` samples late.
+    """
+
+    def __init__(self, channels: int, rate: int):
+        self.channels = channels
+        g = math.gcd(rate, SAMPLE_RATE)
+        self.up, self.down = SAMPLE_RATE // g, rate // g
+        # resample_poly's default filter reaches 10 * max(up, down) upsampled
+        # samples either way; the context is rounded up to whole input blocks
+        reach = 10 * max(self.up, self.down) // self.up + 1
+        self.pad = -(-reach // self.down) * self.down
+        self._buffer = np.zeros(self.pad)   # the silence before the recording
+
+    def convert(self, samples) -> bytes:
+        """PCM for the input so far, except the last `pad` samples' worth."""
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        if self.up == self.down:
+            return samples_to_pcm(samples, 1, SAMPLE_RATE)
+        from scipy.signal import resample_poly
+
+        self._buffer = np.concatenate([self._buffer, samples])
+        ready = (len(self._buffer) - 2 * self.pad) // self.down * self.down
+        if ready <= 0:
+            return b""
+        end = self.pad + ready
+        out = resample_poly(self._buffer[:end + self.pad], self.up, self.down)
+        self._buffer = self._buffer[end - self.pad:]
+        return samples_to_pcm(out[self.pad * self.up // self.down:end * self.up // self.down],
+                              1, SAMPLE_RATE)
+
+    def flush(self) -> bytes:
+        """PCM for the rest of the input, at the end of the recording."""
+        if self.up == self.down or len(self._buffer) <= self.pad:
+            return b""
+        from scipy.signal import resample_poly
+
+        out = resample_poly(self._buffer, self.up, self.down)
+        self._buffer = self._buffer[-self.pad:]
+        return samples_to_pcm(out[self.pad * self.up // self.down:], 1, SAMPLE_RATE)
+
+
+def write_wav(path: str, pcm: bytes):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm)
+
+
+# ============================
+# DECODER PROCESS
+# ============================
+def _decode(data: bytes) -> bytes:
+    import av
+
+    out = bytearray()
+    with av.open(io.BytesIO(data)) as container:
+        if not container.streams.audio:
+            raise ValueError("no audio stream")
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+        for frame in container.decode(container.streams.audio[0]):
+            for pcm in resampler.resample(frame):
+                out += pcm.to_ndarray().tobytes()
+        for pcm in resampler.resample(None):
+            out += pcm.to_ndarray().tobytes()
+    return bytes(out)
+
+
+def _decoder_main(conn):
+    """Decoder process loop: ("decode", bytes) -> ("ok", pcm) | ("error", msg)."""
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return
+        if msg[0] == "ping":
+            conn.send(("pong",))
+            continue
+        try:
+            conn.send(("ok", _decode(msg[1])))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+# ============================
+# POOL
+# ============================
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_decoder_main, args=(child,), daemon=True,
+                                   name="audio-decoder")
+        self.process.start()
+        child.close()
+        self.jobs = 0
+
+    def stop(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        self.process.kill()
+        self.process.join(1)
+
+
+class DecoderPool:
+    def __init__(self, size: int = POOL_SIZE):
+        self.size = size
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._stats = {"decodes": 0, "errors": 0, "timeouts": 0,
+                       "restarts": 0, "recycled": 0}
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(_Worker(self._ctx))
+        threading.Thread(target=self._health_loop, daemon=True,
+                         name="audio-decoder-health").start()
+
+    def _replace(self, worker: _Worker, reason: str) -> _Worker:
+        worker.stop()
+        self._stats[reason] += 1
+        return _Worker(self._ctx)
+
+    def _call(self, worker: _Worker, msg: tuple, timeout: float):
+        """Send one request; None when the worker died or timed out."""
+        try:
+            worker.conn.send(msg)
+            if not worker.conn.poll(timeout):
+                return None
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            return None
+
+    def decode(self, data: bytes, timeout: float = DECODE_TIMEOUT) -> bytes:
+        deadline = time.monotonic() + timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise DecodeError("no decoder worker free")
+
+        try:
+            reply = self._call(worker, ("decode", data), max(deadline - time.monotonic(), 0.01))
+            if reply is None:
+                alive = worker.process.is_alive()
+                worker = self._replace(worker, "timeouts" if alive else "restarts")
+                raise DecodeError("decoder timed out" if alive else "decoder crashed")
+            worker.jobs += 1
+            if reply[0] != "ok":
+                self._stats["errors"] += 1
+                raise DecodeError(reply[1])
+            self._stats["decodes"] += 1
+            return reply[1]
+        finally:
+            if MAX_JOBS and worker.jobs >= MAX_JOBS:
+                worker = self._replace(worker, "recycled")
+            self._idle.put(worker)
+
+    def _health_loop(self):
+        while not self._closed:
+            time.sleep(HEALTH_SECONDS)
+            # Check each worker that is idle right now; busy ones are in use
+            for _ in range(self._idle.qsize()):
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if self._call(worker, ("ping",), PING_TIMEOUT) != ("pong",):
+                    log.warning("Audio decoder failed its health check; restarting it")
+                    worker = self._replace(worker, "restarts")
+                self._idle.put(worker)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+    def report(self) -> dict:
+        return dict(self._stats, size=self.size, idle=self._idle.qsize())
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> DecoderPool:
+    global _pool, _pool_pid
+    with _pool_lock:
+        # Processes and pipes do not survive a fork; each web worker owns its pool
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = DecoderPool()
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def stop_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+def decoder_report() -> dict:
+    report = {"size": POOL_SIZE, "started": False}
+    if _pool is not None and _pool_pid == os.getpid():
+        report = dict(_pool.report(), started=True)
+    report["fast_path"] = _fast_path["decodes"]
+    return report
+
+
+# ============================
+# CONVERSION
+# ============================
+def to_pcm(data: bytes, fmt: str = None, timeout: float = DECODE_TIMEOUT) -> bytes:
+    """16 kHz mono s16 PCM from encoded audio bytes."""
+    if fmt in (None, "wav"):
+        pcm = wav_to_pcm(data)
+        if pcm is not None:
+            _fast_path["decodes"] += 1
+            return pcm
+    return get_pool().decode(data, timeout)
+
+
+def to_wav_file(data: bytes, fmt: str, wav_path: str, timeout: float = DECODE_TIMEOUT):
+    write_wav(wav_path, to_pcm(data, fmt, timeout))
@@ -0,0 +1,92 @@
+# cost_check.py - Verify the text-scoring cost bound on adversarial answers
+#
+#   python cost_check.py [--budget 0.5] [--scale 10]
+#
+# Scores every adversarial answer at its base size and at `scale` times
+# that size. Because answers are bounded before scoring (bound_answer),
+# the larger input must not cost meaningfully more than the base one, and
+# neither may exceed the per-answer CPU budget. Exits non-zero on a breach.
+
+import sys
+import json
+import time
+import argparse
+
+from evaluator import evaluate_text_nlp, analyze_sentiment_confidence
+from text_analysis import AnalyzedText, bound_answer, MAX_ANSWER_CHARS
+
+KEYWORDS = ["REST", "caching", "load balancer", "idempotency", "database index"]
+MODEL_ANSWER = (
+    "A scalable REST API uses caching, a load balancer in front of stateless "
+    "services, idempotency keys for retries and a database index on hot paths."
+)
+
+
+def adversarial_corpus(size: int) -> dict:
+    """Answers of roughly `size` characters that stress each text stage."""
+    def fill(unit: str) -> str:
+        return (unit * (size // len(unit) + 1))[:size]
+
+    return {
+        "plain_paste": fill("We used caching and a load balancer for the REST API. "),
+        "one_giant_token": "x" * size,
+        "no_whitespace_punctuation": fill("a.b!c?"),
+        "only_terminators": "." * size,
+        "keyword_prefix_spam": fill("cach cachin caching load balance "),
+        "filler_spam": fill("um uh like basically actually literally "),
+        "hesitation_spam": fill("i think maybe i guess not sure kind of "),
+        "long_words": fill("supercalifragilisticexpialidocious" * 20 + " "),
+        "case_folding_expansion": fill("İstanbul STRASSE ß "),
+        "newline_flood": fill("\n \t\n"),
+        "unique_tokens": " ".join(f"w{i}" for i in range(size // 6))[:size],
+    }
+
+
+def score_seconds(answer: str) -> float:
+    t0 = time.process_time()
+    scored, _ = bound_answer(answer)
+    doc = AnalyzedText(scored)
+    evaluate_text_nlp(scored, MODEL_ANSWER, KEYWORDS, doc)
+    analyze_sentiment_confidence(scored, doc)
+    return time.process_time() - t0
+
+
+def run(budget: float, scale: int) -> dict:
+    # Warm lazily loaded lexicons so the first case is not charged for them
+    score_seconds(MODEL_ANSWER)
+
+    base_size = MAX_ANSWER_CHARS * 2
+    small = adversarial_corpus(base_size)
+    large = adversarial_corpus(base_size * scale)
+
+    report, failures = {}, []
+    for name in small:
+        t_small = score_seconds(small[name])
+        t_large = score_seconds(large[name])
+        report[name] = {"base_seconds": round(t_small, 4),
+                        "scaled_seconds": round(t_large, 4)}
+        if max(t_small, t_large) > budget:
+            failures.append(f"{name}: over the {budget}s budget")
+        # Allow noise, but scaled input must not scale the cost
+        if t_large > t_small * 2 + 0.05:
+            failures.append(f"{name}: cost grew with input size")
+
+    return {"budget_seconds": budget, "scale": scale,
+            "cases": report, "failures": failures}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the text-scoring cost bound")
+    parser.add_argument("--budget", type=float, default=0.5,
+                        help="max CPU seconds to score one answer")
+    parser.add_argument("--scale", type=int, default=10,
+                        help="size multiplier for the scaled corpus")
+    args = parser.parse_args(argv)
+
+    result = run(args.budget, args.scale)
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
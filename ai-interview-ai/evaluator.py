@@ -1,18 +1,34 @@
 # evaluator.py - Complete AI Evaluation Engine
 # Updated: Audio conversion + numpy serialization fix
 
-import re
-import io
 import os
-import tempfile
+import threading
 import numpy as np
-import librosa
-from deepface import DeepFace
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from textblob import TextBlob
+
+from memory import track_load
+from resources import limit_tensorflow, limit_torch
+
+with track_load("librosa"):
+    import librosa
+with track_load("deepface_tensorflow"):
+    from deepface import DeepFace
+    limit_tensorflow()
+with track_load("sklearn"):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
 import speech_recognition as sr
-from pydub import AudioSegment
+
+from profiling import stage_timer
+from face_pipeline import decode_image, locate_face, crop_face
+from text_analysis import AnalyzedText, analyze_reference, terms_of, bound_answer
+from profiles import PROFILES, get_profile, profile_report
+from stage_guard import guarded, StageUnavailable
+from audio_decoder import to_wav_file
+from polarity import polarity as lexicon_polarity, get_lexicon
+from keyword_match import KeywordMatcher
+from logs import get_logger
+
+log = get_logger(__name__)
 
 
 # ============================
@@ -56,39 +72,39 @@ def convert_to_wav(audio_path: str) -> str:
 
     try:
         if not os.path.exists(audio_path):
-            print(f"Audio file not found: {audio_path}")
+            log.warning("Audio file not found", extra={"path": audio_path})
             return audio_path
 
         with open(audio_path, "rb") as f:
             header = f.read(12)
 
         if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
-            print(f"File is already WAV: {audio_path}")
+            log.debug("Audio is already WAV", extra={"path": audio_path})
             return audio_path
 
         source_format = _detect_format_from_header(header, audio_path)
 
-        print(f"Converting {source_format} → WAV: {audio_path} "
-              f"({os.path.getsize(audio_path)} bytes)")
-
-        audio = AudioSegment.from_file(audio_path, format=source_format)
-        audio = audio.set_channels(1)
-        audio = audio.set_frame_rate(16000)
-        audio = audio.set_sample_width(2)
+        log.debug("Converting audio to WAV", extra={
+            "path": audio_path, "format": source_format, "bytes": os.path.getsize(audio_path)
+        })
 
         converted_path = os.path.join(
             os.path.dirname(audio_path),
             os.path.splitext(os.path.basename(audio_path))[0] + "_converted.wav"
         )
-        audio.export(converted_path, format="wav")
+        with stage_timer("audio_conversion"):
+            with open(audio_path, "rb") as f:
+                data = f.read()
+            guarded("audio_decoder", to_wav_file, data, source_format, converted_path)
 
-        print(f"Conversion successful: {converted_path} "
-              f"({os.path.getsize(converted_path)} bytes)")
+        log.debug("Audio converted", extra={
+            "path": converted_path, "bytes": os.path.getsize(converted_path)
+        })
 
         return converted_path
 
     except Exception as e:
-        print(f"Audio conversion error: {e}")
+        log.warning("Audio conversion failed", extra={"error": str(e)})
         if converted_path and os.path.exists(converted_path):
             try:
                 os.unlink(converted_path)
@@ -97,18 +113,28 @@ def convert_to_wav(audio_path: str) -> str:
         return audio_path
 
 
-def _detect_format_from_header(header: bytes, filepath: str) -> str:
-    """Detect audio format from file header bytes and extension."""
-    if header[:4] == b"\x1aE\xdf\xa3":
+def detect_audio_magic(header: bytes):
+    """Audio format from magic bytes alone (first 12 bytes), or None."""
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    elif header[:4] == b"\x1aE\xdf\xa3":
         return "webm"
     elif header[:4] == b"OggS":
         return "ogg"
     elif header[:4] == b"fLaC":
         return "flac"
-    elif header[:3] == b"ID3" or header[:2] == b"\xff\xfb":
+    elif header[:3] == b"ID3" or header[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
         return "mp3"
     elif header[4:8] == b"ftyp":
         return "mp4"
+    return None
+
+
+def _detect_format_from_header(header: bytes, filepath: str) -> str:
+    """Detect audio format from file header bytes and extension."""
+    detected = detect_audio_magic(header)
+    if detected:
+        return detected
 
     ext = filepath.rsplit(".", 1)[-1].lower() if "." in filepath else ""
     ext_map = {
@@ -118,15 +144,30 @@ def _detect_format_from_header(header: bytes, filepath: str) -> str:
     }
 
     detected = ext_map.get(ext, "webm")
-    print(f"Format detected from extension: .{ext} → {detected}")
+    log.debug("Audio format from extension", extra={"ext": ext, "format": detected})
     return detected
 
 
 # ============================
 # SPEECH TO TEXT
 # ============================
-def transcribe_audio(audio_path: str) -> str:
-    """Convert audio file to text. Automatically converts non-WAV formats."""
+def transcribe_audio(audio_path: str, engine: str = "google") -> str:
+    """
+    Convert audio file to text. Automatically converts non-WAV formats.
+    engine is "google" (remote Web Speech API) or "sphinx" (local).
+    """
+    try:
+        return guarded(f"stt_{engine}", recognize_speech, audio_path, engine)
+    except StageUnavailable as e:
+        log.warning("Transcription failed", extra={"engine": e.engine, "reason": e.reason})
+        return ""
+
+
+def recognize_speech(audio_path: str, engine: str = "google") -> str:
+    """
+    transcribe_audio without the safety net: engine failures raise, audio
+    without recognizable speech gives "".
+    """
     converted_path = None
 
     try:
@@ -139,18 +180,15 @@ def transcribe_audio(audio_path: str) -> str:
         with sr.AudioFile(wav_path) as source:
             recognizer.adjust_for_ambient_noise(source, duration=0.5)
             audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data)
-            print(f"Transcribed: {text}")
+            if engine == "sphinx":
+                text = recognizer.recognize_sphinx(audio_data)
+            else:
+                text = recognizer.recognize_google(audio_data)
+            log.debug("Transcribed", extra={"engine": engine, "transcript": text})
             return text
 
     except sr.UnknownValueError:
-        print("Speech Recognition: Could not understand audio")
-        return ""
-    except sr.RequestError as e:
-        print(f"Speech Recognition API error: {e}")
-        return ""
-    except Exception as e:
-        print(f"Transcription error: {e}")
+        log.debug("No recognizable speech", extra={"engine": engine})
         return ""
     finally:
         if converted_path and os.path.exists(converted_path):
@@ -160,51 +198,154 @@ def transcribe_audio(audio_path: str) -> str:
                 pass
 
 
+def recognize_pcm(pcm: bytes, engine: str = "sphinx") -> str:
+    """Transcribe 16 kHz mono s16 PCM (e.g. one live segment); raises like recognize_speech."""
+    recognizer = sr.Recognizer()
+    audio_data = sr.AudioData(pcm, 16000, 2)
+    try:
+        if engine == "sphinx":
+            return recognizer.recognize_sphinx(audio_data)
+        return recognizer.recognize_google(audio_data)
+    except sr.UnknownValueError:
+        return ""
+
+
 # ============================
 # TEXT EVALUATION (NLP)
 # ============================
-def evaluate_text_nlp(answer: str, model_answer: str, keywords: list) -> dict:
-    if not answer or len(answer.strip()) < 5:
-        return {
-            "relevance": 0, "completeness": 0, "clarity": 0,
-            "text_score": 0, "matched_keywords": [], "missed_keywords": keywords
-        }
+FILLER_WORDS = ['um', 'uh', 'like', 'basically', 'actually', 'literally',
+                'you know', 'i mean', 'sort of', 'kind of']
+
 
-    ans_clean = answer.lower().strip()
+def evaluate_text_nlp(answer: str, model_answer: str, keywords: list,
+                      doc: AnalyzedText = None, relevance_engine: str = "tfidf") -> dict:
+    doc = doc or AnalyzedText(answer)
+    if doc.is_blank():
+        return _empty_text_eval(keywords)
+
+    ans_clean = doc.normalized
 
     # 1. RELEVANCE
-    try:
-        vectorizer = TfidfVectorizer(
-            stop_words='english', max_features=5000, ngram_range=(1, 2)
-        )
-        tfidf_matrix = vectorizer.fit_transform([model_answer, ans_clean])
-        similarity = float(cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0])
-        relevance = min(similarity * 100 * 1.5, 100)
-    except Exception:
-        relevance = 30.0
+    relevance, relevance_engine = relevance_for(relevance_engine, model_answer, doc)
 
     # 2. COMPLETENESS
-    matched = []
-    missed = []
-    for k in keywords:
-        k_lower = k.lower()
-        if re.search(r'\b' + re.escape(k_lower) + r'\b', ans_clean):
-            matched.append(k)
-        else:
-            parts = k_lower.split()
-            if any(part in ans_clean for part in parts if len(part) > 3):
-                matched.append(k)
-            else:
-                missed.append(k)
+    matched, missed, fuzzy = compile_keywords(keywords).match(ans_clean, doc.words)
 
     completeness = (len(matched) / len(keywords) * 100) if keywords else 50.0
 
     # 3. CLARITY
-    words = ans_clean.split()
-    word_count = len(words)
-    sentences = re.split(r'[.!?]+', answer)
-    sentences = [s.strip() for s in sentences if s.strip()]
+    filler_count = sum(1 for f in FILLER_WORDS if f in ans_clean)
+
+    clarity = compute_clarity(doc.word_count, doc.sentence_count,
+                              doc.unique_count, filler_count)
+
+    text_eval = build_text_eval(relevance, completeness, clarity, matched, missed, fuzzy)
+    text_eval["relevance_engine"] = relevance_engine
+    return text_eval
+
+
+_keyword_matchers = {}
+MAX_KEYWORD_SETS = 4096
+
+
+def compile_keywords(keywords: list) -> KeywordMatcher:
+    """Exact and typo-tolerant matcher, compiled once per keyword list."""
+    key = tuple(keywords)
+    matcher = _keyword_matchers.get(key)
+    if matcher is None:
+        matcher = KeywordMatcher(keywords)
+        if len(_keyword_matchers) >= MAX_KEYWORD_SETS:
+            _keyword_matchers.clear()
+        _keyword_matchers[key] = matcher
+    return matcher
+
+
+def seed_keyword_matchers(table: dict):
+    """Install matchers precompiled from the question bank artifact."""
+    _keyword_matchers.update(table)
 
+
+def compute_relevance(model_answer: str, doc: AnalyzedText) -> float:
+    try:
+        # Terms come pre-tokenized from the shared documents; the analyzer
+        # reproduces stop_words='english', ngram_range=(1, 2)
+        vectorizer = TfidfVectorizer(analyzer=terms_of, max_features=5000)
+        tfidf_matrix = vectorizer.fit_transform(
+            [analyze_reference(model_answer), doc]
+        )
+        similarity = float(cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0])
+        return min(similarity * 100 * 1.5, 100)
+    except Exception:
+        return 30.0
+
+
+def keyword_relevance(model_answer: str, doc: AnalyzedText) -> float:
+    """Share of the model answer's content words the answer uses (no vectorizer)."""
+    reference = {t for t in analyze_reference(model_answer).terms if " " not in t}
+    if not reference:
+        return 30.0
+    used = len(reference.intersection(doc.terms))
+    return min(used / len(reference) * 100 * 1.5, 100)
+
+
+SEMANTIC_MODEL = os.getenv("SEMANTIC_MODEL", "all-MiniLM-L6-v2")
+_semantic = {}
+_semantic_lock = threading.Lock()
+_reference_embeddings = {}
+MAX_REFERENCE_EMBEDDINGS = 1024
+
+
+def _semantic_model():
+    # A load that outlives its deadline keeps going; later calls wait for it
+    with _semantic_lock:
+        if "model" in _semantic:
+            return _semantic["model"]
+        try:
+            with track_load("sentence_transformer"):
+                from sentence_transformers import SentenceTransformer
+                _semantic["model"] = SentenceTransformer(SEMANTIC_MODEL, device="cpu")
+                limit_torch()
+        except Exception as e:
+            log.warning("Semantic model unavailable, using TF-IDF", extra={"error": str(e)})
+            _semantic["model"] = None
+    return _semantic["model"]
+
+
+def semantic_relevance(model_answer: str, doc: AnalyzedText):
+    """Embedding cosine scaled to 0-100, or None when the model is unavailable."""
+    model = _semantic_model()
+    if model is None or not model_answer.strip():
+        return None
+    reference = _reference_embeddings.get(model_answer)
+    if reference is None:
+        if len(_reference_embeddings) >= MAX_REFERENCE_EMBEDDINGS:
+            _reference_embeddings.clear()
+        reference = _reference_embeddings[model_answer] = model.encode(
+            model_answer, normalize_embeddings=True
+        )
+    answer = model.encode(doc.raw, normalize_embeddings=True)
+    similarity = float(np.dot(reference, answer))
+    # Unrelated English text still scores around 0.15 cosine
+    return min(max((similarity - 0.15) / 0.6 * 100, 0), 100)
+
+
+def relevance_for(engine: str, model_answer: str, doc: AnalyzedText):
+    """(relevance, engine that produced it) for a profile's relevance engine."""
+    if engine == "keywords":
+        return keyword_relevance(model_answer, doc), "keywords"
+    if engine == "semantic":
+        try:
+            relevance = guarded("semantic", semantic_relevance, model_answer, doc)
+        except StageUnavailable as e:
+            log.warning("Semantic relevance unavailable", extra={"reason": e.reason})
+            relevance = None
+        if relevance is not None:
+            return relevance, "semantic"
+    return compute_relevance(model_answer, doc), "tfidf"
+
+
+def compute_clarity(word_count: int, sentence_count: int,
+                    unique_count: int, filler_count: int) -> float:
     if word_count < 10:
         length_score = 20
     elif word_count < 30:
@@ -214,8 +355,8 @@ def evaluate_text_nlp(answer: str, model_answer: str, keywords: list) -> dict:
     else:
         length_score = max(70, 100 - (word_count - 200) / 5)
 
-    if sentences:
-        avg_sent_len = word_count / len(sentences)
+    if sentence_count:
+        avg_sent_len = word_count / sentence_count
         if 10 <= avg_sent_len <= 25:
             structure_score = 100
         elif avg_sent_len < 10:
@@ -225,17 +366,15 @@ def evaluate_text_nlp(answer: str, model_answer: str, keywords: list) -> dict:
     else:
         structure_score = 40
 
-    unique = len(set(w.lower() for w in words))
-    diversity = min((unique / max(word_count, 1)) * 130, 100)
-
-    fillers = ['um', 'uh', 'like', 'basically', 'actually', 'literally',
-               'you know', 'i mean', 'sort of', 'kind of']
-    filler_count = sum(1 for f in fillers if f in ans_clean)
+    diversity = min((unique_count / max(word_count, 1)) * 130, 100)
     filler_penalty = min(filler_count * 5, 25)
 
-    clarity = (length_score * 0.25 + structure_score * 0.3 +
-               diversity * 0.3 + (100 - filler_penalty) * 0.15)
+    return (length_score * 0.25 + structure_score * 0.3 +
+            diversity * 0.3 + (100 - filler_penalty) * 0.15)
 
+
+def build_text_eval(relevance: float, completeness: float, clarity: float,
+                    matched: list, missed: list, fuzzy: list = None) -> dict:
     text_score = relevance * 0.4 + completeness * 0.35 + clarity * 0.25
 
     return {
@@ -244,21 +383,47 @@ def evaluate_text_nlp(answer: str, model_answer: str, keywords: list) -> dict:
         "clarity": round(float(clarity), 1),
         "text_score": round(float(text_score), 1),
         "matched_keywords": matched,
-        "missed_keywords": missed
+        "missed_keywords": missed,
+        # Matched keywords that were misspelled: {"keyword", "word", "distance"}
+        "fuzzy_keywords": fuzzy or []
+    }
+
+
+def _empty_text_eval(keywords: list) -> dict:
+    return {
+        "relevance": 0, "completeness": 0, "clarity": 0,
+        "text_score": 0, "matched_keywords": [], "missed_keywords": keywords,
+        "fuzzy_keywords": []
     }
 
 
 # ============================
 # SENTIMENT & CONFIDENCE
 # ============================
-def analyze_sentiment_confidence(answer: str) -> dict:
-    if not answer or len(answer.strip()) < 5:
+# "lexicon" is polarity.py (same scores as TextBlob, one token pass);
+# "textblob" builds a TextBlob per answer
+SENTIMENT_ENGINE = os.getenv("SENTIMENT_ENGINE", "lexicon")
+
+
+def answer_polarity(answer: str) -> float:
+    if SENTIMENT_ENGINE == "textblob":
+        # First use imports TextBlob and loads the pattern lexicon
+        with track_load("textblob"):
+            from textblob import TextBlob
+            return float(TextBlob(answer).sentiment.polarity)
+    with track_load("polarity_lexicon"):
+        get_lexicon()
+    return lexicon_polarity(answer)
+
+
+def analyze_sentiment_confidence(answer: str, doc: AnalyzedText = None) -> dict:
+    doc = doc or AnalyzedText(answer)
+    if doc.is_blank():
         return {"sentiment": "neutral", "polarity": 0.0, "confidence": 0.0}
 
-    ans_lower = answer.lower()
+    ans_lower = doc.lower
 
-    blob = TextBlob(answer)
-    polarity = float(blob.sentiment.polarity)
+    polarity = answer_polarity(answer)
 
     if polarity > 0.1:
         sentiment = "positive"
@@ -294,7 +459,7 @@ def analyze_sentiment_confidence(answer: str) -> dict:
     penalty_h = min(hes_count * 6, 25)
     penalty_n = min(neg_count * 10, 25)
 
-    word_count = len(ans_lower.split())
+    word_count = doc.word_count
     if word_count < 10:
         length_mod = -20
     elif word_count < 30:
@@ -314,38 +479,66 @@ def analyze_sentiment_confidence(answer: str) -> dict:
 # ============================
 # FACE EMOTION ANALYSIS
 # ============================
-def analyze_face(image_path: str) -> dict:
+def analyze_face(image_path: str = "", image_data: bytes = None,
+                 face_key: str = None) -> dict:
+    """
+    Emotion from a webcam frame. Encoded bytes are decoded and downscaled
+    in memory and only the detected face crop goes to the model; face_key
+    lets consecutive frames of one candidate reuse the last face region.
+    """
     try:
-        if not image_path or not os.path.exists(image_path):
+        return face_emotion(image_path, image_data, face_key)
+    except Exception as e:
+        log.warning("Face analysis failed", extra={"error": str(e)})
+
+    return {"emotion": "unknown", "visual_confidence": 50, "emotion_details": {}}
+
+
+def face_emotion(image_path: str = "", image_data: bytes = None,
+                 face_key: str = None) -> dict:
+    """analyze_face without the safety net: model failures raise."""
+    if image_data:
+        img = decode_image(image_data)
+        if img is None:
             return {"emotion": "unknown", "visual_confidence": 50, "emotion_details": {}}
+        box, _ = locate_face(img, face_key)
+        if box:
+            target, backend = crop_face(img, box), "skip"
+        else:
+            target, backend = img, "opencv"
+    elif image_path and os.path.exists(image_path):
+        target, backend = image_path, "opencv"
+    else:
+        return {"emotion": "unknown", "visual_confidence": 50, "emotion_details": {}}
 
+    # First use builds the emotion model
+    with track_load("deepface_emotion_model"):
         results = DeepFace.analyze(
-            img_path=image_path,
+            img_path=target,
             actions=['emotion'],
-            enforce_detection=False
+            enforce_detection=False,
+            detector_backend=backend
         )
 
-        if results:
-            emotion = results[0]['dominant_emotion']
-            emotion_scores = results[0].get('emotion', {})
+    if results:
+        emotion = results[0]['dominant_emotion']
+        emotion_scores = results[0].get('emotion', {})
 
-            confidence_map = {
-                'happy': 95, 'neutral': 85, 'surprise': 75,
-                'fear': 35, 'sad': 30, 'angry': 25, 'disgust': 20
-            }
-            visual_confidence = confidence_map.get(emotion, 50)
-
-            # ✅ Convert numpy values to float
-            return {
-                "emotion": str(emotion),
-                "visual_confidence": int(visual_confidence),
-                "emotion_details": {
-                    str(k): round(float(v), 1)
-                    for k, v in emotion_scores.items()
-                }
+        confidence_map = {
+            'happy': 95, 'neutral': 85, 'surprise': 75,
+            'fear': 35, 'sad': 30, 'angry': 25, 'disgust': 20
+        }
+        visual_confidence = confidence_map.get(emotion, 50)
+
+        # ✅ Convert numpy values to float
+        return {
+            "emotion": str(emotion),
+            "visual_confidence": int(visual_confidence),
+            "emotion_details": {
+                str(k): round(float(v), 1)
+                for k, v in emotion_scores.items()
             }
-    except Exception as e:
-        print(f"Face analysis error: {e}")
+        }
 
     return {"emotion": "unknown", "visual_confidence": 50, "emotion_details": {}}
 
@@ -354,6 +547,18 @@ def analyze_face(image_path: str) -> dict:
 # VOICE ANALYSIS
 # ============================
 def analyze_voice(audio_path: str, word_count: int) -> dict:
+    try:
+        return voice_features(audio_path, word_count)
+    except Exception as e:
+        log.warning("Voice analysis failed", extra={"error": str(e)})
+        return {
+            "wpm": 0, "vocal_confidence": 50,
+            "duration": 0, "pace": "error"
+        }
+
+
+def voice_features(audio_path: str, word_count: int) -> dict:
+    """analyze_voice without the safety net: decode failures raise."""
     converted_path = None
 
     try:
@@ -364,50 +569,8 @@ def analyze_voice(audio_path: str, word_count: int) -> dict:
         y, sr_rate = librosa.load(wav_path)
         duration = float(librosa.get_duration(y=y, sr=sr_rate))
 
-        if duration < 1:
-            return {
-                "wpm": 0, "vocal_confidence": 30,
-                "duration": 0, "pace": "too_short"
-            }
-
-        wpm = float((word_count / duration) * 60) if duration > 0 else 0.0
-
-        if 110 <= wpm <= 160:
-            pace_score = 100
-            pace = "ideal"
-        elif 80 <= wpm < 110:
-            pace_score = 80
-            pace = "slow"
-        elif 160 < wpm <= 190:
-            pace_score = 80
-            pace = "fast"
-        elif wpm < 80:
-            pace_score = 50
-            pace = "very_slow"
-        else:
-            pace_score = 50
-            pace = "very_fast"
-
         rms = librosa.feature.rms(y=y)[0]
-        avg_energy = float(np.mean(rms))
-        energy_score = min(avg_energy * 1000, 100)
-
-        vocal_confidence = float(pace_score * 0.7 + min(energy_score, 100) * 0.3)
-
-        return {
-            "wpm": round(float(wpm), 1),
-            "vocal_confidence": round(float(vocal_confidence), 1),
-            "duration": round(float(duration), 1),
-            "pace": pace,
-            "energy": round(float(avg_energy), 4)
-        }
-
-    except Exception as e:
-        print(f"Voice analysis error: {e}")
-        return {
-            "wpm": 0, "vocal_confidence": 50,
-            "duration": 0, "pace": "error"
-        }
+        return score_voice(duration, word_count, float(np.mean(rms)))
 
     finally:
         if converted_path and os.path.exists(converted_path):
@@ -417,12 +580,63 @@ def analyze_voice(audio_path: str, word_count: int) -> dict:
                 pass
 
 
+def score_voice(duration: float, word_count: int, avg_energy: float) -> dict:
+    """Pace and vocal confidence from an answer's duration, words and mean RMS energy."""
+    if duration < 1:
+        return {
+            "wpm": 0, "vocal_confidence": 30,
+            "duration": 0, "pace": "too_short"
+        }
+
+    wpm = float((word_count / duration) * 60) if duration > 0 else 0.0
+
+    if 110 <= wpm <= 160:
+        pace_score = 100
+        pace = "ideal"
+    elif 80 <= wpm < 110:
+        pace_score = 80
+        pace = "slow"
+    elif 160 < wpm <= 190:
+        pace_score = 80
+        pace = "fast"
+    elif wpm < 80:
+        pace_score = 50
+        pace = "very_slow"
+    else:
+        pace_score = 50
+        pace = "very_fast"
+
+    energy_score = min(avg_energy * 1000, 100)
+
+    vocal_confidence = float(pace_score * 0.7 + min(energy_score, 100) * 0.3)
+
+    return {
+        "wpm": round(float(wpm), 1),
+        "vocal_confidence": round(float(vocal_confidence), 1),
+        "duration": round(float(duration), 1),
+        "pace": pace,
+        "energy": round(float(avg_energy), 4)
+    }
+
+
 # ============================
 # SKILL SCORING ENGINE
 # ============================
+def _weighted(parts: list, degraded=()) -> float:
+    """
+    Sum of value * weight over (value, weight, stage) parts. Parts from
+    degraded stages are dropped and the remaining weights renormalized.
+    """
+    live = [(v, w) for v, w, stage in parts if stage not in degraded]
+    if len(live) == len(parts):
+        return sum(v * w for v, w in live)
+    total = sum(w for _, w in live)
+    return sum(v * w for v, w in live) / total if total else 0.0
+
+
 def calculate_skill_scores(text_eval: dict, sentiment_data: dict,
                            face_data: dict, voice_data: dict,
-                           category: str) -> dict:
+                           category: str, degraded=()) -> dict:
     relevance = float(text_eval.get("relevance", 0))
     completeness = float(text_eval.get("completeness", 0))
     clarity = float(text_eval.get("clarity", 0))
@@ -440,13 +654,18 @@ def calculate_skill_scores(text_eval: dict, sentiment_data: dict,
     sentiment_bonus = (5 if sentiment_data.get("sentiment") == "positive"
                        else (-5 if sentiment_data.get("sentiment") == "negative"
                              else 0))
-    communication = (clarity * 0.4 + vocal_conf * 0.3 +
-                     visual_conf * 0.2 + (50 + sentiment_bonus) * 0.1)
+    communication = _weighted([
+        (clarity, 0.4, "text"), (vocal_conf, 0.3, "voice"),
+        (visual_conf, 0.2, "face"), (50 + sentiment_bonus, 0.1, "text"),
+    ], degraded)
 
     problem_solving = (completeness * 0.4 + relevance * 0.35 +
                        clarity * 0.15 + text_confidence * 0.1)
 
-    confidence = text_confidence * 0.4 + visual_conf * 0.3 + vocal_conf * 0.3
+    confidence = _weighted([
+        (text_confidence, 0.4, "text"), (visual_conf, 0.3, "face"),
+        (vocal_conf, 0.3, "voice"),
+    ], degraded)
 
     return {
         "technical": round(float(min(max(technical, 0), 100)), 1),
@@ -481,6 +700,9 @@ def generate_feedback(text_eval: dict, sentiment_data: dict,
         parts.append(f"✅ Good coverage of: {', '.join(matched[:5])}.")
     if missed:
         parts.append(f"❌ Consider mentioning: {', '.join(missed[:5])}.")
+    misspelled = text_eval.get("fuzzy_keywords", [])
+    if misspelled:
+        parts.append(f"🔤 Check the spelling of: {', '.join(f['keyword'] for f in misspelled[:5])}.")
 
     if float(text_eval.get("clarity", 0)) < 50:
         parts.append("Structure your answer more clearly.")
@@ -501,35 +723,219 @@ def generate_feedback(text_eval: dict, sentiment_data: dict,
 # ============================
 # MAIN EVALUATION FUNCTION
 # ============================
+# What a stage turned off by the profile contributes: the same neutral
+# scores as an answer sent without that media
+SKIPPED_FACE = {"emotion": "unknown", "visual_confidence": 50, "emotion_details": {}}
+SKIPPED_VOICE = {"wpm": 0, "vocal_confidence": 50, "duration": 0, "pace": "none"}
+
+
 def evaluate_multimodal(answer_text: str, keywords: list, weight: float,
                         image_path: str, audio_path: str,
                         model_answer: str = "",
-                        category: str = "technical") -> dict:
+                        category: str = "technical",
+                        text_eval: dict = None,
+                        image_data: bytes = None,
+                        face_key: str = None,
+                        profile: dict = None,
+                        live_audio: dict = None) -> dict:
+    result = None
+    for stage, payload in evaluate_multimodal_stages(
+        answer_text, keywords, weight, image_path, audio_path,
+        model_answer, category, text_eval, image_data, face_key, profile, live_audio
+    ):
+        result = payload
+    return result
+
+
+def evaluate_multimodal_stages(answer_text: str, keywords: list, weight: float,
+                               image_path: str, audio_path: str,
+                               model_answer: str = "",
+                               category: str = "technical",
+                               text_eval: dict = None,
+                               image_data: bytes = None,
+                               face_key: str = None,
+                               profile: dict = None,
+                               live_audio: dict = None):
+    """
+    Generator form of evaluate_multimodal. Yields (stage, payload) pairs as
+    soon as each stage finishes: "transcript" (only when STT ran), "text",
+    "face", "voice" and finally "result" with the combined evaluation.
+
+    A precomputed text_eval for answer_text (e.g. from a live draft) skips
+    the text NLP stage. image_data (encoded bytes) takes precedence over
+    image_path for the face stage. Oversized answers are scored on a
+    bounded sample (see bound_answer) and the result carries "truncation".
+
+    profile (see profiles.py, default profile when None) selects the STT
+    and relevance engines and whether the face and voice stages run; the
+    result reports it under "profile".
+
+    STT, face and voice run under their engine's deadline and circuit
+    breaker (see stage_guard.py). A stage that fails or times out is listed
+    in the result's "degraded" with the reason, and the overall score is
+    computed from the stages that completed, weights renormalized.
+
+    live_audio (see live_audio.py) stands in for audio_path when the audio
+    was streamed and already transcribed: its transcript and running voice
+    metrics are used as they are.
+    """
+    profile = profile or get_profile()
+    engines = {"stt": None, "relevance": None,
+               "face": profile["face"], "voice": profile["voice"]}
+    degraded = {}
+
     transcript = answer_text
     if not transcript or len(transcript.strip()) < 3:
-        transcript = transcribe_audio(audio_path)
+        transcript = ""
+        engines["stt"] = profile["stt"]
+        if live_audio is not None:
+            transcript = live_audio["transcript"]
+            engines["stt"] = live_audio["stt"]
+            if live_audio.get("degraded"):
+                degraded["transcribe"] = live_audio["degraded"]
+        elif audio_path:
+            with stage_timer("transcribe"):
+                try:
+                    transcript = guarded(f"stt_{profile['stt']}", recognize_speech,
+                                         audio_path, profile["stt"])
+                except StageUnavailable as e:
+                    log.warning("Stage degraded", extra={"stage": "transcribe",
+                                                         "engine": e.engine, "reason": e.reason})
+                    degraded["transcribe"] = e.reason
+        text_eval = None
+        yield "transcript", {"transcript": str(transcript),
+                             "degraded": degraded.get("transcribe")}
 
     if not transcript or len(transcript.strip()) < 5:
-        return _empty_response()
+        yield "result", _empty_response(profile_report(profile, engines), degraded)
+        return
+
+    scored, truncation = bound_answer(transcript)
+    if truncation or profile["relevance"] != "tfidf":
+        # A draft evaluation covers the whole text with TF-IDF relevance
+        text_eval = None
+
+    with stage_timer("text"):
+        doc = AnalyzedText(scored)
+        if text_eval is None:
+            text_eval = evaluate_text_nlp(scored, model_answer, keywords, doc,
+                                          profile["relevance"])
+    engines["relevance"] = text_eval.get("relevance_engine", "tfidf")
+    with stage_timer("sentiment"):
+        sentiment_data = analyze_sentiment_confidence(scored, doc)
+    yield "text", sanitize_for_json({
+        "truncation": truncation,
+        "relevance": text_eval["relevance"],
+        "completeness": text_eval["completeness"],
+        "clarity": text_eval["clarity"],
+        "technical_accuracy": text_eval["text_score"],
+        "sentiment": sentiment_data["sentiment"],
+        "text_confidence": sentiment_data["confidence"],
+        "keywords": {
+            "matched": text_eval["matched_keywords"],
+            "missed": text_eval["missed_keywords"],
+            "fuzzy": text_eval.get("fuzzy_keywords", [])
+        }
+    })
 
-    text_eval = evaluate_text_nlp(transcript, model_answer, keywords)
-    sentiment_data = analyze_sentiment_confidence(transcript)
-    face_data = analyze_face(image_path)
+    face_data = dict(SKIPPED_FACE)
+    if profile["face"] and (image_data or image_path):
+        with stage_timer("face"):
+            try:
+                face_data = guarded("deepface", face_emotion, image_path, image_data, face_key)
+            except StageUnavailable as e:
+                log.warning("Stage degraded", extra={"stage": "face",
+                                                     "engine": e.engine, "reason": e.reason})
+                degraded["face"] = e.reason
+    yield "face", {
+        "emotion_detected": str(face_data["emotion"]),
+        "emotion_details": face_data.get("emotion_details", {}),
+        "visual_confidence": face_data["visual_confidence"],
+        "degraded": degraded.get("face")
+    }
 
-    word_count = len(transcript.split())
-    voice_data = analyze_voice(audio_path, word_count)
+    voice_data = dict(SKIPPED_VOICE)
+    word_count = truncation["estimated_words"] if truncation else doc.word_count
+    if profile["voice"] and live_audio is not None:
+        voice_data = score_voice(live_audio["duration"], word_count, live_audio["energy"])
+    elif profile["voice"] and audio_path:
+        with stage_timer("voice"):
+            try:
+                voice_data = guarded("librosa", voice_features, audio_path, word_count)
+            except StageUnavailable as e:
+                log.warning("Stage degraded", extra={"stage": "voice",
+                                                     "engine": e.engine, "reason": e.reason})
+                degraded["voice"] = e.reason
+    yield "voice", sanitize_for_json(dict(voice_data, degraded=degraded.get("voice")))
+
+    yield "result", _combine_results(
+        transcript, text_eval, sentiment_data, face_data, voice_data, category,
+        truncation, profile_report(profile, engines), degraded
+    )
 
-    skill_scores = calculate_skill_scores(
-        text_eval, sentiment_data, face_data, voice_data, category
+
+def rescore_result(result: dict, keywords: list, model_answer: str = "",
+                   category: str = "technical") -> dict:
+    """
+    Recompute a stored evaluation with the current scoring code. Text
+    stages rerun on the saved transcript under the profile it was scored
+    with; face and voice signals (and whether they were degraded) are
+    reused from the stored result since the media is not retained.
+    """
+    stored = result.get("profile") or {}
+    profile = get_profile(stored.get("name") if stored.get("name") in PROFILES else None)
+    # Results from before profiles existed were all produced like "standard"
+    engines = dict(stored.get("engines") or
+                   {"stt": None, "relevance": "tfidf", "face": True, "voice": True})
+
+    degraded = dict(result.get("degraded") or {})
+
+    transcript = result.get("transcript", "")
+    if not transcript or len(transcript.strip()) < 5:
+        return _empty_response(profile_report(profile, engines), degraded)
+
+    breakdown = result.get("breakdown", {})
+    voice = result.get("voice_analysis", {})
+    face_data = {
+        "emotion": result.get("emotion_detected", "unknown"),
+        "visual_confidence": breakdown.get("visual_confidence", 50),
+        "emotion_details": result.get("emotion_details", {})
+    }
+    voice_data = {
+        "vocal_confidence": breakdown.get("vocal_confidence", 50),
+        "wpm": voice.get("wpm", 0),
+        "pace": voice.get("pace", "none"),
+        "duration": voice.get("duration", 0)
+    }
+
+    scored, truncation = bound_answer(transcript)
+    doc = AnalyzedText(scored)
+    text_eval = evaluate_text_nlp(scored, model_answer, keywords, doc,
+                                  profile["relevance"])
+    engines["relevance"] = text_eval["relevance_engine"]
+    sentiment_data = analyze_sentiment_confidence(scored, doc)
+    return _combine_results(
+        transcript, text_eval, sentiment_data, face_data, voice_data, category,
+        truncation, profile_report(profile, engines), degraded
     )
 
-    overall = float(
-        float(text_eval["text_score"]) * 0.50 +
-        float(face_data["visual_confidence"]) * 0.15 +
-        float(voice_data["vocal_confidence"]) * 0.15 +
-        float(sentiment_data["confidence"]) * 0.10 +
-        float(skill_scores["communication"]) * 0.10
+
+def _combine_results(transcript: str, text_eval: dict, sentiment_data: dict,
+                     face_data: dict, voice_data: dict, category: str,
+                     truncation: dict = None, profile: dict = None,
+                     degraded: dict = None) -> dict:
+    degraded = degraded or {}
+    skill_scores = calculate_skill_scores(
+        text_eval, sentiment_data, face_data, voice_data, category, degraded
     )
+
+    overall = float(_weighted([
+        (float(text_eval["text_score"]), 0.50, "text"),
+        (float(face_data["visual_confidence"]), 0.15, "face"),
+        (float(voice_data["vocal_confidence"]), 0.15, "voice"),
+        (float(sentiment_data["confidence"]), 0.10, "text"),
+        (float(skill_scores["communication"]), 0.10, "text"),
+    ], degraded))
     overall = float(min(max(overall, 0), 100))
     marks_out_of_10 = float(min(10.0, overall / 10))
 
@@ -561,15 +967,21 @@ def evaluate_multimodal(answer_text: str, keywords: list, weight: float,
         },
         "keywords": {
             "matched": text_eval["matched_keywords"],
-            "missed": text_eval["missed_keywords"]
-        }
+            "missed": text_eval["missed_keywords"],
+            "fuzzy": text_eval.get("fuzzy_keywords", [])
+        },
+        "truncation": truncation,
+        "profile": profile,
+        # Stage -> reason ("timeout", "error", "circuit_open"); their scores
+        # above are placeholders left out of the overall score
+        "degraded": degraded
     }
 
     # ✅ Final safety net: sanitize ALL numpy types
     return sanitize_for_json(result)
 
 
-def _empty_response():
+def _empty_response(profile: dict = None, degraded: dict = None):
     return {
         "overall_marks": 0.0,
         "overall_percentage": 0.0,
@@ -589,5 +1001,8 @@ def _empty_response():
             "problem_solving": 0.0, "confidence": 0.0
         },
         "voice_analysis": {"wpm": 0.0, "pace": "none", "duration": 0.0},
-        "keywords": {"matched": [], "missed": []}
+        "keywords": {"matched": [], "missed": [], "fuzzy": []},
+        "truncation": None,
+        "profile": profile,
+        "degraded": degraded or {}
     }
\ No newline at end of file
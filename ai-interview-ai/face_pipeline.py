@@ -0,0 +1,131 @@
+# face_pipeline.py - In-memory decode, downscale and face-region caching
+
+import os
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from memory import register_cache
+
+# DeepFace's emotion model works on a 48x48 crop; detection is reliable
+# well below webcam resolution, so frames are shrunk to this long side.
+WORKING_SIZE = int(os.getenv("FACE_WORKING_SIZE", "480"))
+# How far around the previous face the tracking pass searches
+ROI_MARGIN = 0.6
+# Padding kept around the detected face when cropping for the model
+CROP_MARGIN = 0.2
+MAX_TRACKED = 5000
+TRACK_TTL_SECONDS = 30 * 60
+
+_detector = None
+_regions = OrderedDict()   # face_key -> (box, frame_shape, updated_at)
+
+
+def _get_detector():
+    global _detector
+    if _detector is None:
+        path = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        _detector = cv2.CascadeClassifier(path)
+    return _detector
+
+
+# ============================
+# DECODE & DOWNSCALE
+# ============================
+def decode_image(data: bytes):
+    """Decode encoded image bytes to a BGR array scaled to WORKING_SIZE."""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    # Let libjpeg do the first reduction during decode when it can
+    flags = cv2.IMREAD_COLOR
+    if len(data) > 512 * 1024:
+        flags = cv2.IMREAD_REDUCED_COLOR_2
+    img = cv2.imdecode(buf, flags)
+    if img is None:
+        return None
+    return downscale(img)
+
+
+def downscale(img):
+    h, w = img.shape[:2]
+    scale = WORKING_SIZE / max(h, w)
+    if scale >= 1:
+        return img
+    return cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+# ============================
+# DETECTION & TRACKING
+# ============================
+def _detect(gray):
+    faces = _get_detector().detectMultiScale(
+        gray, scaleFactor=1.1, minNeighbors=5, minSize=(40, 40)
+    )
+    if len(faces) == 0:
+        return None
+    # Largest face is the candidate
+    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+    return int(x), int(y), int(w), int(h)
+
+
+def _expand(box, margin, shape):
+    x, y, w, h = box
+    dx, dy = int(w * margin), int(h * margin)
+    x0, y0 = max(x - dx, 0), max(y - dy, 0)
+    x1, y1 = min(x + w + dx, shape[1]), min(y + h + dy, shape[0])
+    return x0, y0, x1, y1
+
+
+def locate_face(img, face_key: str = None):
+    """
+    Return (box, tracked) for the face in `img`. With a face_key, the
+    region found in the candidate's previous frame is searched first and
+    the full-frame pass only runs if the face has moved out of it.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    prev = _regions.get(face_key) if face_key else None
+    if prev and prev[1] == img.shape[:2] and time.monotonic() - prev[2] < TRACK_TTL_SECONDS:
+        x0, y0, x1, y1 = _expand(prev[0], ROI_MARGIN, img.shape)
+        found = _detect(gray[y0:y1, x0:x1])
+        if found:
+            box = (found[0] + x0, found[1] + y0, found[2], found[3])
+            _remember(face_key, box, img.shape[:2])
+            return box, True
+
+    box = _detect(gray)
+    if box and face_key:
+        _remember(face_key, box, img.shape[:2])
+    return box, False
+
+
+def crop_face(img, box):
+    x0, y0, x1, y1 = _expand(box, CROP_MARGIN, img.shape)
+    return img[y0:y1, x0:x1]
+
+
+def _remember(face_key, box, shape):
+    _regions[face_key] = (box, shape, time.monotonic())
+    _regions.move_to_end(face_key)
+    while len(_regions) > MAX_TRACKED:
+        _regions.popitem(last=False)
+
+
+def forget_face(face_key: str):
+    _regions.pop(face_key, None)
+
+
+def _evict_region():
+    if not _regions:
+        return False
+    _regions.popitem(last=False)
+
+
+register_cache(
+    "face_regions",
+    count=lambda: len(_regions),
+    # Each entry is a couple of small tuples
+    size=lambda: len(_regions) * 400,
+    evict=_evict_region,
+)
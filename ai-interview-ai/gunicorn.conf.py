@@ -0,0 +1,56 @@
+# gunicorn.conf.py - Prefork serving mode
+#
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# The app, its text models and the question index are loaded once in the
+# master and shared copy-on-write with every forked worker. TensorFlow is not
+# fork-safe, so the DeepFace model is never built in the master: with
+# PRELOAD_FACE_MODEL=1 each worker builds its own in post_worker_init.
+
+import os
+
+import resources
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Split the cores between the workers before anything loads numpy/TensorFlow
+resources.configure(workers=workers)
+
+from preload import (
+    preload_shared_state, warm_worker_models, read_process_memory, format_memory
+)
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+# Internal callers hold connections open between batches
+keepalive = int(os.getenv("KEEPALIVE_SECONDS", "75"))
+
+
+def on_starting(server):
+    timings = preload_shared_state()
+    steps = ", ".join(f"{k}={v:.2f}s" for k, v in timings.items())
+    server.log.info(f"Preloaded shared state: {steps}")
+    resources.limit_loaded_libraries()
+    budget = ", ".join(f"{k}={v}" for k, v in resources.configure().items())
+    server.log.info(f"CPU budget per worker: {budget}")
+
+
+def when_ready(server):
+    server.log.info(
+        f"Master ready with {server.cfg.workers} workers; "
+        f"{format_memory(read_process_memory())}"
+    )
+
+
+def post_fork(server, worker):
+    pinned = resources.pin_worker(worker.age - 1)
+    server.log.info(f"Worker {worker.pid} forked" +
+                    (f", pinned to CPUs {pinned}" if pinned else ""))
+
+
+def post_worker_init(worker):
+    timings = warm_worker_models()
+    steps = "".join(f", {k}={v:.2f}s" for k, v in timings.items())
+    worker.log.info(
+        f"Worker {worker.pid} booted{steps}; {format_memory(read_process_memory())}"
+    )
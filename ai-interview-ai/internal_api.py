@@ -0,0 +1,119 @@
+# internal_api.py - Service-to-service evaluate API (MessagePack)
+#
+# POST /internal/v1/evaluate takes a batch of concatenated MessagePack maps,
+# one per answer, and streams back one compact result map per answer in the
+# same order, each written as soon as that answer is scored. Clients keep
+# one keep-alive connection open and send batch after batch on it.
+#
+# Request item:  {"id", "session_id", "index", "answer_text",
+#                 "image": bin, "audio": bin, "idempotency_key", "profile"}
+# Response item: {"id", "status", "finished", "answer", "final"} or
+#                {"id", "status", "detail"} for a failed item
+#
+# "answer" carries only what the backend persists for an answer (the
+# Interview AnswerSchema); "final" is the session summary once finished.
+# Every route requires X-Internal-Token to match INTERNAL_API_TOKEN.
+
+import os
+
+import msgpack
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from memory import env_bytes
+from uploads import UploadRejected, spool_bytes
+from admission import AdmissionRejected
+from submissions import submit_answer
+
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+MSGPACK_TYPE = "application/x-msgpack"
+MAX_BATCH_BYTES = env_bytes("INTERNAL_MAX_BATCH") or 64 << 20
+
+SCORE_FIELDS = ("overall_marks", "overall_percentage")
+BREAKDOWN_FIELDS = ("relevance", "completeness", "clarity", "technical_accuracy",
+                    "visual_confidence", "vocal_confidence", "text_confidence")
+
+
+def require_internal(x_internal_token: str = Header(None)):
+    if not INTERNAL_API_TOKEN or x_internal_token != INTERNAL_API_TOKEN:
+        raise HTTPException(403, "Internal token required")
+
+
+router = APIRouter(prefix="/internal/v1", dependencies=[Depends(require_internal)])
+
+
+def compact_answer(result: dict) -> dict:
+    """The evaluate result reduced to the fields the backend stores."""
+    breakdown = result.get("breakdown", {})
+    scores = {f: result.get(f, 0.0) for f in SCORE_FIELDS}
+    scores.update((f, breakdown.get(f, 0.0)) for f in BREAKDOWN_FIELDS)
+    return {
+        "transcript": result.get("transcript", ""),
+        "scores": scores,
+        "skill_scores": result.get("skill_scores", {}),
+        "emotion": result.get("emotion_detected"),
+        "sentiment": result.get("sentiment"),
+        "feedback": result.get("feedback"),
+        "voice_analysis": result.get("voice_analysis", {}),
+        "keywords": result.get("keywords", {}),
+    }
+
+
+async def _evaluate_item(item: dict) -> dict:
+    item_id = item.get("id")
+    try:
+        img = spool_bytes(item.get("image"), "image")
+        try:
+            aud = spool_bytes(item.get("audio"), "audio")
+        except UploadRejected:
+            if img: img.close()
+            raise
+        response = await submit_answer(
+            str(item["session_id"]), int(item["index"]), item.get("answer_text") or "",
+            img, aud, item.get("idempotency_key"), item.get("profile")
+        )
+    except HTTPException as e:
+        return {"id": item_id, "status": e.status_code, "detail": e.detail}
+    except (UploadRejected, AdmissionRejected) as e:
+        return {"id": item_id, "status": e.status, "detail": e.detail}
+    except (KeyError, TypeError, ValueError):
+        return {"id": item_id, "status": 400, "detail": "Malformed item"}
+
+    return {
+        "id": item_id,
+        "status": 200,
+        "finished": response["finished"],
+        "answer": compact_answer(response["current_score"]),
+        "final": response["final_result"],
+    }
+
+
+@router.post("/evaluate")
+async def evaluate_batch(request: Request):
+    if request.headers.get("content-type", "").split(";")[0] != MSGPACK_TYPE:
+        raise HTTPException(415, f"Expected {MSGPACK_TYPE}")
+
+    # Read the whole batch first: once streaming starts, the response's
+    # disconnect listener shares the receive channel with the body
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_BATCH_BYTES:
+            raise HTTPException(413, f"Batch exceeds {MAX_BATCH_BYTES} bytes")
+    unpacker = msgpack.Unpacker(raw=False, max_buffer_size=max(len(body), 1))
+    unpacker.feed(body)
+    del body
+
+    async def results():
+        packer = msgpack.Packer()
+        try:
+            for item in unpacker:
+                if not isinstance(item, dict):
+                    yield packer.pack({"id": None, "status": 400, "detail": "Malformed item"})
+                    continue
+                yield packer.pack(await _evaluate_item(item))
+        except ValueError as e:
+            # Corrupt bytes mid-batch; everything before it was answered
+            yield packer.pack({"id": None, "status": 400, "detail": f"Bad batch: {e}"})
+
+    return StreamingResponse(results(), media_type=MSGPACK_TYPE)
@@ -0,0 +1,357 @@
+# jobs.py - Persistent queue for asynchronous evaluations
+#
+# POST /interview/jobs stores the submission (row in a local SQLite queue,
+# media next to it on disk) and returns a job id at once. Every worker
+# process runs JOB_WORKERS runner tasks that claim queued jobs with a lease,
+# evaluate them through the regular submission path and store the response.
+# A job whose runner died is picked up again once its lease expires; it
+# reuses the job id as idempotency key, so an answer that was already
+# recorded is returned from the session instead of being recomputed.
+#
+# When a job finishes, its status is POSTed to the job's callback URL
+# (JOB_CALLBACK_URL, or a per-job URL under one of JOB_CALLBACK_ALLOWED:
+# same scheme, host and port, path below the allowed one). Runners claim
+# pending callbacks from the queue like jobs, with a lease, so a callback
+# whose worker died after finishing the job is still sent after a restart.
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi import HTTPException
+
+from uploads import UploadRejected, spool_file
+from admission import AdmissionRejected
+from submissions import submit_answer
+from logs import get_logger
+
+log = get_logger(__name__)
+
+JOBS_DIR = os.getenv("JOBS_DIR", "eval_jobs")
+JOBS_DB = os.path.join(JOBS_DIR, "jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOB_CALLBACK_URL = os.getenv("JOB_CALLBACK_URL", "")
+JOB_CALLBACK_ALLOWED = [p for p in os.getenv("JOB_CALLBACK_ALLOWED", "").split(",") if p]
+CALLBACK_RETRIES = 3
+CALLBACK_LEASE_SECONDS = 120
+IDLE_POLL_SECONDS = 0.5
+
+# Admission rejections mean "busy", not "broken": requeue without charging
+_RETRY_LATER = (AdmissionRejected,)
+
+_runners = []
+
+os.makedirs(JOBS_DIR, exist_ok=True)
+
+
+# ============================
+# STORAGE
+# ============================
+def _connect() -> sqlite3.Connection:
+    # A connection per call: runners use threads and workers are forked
+    conn = sqlite3.connect(JOBS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+@contextmanager
+def _db():
+    conn = _connect()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def init_db():
+    with _db() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                answer_text TEXT NOT NULL,
+                callback_url TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_until REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                result TEXT,
+                error TEXT,
+                callback_status TEXT
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+
+def media_path(job_id: str, kind: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.{kind}")
+
+
+def _url_parts(url: str):
+    """(scheme, host, port, path) of a URL; ValueError for a malformed one."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    port = parts.port or {"http": 80, "https": 443}.get(scheme)
+    return scheme, (parts.hostname or "").lower(), port, parts.path or "/"
+
+
+def callback_allowed(url: str) -> bool:
+    allowed = JOB_CALLBACK_ALLOWED or ([JOB_CALLBACK_URL] if JOB_CALLBACK_URL else [])
+    try:
+        scheme, host, port, path = _url_parts(url)
+    except ValueError:
+        return False
+    if scheme not in ("http", "https") or not host:
+        return False
+    for prefix in allowed:
+        try:
+            a_scheme, a_host, a_port, a_path = _url_parts(prefix)
+        except ValueError:
+            continue
+        base = a_path.rstrip("/")
+        if ((scheme, host, port) == (a_scheme, a_host, a_port)
+                and (path == a_path or path.startswith(base + "/"))):
+            return True
+    return False
+
+
+def enqueue(session_id: str, index: int, answer_text: str, img=None, aud=None,
+            callback_url: str = None) -> str:
+    """Persist a submission and its media; returns the job id."""
+    job_id = uuid.uuid4().hex
+    for kind, upload in (("image", img), ("audio", aud)):
+        if upload:
+            upload.save_to(media_path(job_id, kind))
+
+    now = time.time()
+    with _db() as conn:
+        conn.execute(
+            "INSERT INTO jobs (job_id, status, session_id, idx, answer_text, callback_url,"
+            " created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (job_id, session_id, int(index), answer_text or "",
+             callback_url or JOB_CALLBACK_URL or None, now, now)
+        )
+    return job_id
+
+
+def get_job(job_id: str):
+    with _db() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    return {
+        "job_id": row["job_id"],
+        "status": row["status"],
+        "session_id": row["session_id"],
+        "index": row["idx"],
+        "attempts": row["attempts"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": json.loads(row["error"]) if row["error"] else None,
+        "callback_status": row["callback_status"],
+    }
+
+
+def claim_job():
+    """Lease the oldest runnable job (queued, or running with a lapsed lease)."""
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT job_id FROM jobs WHERE status = 'queued'"
+            " OR (status = 'running' AND lease_until < ?)"
+            " ORDER BY created_at LIMIT 1", (now,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1,"
+            " lease_until = ?, updated_at = ? WHERE job_id = ?",
+            (now + JOB_LEASE_SECONDS, now, row["job_id"])
+        )
+        conn.execute("COMMIT")
+        return conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone()
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def finish_job(job_id: str, status: str, result=None, error=None):
+    with _db() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = NULL,"
+            " updated_at = ? WHERE job_id = ?",
+            (status, json.dumps(result) if result is not None else None,
+             json.dumps(error) if error is not None else None, time.time(), job_id)
+        )
+    if status in ("done", "failed"):
+        for kind in ("image", "audio"):
+            path = media_path(job_id, kind)
+            if os.path.exists(path): os.remove(path)
+
+
+def requeue_job(job_id: str, refund_attempt: bool = False):
+    with _db() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', lease_until = NULL, updated_at = ?,"
+            " attempts = attempts - ? WHERE job_id = ?",
+            (time.time(), 1 if refund_attempt else 0, job_id)
+        )
+
+
+def claim_callback():
+    """Lease the oldest finished job whose callback is pending (or whose sender died)."""
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT job_id, callback_url FROM jobs WHERE status IN ('done', 'failed')"
+            " AND callback_url IS NOT NULL AND (callback_status IS NULL"
+            " OR (callback_status = 'sending' AND updated_at < ?))"
+            " ORDER BY updated_at LIMIT 1", (now - CALLBACK_LEASE_SECONDS,)
+        ).fetchone()
+        if row is not None:
+            conn.execute("UPDATE jobs SET callback_status = 'sending', updated_at = ?"
+                         " WHERE job_id = ?", (now, row["job_id"]))
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def set_callback_status(job_id: str, status: str):
+    with _db() as conn:
+        conn.execute("UPDATE jobs SET callback_status = ? WHERE job_id = ?", (status, job_id))
+
+
+def prune_jobs() -> int:
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    with _db() as conn:
+        cur = conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+        )
+        return cur.rowcount
+
+
+def queue_report() -> dict:
+    with _db() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+    return {row["status"]: row["n"] for row in rows}
+
+
+# ============================
+# RUNNER
+# ============================
+async def run_job(row) -> str:
+    job_id = row["job_id"]
+    if row["attempts"] > JOB_MAX_ATTEMPTS:
+        # Its earlier runners died mid-job (e.g. the worker was killed)
+        await asyncio.to_thread(finish_job, job_id, "failed", None,
+                                {"status": 500, "detail": "Job abandoned too many times"})
+        return "failed"
+    img = await asyncio.to_thread(spool_file, media_path(job_id, "image"), "image")
+    aud = await asyncio.to_thread(spool_file, media_path(job_id, "audio"), "audio")
+    try:
+        response = await submit_answer(row["session_id"], row["idx"], row["answer_text"],
+                                       img, aud, f"job-{job_id}")
+    except _RETRY_LATER:
+        await asyncio.to_thread(requeue_job, job_id, True)
+        return "queued"
+    except (HTTPException, UploadRejected) as e:
+        # The submission itself is invalid; retrying cannot help
+        status = getattr(e, "status_code", None) or e.status
+        await asyncio.to_thread(finish_job, job_id, "failed", None,
+                                {"status": status, "detail": e.detail})
+        return "failed"
+    except Exception as e:
+        log.warning("Job attempt failed", extra={"job_id": job_id, "attempt": row["attempts"],
+                                                 "error": str(e)})
+        if row["attempts"] >= JOB_MAX_ATTEMPTS:
+            await asyncio.to_thread(finish_job, job_id, "failed", None,
+                                    {"status": 500, "detail": str(e)})
+            return "failed"
+        await asyncio.to_thread(requeue_job, job_id)
+        return "queued"
+
+    await asyncio.to_thread(finish_job, job_id, "done", response)
+    return "done"
+
+
+async def send_callback(job_id: str, url: str):
+    job = await asyncio.to_thread(get_job, job_id)
+    payload = {"job_id": job_id, "status": job["status"],
+               "result": job["result"], "error": job["error"]}
+    async with httpx.AsyncClient(timeout=10) as client:
+        for attempt in range(CALLBACK_RETRIES):
+            try:
+                resp = await client.post(url, json=payload)
+                if resp.status_code < 500:
+                    await asyncio.to_thread(set_callback_status, job_id, str(resp.status_code))
+                    return
+            except httpx.HTTPError as e:
+                log.warning("Job callback failed", extra={"job_id": job_id, "error": str(e)})
+            await asyncio.sleep(2 ** attempt)
+    await asyncio.to_thread(set_callback_status, job_id, "failed")
+
+
+async def _runner():
+    last_prune = 0.0
+    while True:
+        try:
+            # Callbacks first: including those a dead worker never sent
+            callback = await asyncio.to_thread(claim_callback)
+            if callback is not None:
+                await send_callback(callback["job_id"], callback["callback_url"])
+                continue
+
+            row = await asyncio.to_thread(claim_job)
+            if row is None:
+                if time.monotonic() - last_prune > 3600:
+                    last_prune = time.monotonic()
+                    await asyncio.to_thread(prune_jobs)
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+                continue
+
+            status = await run_job(row)
+            if status == "queued":
+                # Busy or transient failure; give other work a turn first
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Job runner error")
+            await asyncio.sleep(IDLE_POLL_SECONDS)
+
+
+def start_runners():
+    init_db()
+    for _ in range(JOB_WORKERS):
+        _runners.append(asyncio.get_running_loop().create_task(_runner()))
+
+
+async def stop_runners():
+    # A job cut off here keeps its lease and is retried after it lapses
+    for task in _runners:
+        task.cancel()
+    await asyncio.gather(*_runners, return_exceptions=True)
+    _runners.clear()
@@ -0,0 +1,168 @@
+# keyword_match.py - Question keywords found in an answer, misspellings included
+#
+# Each question's keyword list is compiled once (at question bank load, and
+# pickled with the bank artifacts) into a KeywordMatcher. A keyword counts
+# as covered when:
+#
+#   exact   it occurs as a whole word, or one of its words longer than three
+#           letters occurs anywhere in the answer
+#   fuzzy   otherwise, one of those words is within a small edit distance of
+#           an answer word ("kubernets", "reconcilation", "hydartion")
+#
+# Fuzzy lookup uses a symmetric-deletion index: every keyword word is filed
+# under each string left after deleting up to its allowed number of edits,
+# and each distinct answer word probes the index with its own deletions.
+# Candidates are confirmed with a bounded optimal-string-alignment distance
+# (swapping two adjacent letters is one edit). The work grows with the
+# number of distinct answer words, not with the number of keywords.
+#
+#   KEYWORD_FUZZY_DISTANCE  "min_length:edits,..." (default "6:1,10:2":
+#                           6-9 letter words tolerate one edit, longer ones
+#                           two, shorter ones must be exact; "" disables)
+#
+# A fuzzy match must keep the first letter, which is rarely the mistyped
+# one and rules out most real-word neighbours ("design" / "resign").
+
+import os
+import re
+
+FUZZY_DISTANCE = os.getenv("KEYWORD_FUZZY_DISTANCE", "6:1,10:2")
+MAX_EDITS = 2
+
+_WORD_RE = re.compile(r"\w+")
+
+
+# ============================
+# EDIT DISTANCE
+# ============================
+def _parse_distances(spec: str) -> list:
+    steps = []
+    for item in filter(None, (p.strip() for p in spec.split(","))):
+        length, _, edits = item.partition(":")
+        steps.append((int(length), min(int(edits), MAX_EDITS)))
+    return sorted(steps)
+
+
+DISTANCE_STEPS = _parse_distances(FUZZY_DISTANCE)
+
+
+def max_edits(length: int) -> int:
+    """Edits a keyword word of this length may differ by (0 = exact only)."""
+    edits = 0
+    for min_length, n in DISTANCE_STEPS:
+        if length >= min_length:
+            edits = n
+    return edits
+
+
+def deletions(word: str, edits: int) -> set:
+    """word and every string left after deleting up to `edits` characters."""
+    found = {word}
+    frontier = {word}
+    for _ in range(edits):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance of a and b, or limit + 1 beyond limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            d = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d = min(d, before[j - 2] + 1)
+            row[j] = d
+        if min(row) > limit:
+            return limit + 1
+        before, prev = prev, row
+    return min(prev[-1], limit + 1)
+
+
+# ============================
+# MATCHER
+# ============================
+class KeywordMatcher:
+    """Exact patterns and the fuzzy deletion index for one keyword list."""
+
+    __slots__ = ("keywords", "patterns", "parts", "index", "edits", "lengths")
+
+    def __init__(self, keywords: list):
+        self.keywords = list(keywords)
+        self.patterns = []
+        self.parts = []
+        self.index = {}     # deletion -> [(keyword position, word, allowed edits)]
+        self.edits = 0
+        shortest, longest = None, 0
+        for pos, k in enumerate(self.keywords):
+            k_lower = k.lower()
+            self.patterns.append(re.compile(r'\b' + re.escape(k_lower) + r'\b'))
+            parts = [p for p in k_lower.split() if len(p) > 3]
+            self.parts.append(parts)
+            for p in parts:
+                edits = max_edits(len(p))
+                if not edits or not _WORD_RE.fullmatch(p):
+                    continue
+                for d in deletions(p, edits):
+                    self.index.setdefault(d, []).append((pos, p, edits))
+                self.edits = max(self.edits, edits)
+                low = len(p) - edits
+                shortest = low if shortest is None else min(shortest, low)
+                longest = max(longest, len(p) + edits)
+        # Answer words outside this length range cannot match any keyword word
+        self.lengths = (shortest or 0, longest)
+
+    def exact(self, pos: int, text: str) -> bool:
+        return bool(self.patterns[pos].search(text)
+                    or any(part in text for part in self.parts[pos]))
+
+    def fuzzy(self, positions, words) -> dict:
+        """
+        Keyword position -> (answer word, distance) of its closest fuzzy match,
+        for the keywords at `positions`. `words` are the answer's lowercased
+        whitespace tokens (repeats are fine).
+        """
+        wanted = set(positions)
+        if not wanted or not self.index:
+            return {}
+        shortest, longest = self.lengths
+        found = {}
+        seen = set()
+        for token in words:
+            for w in _WORD_RE.findall(token):
+                if w in seen or not shortest <= len(w) <= longest:
+                    continue
+                seen.add(w)
+                for d in deletions(w, self.edits):
+                    for pos, part, edits in self.index.get(d, ()):
+                        if pos not in wanted or part[0] != w[0]:
+                            continue
+                        distance = edit_distance(w, part, edits)
+                        if 0 < distance <= edits and distance < found.get(pos, ("", edits + 1))[1]:
+                            found[pos] = (w, distance)
+        return found
+
+    def match(self, text: str, words=None):
+        """
+        (matched, missed, fuzzy) keywords for a lowercased answer, in keyword
+        order; fuzzy lists the matched keywords that were misspelled.
+        """
+        missed_pos = [pos for pos in range(len(self.keywords)) if not self.exact(pos, text)]
+        fuzzy = self.fuzzy(missed_pos, text.split() if words is None else words)
+        return self.classify(missed_pos, fuzzy)
+
+    def classify(self, missed_pos: list, fuzzy: dict):
+        unmatched = set(missed_pos) - set(fuzzy)
+        matched = [k for pos, k in enumerate(self.keywords) if pos not in unmatched]
+        missed = [k for pos, k in enumerate(self.keywords) if pos in unmatched]
+        return matched, missed, fuzzy_report(self.keywords, fuzzy)
+
+
+def fuzzy_report(keywords: list, fuzzy: dict) -> list:
+    return [{"keyword": keywords[pos], "word": word, "distance": distance}
+            for pos, (word, distance) in sorted(fuzzy.items())]
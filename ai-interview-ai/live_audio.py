@@ -0,0 +1,235 @@
+# live_audio.py - Transcribing an answer while it is being recorded
+#
+# The candidate's microphone is streamed over the /interview/audio/live
+# WebSocket as raw PCM chunks (s16le or f32le, any rate and channel count;
+# 16 kHz mono needs no resampling). The stream is converted to 16 kHz mono
+# s16 by one PcmResampler per recording, so chunk boundaries add no clicks
+# or drift, and cut into segments at pauses: a segment ends after
+# LIVE_AUDIO_SILENCE_SECONDS of silence once it is MIN_SEGMENT_SECONDS
+# long, or at LIVE_AUDIO_SEGMENT_SECONDS regardless. Finished segments are
+# transcribed one after another with the local STT engine (LIVE_STT_ENGINE,
+# under its stage deadline and breaker) while recording continues, and the
+# duration and RMS energy are kept as running totals.
+#
+# On submit only the open segment (at most LIVE_AUDIO_SEGMENT_SECONDS) is
+# left to transcribe, so the time from submit to score does not grow with
+# the length of the answer as long as the engine keeps up with speech.
+
+import os
+import asyncio
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from audio_decoder import SAMPLE_RATE, PcmResampler
+from evaluator import recognize_pcm, score_voice
+from stage_guard import guarded, StageUnavailable
+from logs import get_logger
+
+LIVE_STT_ENGINE = os.getenv("LIVE_STT_ENGINE", "sphinx")
+MAX_STREAMS = int(os.getenv("LIVE_AUDIO_MAX_STREAMS", "8"))
+MAX_SECONDS = float(os.getenv("LIVE_AUDIO_MAX_SECONDS", "600"))
+SEGMENT_SECONDS = float(os.getenv("LIVE_AUDIO_SEGMENT_SECONDS", "8"))
+SILENCE_SECONDS = float(os.getenv("LIVE_AUDIO_SILENCE_SECONDS", "0.5"))
+SILENCE_RMS = float(os.getenv("LIVE_AUDIO_SILENCE_RMS", "0.01"))
+MIN_SEGMENT_SECONDS = 2.0
+
+FRAME = 512     # samples per energy/silence frame (32 ms)
+FORMATS = {"s16le": (np.dtype("<i2"), 32768.0), "f32le": (np.dtype("<f4"), 1.0)}
+
+_active = {"streams": 0}
+
+log = get_logger(__name__)
+
+
+class LiveAudioRejected(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class LiveAudio:
+    """
+    One streamed recording: segmentation, running voice metrics and the
+    transcript of the segments finished so far. feed() runs on the event
+    loop; transcription runs in the threadpool, one segment at a time.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, channels: int = 1,
+                 sample_format: str = "s16le", on_update=None):
+        if sample_format not in FORMATS:
+            raise LiveAudioRejected(400, f"Unsupported sample format: {sample_format}")
+        if not 8000 <= int(sample_rate) <= 192000 or not 1 <= int(channels) <= 8:
+            raise LiveAudioRejected(400, "Unsupported sample rate or channel count")
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        self._dtype, self._scale = FORMATS[sample_format]
+        self._frame_bytes = self._dtype.itemsize * self.channels
+        self._on_update = on_update
+        self._resampler = PcmResampler(self.channels, self.sample_rate)
+
+        self._raw = b""                 # partial input frame left from the last chunk
+        self._pending = bytearray()     # 16 kHz PCM not yet framed
+        self._segment = bytearray()
+        self._voiced = False
+        self._silent_frames = 0
+        self.samples = 0
+        self._energy_sum = 0.0
+        self._energy_frames = 0
+
+        self.parts = []
+        self.segments = 0
+        self.degraded = None
+        self._queue = asyncio.Queue()
+        self._worker = None
+
+    # ----------------------------
+    # Audio
+    # ----------------------------
+    def feed(self, chunk: bytes):
+        """Add one chunk of input PCM; finished segments go to the transcriber."""
+        data = self._raw + chunk
+        usable = len(data) - len(data) % self._frame_bytes
+        self._raw = data[usable:]
+        if not usable:
+            return
+        samples = np.frombuffer(data[:usable], dtype=self._dtype).astype(np.float32)
+        pcm = self._resampler.convert(samples / self._scale)
+
+        self.samples += len(pcm) // 2
+        if self.samples > MAX_SECONDS * SAMPLE_RATE:
+            raise LiveAudioRejected(413, f"Recording exceeds {MAX_SECONDS:.0f} seconds")
+        self._pending += pcm
+        self._split()
+
+    def _split(self):
+        n = len(self._pending) // (2 * FRAME)
+        if not n:
+            return
+        framed = bytes(self._pending[:n * 2 * FRAME])
+        del self._pending[:n * 2 * FRAME]
+        frames = np.frombuffer(framed, dtype="<i2").astype(np.float32).reshape(n, FRAME) / 32768.0
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        self._energy_sum += float(rms.sum())
+        self._energy_frames += n
+
+        silence_frames = SILENCE_SECONDS * SAMPLE_RATE / FRAME
+        min_frames = MIN_SEGMENT_SECONDS * SAMPLE_RATE / FRAME
+        max_frames = SEGMENT_SECONDS * SAMPLE_RATE / FRAME
+        for i, level in enumerate(rms):
+            self._segment += framed[i * 2 * FRAME:(i + 1) * 2 * FRAME]
+            if level < SILENCE_RMS:
+                self._silent_frames += 1
+            else:
+                self._silent_frames = 0
+                self._voiced = True
+            length = len(self._segment) / (2 * FRAME)
+            if ((length >= min_frames and self._silent_frames >= silence_frames)
+                    or length >= max_frames):
+                self._cut()
+
+    def _cut(self):
+        if self._voiced:
+            self._queue.put_nowait(bytes(self._segment))
+        # A segment without speech is dropped rather than transcribed
+        self._segment = bytearray()
+        self._voiced = False
+        self._silent_frames = 0
+
+    # ----------------------------
+    # Transcription
+    # ----------------------------
+    def start(self):
+        self._worker = asyncio.create_task(self._transcribe_segments())
+
+    async def _transcribe_segments(self):
+        while True:
+            segment = await self._queue.get()
+            if segment is None:
+                return
+            try:
+                text = await run_in_threadpool(guarded, f"stt_{LIVE_STT_ENGINE}",
+                                               recognize_pcm, segment, LIVE_STT_ENGINE)
+            except StageUnavailable as e:
+                log.warning("Live transcription unavailable",
+                            extra={"engine": e.engine, "reason": e.reason})
+                self.degraded = e.reason
+                text = ""
+            if text:
+                self.parts.append(text)
+            self.segments += 1
+            if self._on_update is not None:
+                await self._on_update(self.snapshot())
+
+    async def finish(self) -> dict:
+        """Transcribe what is left and return the recording's outcome."""
+        pcm = self._resampler.flush()
+        self.samples += len(pcm) // 2
+        self._pending += pcm
+        self._pending += b"\x00" * (-len(self._pending) % (2 * FRAME))
+        self._split()
+        self._cut()
+        self._queue.put_nowait(None)
+        if self._worker is not None:
+            await self._worker
+        return self.outcome()
+
+    def close(self):
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+
+    # ----------------------------
+    # Results
+    # ----------------------------
+    @property
+    def transcript(self) -> str:
+        return " ".join(self.parts)
+
+    @property
+    def duration(self) -> float:
+        return self.samples / SAMPLE_RATE
+
+    @property
+    def energy(self) -> float:
+        return self._energy_sum / self._energy_frames if self._energy_frames else 0.0
+
+    def snapshot(self) -> dict:
+        """Live view: transcript so far and voice metrics of the audio so far."""
+        transcript = self.transcript
+        voice = score_voice(self.duration, len(transcript.split()), self.energy)
+        return dict(voice, transcript=transcript, segments=self.segments,
+                    pending=self._queue.qsize(), degraded=self.degraded)
+
+    def outcome(self) -> dict:
+        """What evaluate_multimodal takes as live_audio."""
+        return {
+            "transcript": self.transcript,
+            "duration": round(self.duration, 3),
+            "energy": round(self.energy, 6),
+            "stt": f"live_{LIVE_STT_ENGINE}",
+            "degraded": self.degraded,
+        }
+
+
+# ============================
+# STREAM LIMIT
+# ============================
+def open_stream(**kwargs) -> LiveAudio:
+    """A started LiveAudio, or LiveAudioRejected (503) when this worker is full."""
+    if _active["streams"] >= MAX_STREAMS:
+        raise LiveAudioRejected(503, "Too many live recordings, try again shortly")
+    live = LiveAudio(**kwargs)
+    _active["streams"] += 1
+    live.start()
+    return live
+
+
+def close_stream(live: LiveAudio):
+    live.close()
+    _active["streams"] -= 1
+
+
+def live_report() -> dict:
+    return {"streams": _active["streams"], "max_streams": MAX_STREAMS,
+            "engine": LIVE_STT_ENGINE}
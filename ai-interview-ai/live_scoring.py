@@ -0,0 +1,399 @@
+# live_scoring.py - Incremental scoring of an answer draft while it is typed
+#
+# Each draft's edits are appended to a log under saved_sessions/drafts, so
+# an edit may reach any worker process. Each worker keeps the incremental
+# scoring state of the drafts it has seen and how far into the log it has
+# read; before applying an edit it replays only the edits other workers
+# appended since, so an edit costs its own size, not the answer's. The log
+# is rewritten as a single edit once it grows well past the draft itself.
+
+import os
+import json
+import uuid
+import re
+import time
+from collections import Counter, OrderedDict
+
+from memory import register_cache, sampled_size
+from text_analysis import AnalyzedText, MAX_ANSWER_CHARS
+from evaluator import (
+    FILLER_WORDS, compute_relevance, compute_clarity, build_text_eval,
+    compile_keywords, _empty_text_eval
+)
+from session_store import SESSIONS_DIR, file_lock
+
+MAX_DRAFTS = 2000
+DRAFT_TTL_SECONDS = 2 * 60 * 60
+DRAFTS_DIR = os.path.join(SESSIONS_DIR, "drafts")
+PRUNE_SECONDS = 10 * 60
+COMPACT_BYTES = 64 * 1024
+
+os.makedirs(DRAFTS_DIR, exist_ok=True)
+
+_TOKEN_RE = re.compile(r"\S+")
+_TERMINATORS = frozenset(".!?")
+
+
+class DraftTooLarge(ValueError):
+    pass
+
+
+class LiveDraft:
+    """
+    Running text-evaluation state for one (session_id, index) draft.
+
+    Updates arrive as (keep, append): keep the first `keep` characters of
+    the current draft and append `append`. Only tokens and pattern hits
+    touching the edited tail are rolled back and rescanned, so the work per
+    update is proportional to the edit, not to the whole answer. Completeness
+    and clarity match evaluate_text_nlp on the same text exactly.
+    """
+
+    def __init__(self, keywords: list, model_answer: str = ""):
+        self.keywords = list(keywords)
+        self.model_answer = model_answer
+        self.updated_at = time.monotonic()
+        self._matcher = compile_keywords(self.keywords)
+        # Position in the shared edit log (see apply_draft_edit)
+        self.log_id = b""
+        self.log_offset = 0
+
+        # Pattern table: every keyword's whole-word form, every keyword part
+        # used by the substring fallback, and every filler phrase.
+        self._patterns = []
+        self._keyword_pids = []
+        for k in self.keywords:
+            k_lower = k.lower()
+            whole = self._add_pattern(r'\b' + re.escape(k_lower) + r'\b', len(k_lower))
+            parts = [self._add_pattern(re.escape(p), len(p))
+                     for p in k_lower.split() if len(p) > 3]
+            self._keyword_pids.append((whole, parts))
+        self._filler_pids = [self._add_pattern(re.escape(f), len(f)) for f in FILLER_WORDS]
+        # A hit ending at the edit point may depend on the next char (\b)
+        self._lookback = max((n for _, n in self._patterns), default=0) + 1
+
+        self.reset()
+
+    def _add_pattern(self, regex: str, length: int) -> int:
+        self._patterns.append((re.compile(regex), length))
+        return len(self._patterns) - 1
+
+    def reset(self):
+        self.text = ""
+        self._lower = ""
+        self._tokens = []          # (start, end, word, sentence_state_before)
+        self._words = Counter()
+        self._sentence_state = (0, False)   # (closed sentences, open has content)
+        self._hits = []            # (end, pattern_id), sorted by end
+        self._hit_counts = Counter()
+
+    # ----------------------------
+    # Updates
+    # ----------------------------
+    def update(self, keep: int, append: str):
+        if keep < 0 or keep > len(self.text):
+            raise ValueError("keep is outside the current draft")
+        if keep + len(append) > MAX_ANSWER_CHARS:
+            # Live hints stop where scoring would start sampling
+            raise DraftTooLarge(f"Draft exceeds {MAX_ANSWER_CHARS} characters")
+
+        self.updated_at = time.monotonic()
+        self.text = self.text[:keep] + append
+        lower = self._lower[:keep] + append.lower()
+        if len(lower) != len(self.text):
+            # Case folding changed the length; offsets no longer line up
+            self._rebuild()
+            return
+        self._lower = lower
+
+        restart = self._rollback(keep)
+        self._scan_tokens(restart)
+        self._scan_hits(keep)
+
+    def load(self, text: str):
+        """Replace the whole draft (e.g. with the stored text)."""
+        self.updated_at = time.monotonic()
+        self.text = text
+        self._rebuild()
+
+    def _rebuild(self):
+        text = self.text
+        self.reset()
+        self.text = text
+        self._lower = text.lower()
+        self._scan_tokens(0)
+        self._scan_hits(0)
+
+    def _rollback(self, keep: int) -> int:
+        """Drop state that may change once text from `keep` on is replaced."""
+        restart = keep
+        while self._tokens and self._tokens[-1][1] >= keep:
+            start, _, word, state = self._tokens.pop()
+            self._words[word] -= 1
+            if not self._words[word]:
+                del self._words[word]
+            self._sentence_state = state
+            restart = min(restart, start)
+
+        while self._hits and self._hits[-1][0] >= keep:
+            _, pid = self._hits.pop()
+            self._hit_counts[pid] -= 1
+
+        return restart
+
+    def _scan_tokens(self, start: int):
+        closed, has_content = self._sentence_state
+        for m in _TOKEN_RE.finditer(self.text, start):
+            state_before = (closed, has_content)
+            for ch in m.group():
+                if ch in _TERMINATORS:
+                    if has_content:
+                        closed += 1
+                        has_content = False
+                else:
+                    has_content = True
+            word = self._lower[m.start():m.end()]
+            self._tokens.append((m.start(), m.end(), word, state_before))
+            self._words[word] += 1
+        self._sentence_state = (closed, has_content)
+
+    def _scan_hits(self, keep: int):
+        window = max(0, keep - self._lookback)
+        new_hits = []
+        for pid, (pattern, _) in enumerate(self._patterns):
+            pos = window
+            while True:
+                m = pattern.search(self._lower, pos)
+                if not m:
+                    break
+                if m.end() >= keep and m.end() > m.start():
+                    new_hits.append((m.end(), pid))
+                pos = m.start() + 1
+        new_hits.sort()
+        self._hits.extend(new_hits)
+        for _, pid in new_hits:
+            self._hit_counts[pid] += 1
+
+    # ----------------------------
+    # Scores
+    # ----------------------------
+    @property
+    def word_count(self) -> int:
+        return len(self._tokens)
+
+    @property
+    def sentence_count(self) -> int:
+        closed, has_content = self._sentence_state
+        return closed + (1 if has_content else 0)
+
+    @property
+    def filler_count(self) -> int:
+        return sum(1 for pid in self._filler_pids if self._hit_counts[pid])
+
+    def keyword_matches(self):
+        """(matched, missed, fuzzy); misspellings are looked up over distinct words."""
+        missed_pos = [
+            pos for pos, (whole, parts) in enumerate(self._keyword_pids)
+            if not (self._hit_counts[whole] or any(self._hit_counts[p] for p in parts))
+        ]
+        return self._matcher.classify(missed_pos, self._matcher.fuzzy(missed_pos, self._words))
+
+    def _scores(self):
+        matched, missed, fuzzy = self.keyword_matches()
+        completeness = (len(matched) / len(self.keywords) * 100) if self.keywords else 50.0
+        clarity = compute_clarity(self.word_count, self.sentence_count,
+                                  len(self._words), self.filler_count)
+        return completeness, clarity, matched, missed, fuzzy
+
+    def snapshot(self) -> dict:
+        """Cheap live view: everything except TF-IDF relevance."""
+        completeness, clarity, matched, missed, fuzzy = self._scores()
+        return {
+            "length": len(self.text),
+            "words": self.word_count,
+            "sentences": self.sentence_count,
+            "unique_words": len(self._words),
+            "filler_hits": self.filler_count,
+            "completeness": round(float(completeness), 1),
+            "clarity": round(float(clarity), 1),
+            "matched_keywords": matched,
+            "missed_keywords": missed,
+            "fuzzy_keywords": fuzzy
+        }
+
+    def text_eval(self) -> dict:
+        """Full evaluate_text_nlp result, computing only relevance afresh."""
+        if len(self.text.strip()) < 5:
+            return _empty_text_eval(self.keywords)
+        relevance = compute_relevance(self.model_answer, AnalyzedText(self.text))
+        return build_text_eval(relevance, *self._scores())
+
+
+# ============================
+# DRAFT REGISTRY
+# ============================
+_drafts = OrderedDict()
+
+
+def get_draft(session_id: str, index: int):
+    draft = _drafts.get((session_id, index))
+    if draft and time.monotonic() - draft.updated_at > DRAFT_TTL_SECONDS:
+        _drafts.pop((session_id, index), None)
+        return None
+    return draft
+
+
+def open_draft(session_id: str, index: int, keywords: list,
+               model_answer: str = "") -> LiveDraft:
+    key = (session_id, index)
+    draft = get_draft(session_id, index)
+    if draft is None:
+        draft = _drafts[key] = LiveDraft(keywords, model_answer)
+    _drafts.move_to_end(key)
+    while len(_drafts) > MAX_DRAFTS:
+        _drafts.popitem(last=False)
+    return draft
+
+
+def _evict_oldest_draft():
+    if not _drafts:
+        return False
+    _drafts.popitem(last=False)
+
+
+register_cache(
+    "live_drafts",
+    count=lambda: len(_drafts),
+    size=lambda: sampled_size(iter(list(_drafts.values())), len(_drafts)),
+    evict=_evict_oldest_draft,
+)
+
+
+# ============================
+# SHARED DRAFT TEXT
+# ============================
+_pruned = {"at": 0.0}
+
+
+def _draft_path(session_id: str, index: int) -> str:
+    return os.path.join(DRAFTS_DIR, f"{session_id.strip()}-{int(index)}.log")
+
+
+def _drop_expired(path: str):
+    try:
+        if time.time() - os.stat(path).st_mtime > DRAFT_TTL_SECONDS:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _open_log(path: str):
+    """
+    The draft's edit log, for reading and appending. Its first line is an id
+    that changes whenever the log is started over (new draft or compaction);
+    every other line is one [keep, append] edit.
+    """
+    _drop_expired(path)
+    f = open(path, "a+b")
+    if os.fstat(f.fileno()).st_size == 0:
+        f.write(uuid.uuid4().hex.encode() + b"\n")
+        f.flush()
+    return f
+
+
+def _edit_line(keep: int, append: str) -> bytes:
+    return json.dumps([keep, append]).encode() + b"\n"
+
+
+def _catch_up(draft: LiveDraft, f):
+    """Replay the edits appended to the log since `draft` last read it."""
+    f.seek(0)
+    log_id = f.readline()
+    if log_id != draft.log_id:
+        # A log this worker has not read (yet, or since it was compacted)
+        draft.load("")
+        draft.log_id, draft.log_offset = log_id, len(log_id)
+    f.seek(draft.log_offset)
+    for line in f:
+        draft.update(*json.loads(line))
+    draft.log_offset = f.tell()
+
+
+def _compact(path: str, draft: LiveDraft):
+    """Start the log over with the whole draft as its only edit."""
+    log_id = uuid.uuid4().hex.encode() + b"\n"
+    data = log_id + _edit_line(0, draft.text)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    draft.log_id, draft.log_offset = log_id, len(data)
+
+
+def _prune_stored():
+    """Drop abandoned drafts (throttled; any worker may do it)."""
+    if time.monotonic() - _pruned["at"] < PRUNE_SECONDS:
+        return
+    _pruned["at"] = time.monotonic()
+    cutoff = time.time() - DRAFT_TTL_SECONDS
+    with os.scandir(DRAFTS_DIR) as entries:
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def apply_draft_edit(session_id: str, index: int, keep: int, append: str,
+                     question: dict = None) -> dict:
+    """
+    Apply one (keep, append) edit to the shared draft and return the live
+    snapshot. `question` is needed when this worker has no state for the
+    draft yet. Blocking (file lock and I/O); raises ValueError for an edit
+    that does not fit the stored text and DraftTooLarge.
+    """
+    path = _draft_path(session_id, index)
+    with file_lock(path), _open_log(path) as f:
+        draft = get_draft(session_id, index)
+        if draft is None:
+            if question is None:
+                raise ValueError("Draft state expired; resend it with keep=0")
+            draft = open_draft(session_id, index, question.get("keywords", []),
+                               question.get("model_answer", ""))
+        _catch_up(draft, f)
+        draft.update(keep, append)
+        # A JSON-escaped character takes at most 6 bytes, so a freshly
+        # compacted log never crosses this on its own
+        if draft.log_offset > 8 * len(draft.text) + COMPACT_BYTES:
+            _compact(path, draft)
+        else:
+            line = _edit_line(keep, append)
+            f.write(line)
+            draft.log_offset += len(line)
+    _prune_stored()
+    return draft.snapshot()
+
+
+def take_draft_text_eval(session_id: str, index: int, answer_text: str):
+    """
+    On submit, reuse the draft's state if the stored draft is exactly the
+    submitted text. Returns the text evaluation or None when a fresh one is
+    needed (no draft, a different text, or no state for it in this worker).
+    Blocking.
+    """
+    path = _draft_path(session_id, index)
+    draft = _drafts.pop((session_id, index), None)
+    with file_lock(path):
+        _drop_expired(path)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            if draft is not None:
+                _catch_up(draft, f)
+        os.remove(path)
+    if draft is None or draft.text != answer_text:
+        return None
+    return draft.text_eval()
@@ -0,0 +1,219 @@
+# logs.py - Structured JSON logging written off the request path
+#
+# Modules log through get_logger(__name__) with fields passed as `extra`:
+#
+#   log.warning("Stage deadline missed", extra={"engine": engine, "deadline": 15.0})
+#
+# Each record becomes one JSON line carrying the request and session ids of
+# the request that produced it (and that request's stage timings so far).
+# Records are put on a bounded queue and written to stdout by one
+# background thread per worker process; when the queue is full records are
+# dropped and counted rather than blocking the caller.
+#
+#   LOG_LEVEL             root level (INFO)
+#   LOG_LEVELS            per-logger levels, "evaluator=DEBUG,jobs=WARNING"
+#   LOG_DEBUG_SAMPLE_RATE share of DEBUG records kept (1.0)
+#   LOG_DEBUG_PER_SECOND  DEBUG records per logger and message per second (5)
+#   LOG_TRANSCRIPTS=1     log transcript/answer fields verbatim; by default
+#                         they are replaced by their length and a hash prefix
+#   LOG_QUEUE_SIZE        records buffered before dropping (10000)
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import hashlib
+import logging
+import threading
+import logging.handlers
+from contextvars import ContextVar
+
+from profiling import current_timings
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1"))
+DEBUG_PER_SECOND = float(os.getenv("LOG_DEBUG_PER_SECOND", "5"))
+LOG_TRANSCRIPTS = os.getenv("LOG_TRANSCRIPTS", "0") == "1"
+QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REDACTED_FIELDS = frozenset(("transcript", "answer_text"))
+
+request_id_var = ContextVar("request_id", default=None)
+session_id_var = ContextVar("session_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+_stats = {"dropped": 0, "sampled_out": 0, "rate_limited": 0}
+
+
+# ============================
+# FORMATTING
+# ============================
+def redact(value):
+    if LOG_TRANSCRIPTS or not isinstance(value, str):
+        return value
+    digest = hashlib.sha256(value.encode("utf-8")).hexdigest()[:12]
+    return {"chars": len(value), "sha256": digest}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = redact(value) if key in REDACTED_FIELDS else value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+# ============================
+# FILTERS
+# ============================
+class ContextFilter(logging.Filter):
+    """Stamp the caller's request context on the record before it is queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.__dict__.get("request_id") is None:
+            record.request_id = request_id_var.get()
+        if record.__dict__.get("session_id") is None:
+            record.session_id = session_id_var.get()
+        timings = current_timings()
+        if timings and "stages" not in record.__dict__:
+            record.stages = dict(timings)
+        return True
+
+
+class DebugThrottle(logging.Filter):
+    """Sample DEBUG records, then cap each (logger, message) at a steady rate."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._buckets = {}     # (logger, msg template) -> (tokens, last refill)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.DEBUG:
+            return True
+        if DEBUG_SAMPLE_RATE < 1 and random.random() >= DEBUG_SAMPLE_RATE:
+            _stats["sampled_out"] += 1
+            return False
+        if DEBUG_PER_SECOND <= 0:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (DEBUG_PER_SECOND, now))
+            tokens = min(DEBUG_PER_SECOND, tokens + (now - last) * DEBUG_PER_SECOND)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                _stats["rate_limited"] += 1
+                return False
+            self._buckets[key] = (tokens - 1, now)
+        return True
+
+
+# ============================
+# QUEUE WRITER
+# ============================
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks: a full queue drops the record. Starts its writer per process."""
+
+    def __init__(self, q: queue.Queue, target: logging.Handler):
+        super().__init__(q)
+        self._target = target
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_listener(self):
+        # Threads do not survive a fork; each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self.queue = queue.Queue(QUEUE_SIZE)
+                self._listener = logging.handlers.QueueListener(
+                    self.queue, self._target, respect_handler_level=True
+                )
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def enqueue(self, record: logging.LogRecord):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _stats["dropped"] += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve what may change or pin frames after the call returns; the
+        # writer thread does the JSON formatting
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+_handler = None
+
+
+def configure():
+    """Install the queue handler on the root logger (once per interpreter)."""
+    global _handler
+    if _handler is not None:
+        return
+    target = logging.StreamHandler(sys.stdout)
+    target.setFormatter(JsonFormatter())
+    _handler = _DroppingQueueHandler(queue.Queue(QUEUE_SIZE), target)
+    _handler.addFilter(DebugThrottle())
+    _handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    for item in filter(None, (p.strip() for p in LOG_LEVELS.split(","))):
+        name, _, level = item.partition("=")
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+    atexit.register(_handler.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure()
+    return logging.getLogger(name)
+
+
+def set_level(name: str, level: str):
+    """Change one logger's level at runtime ("root" for the root logger)."""
+    logging.getLogger(None if name == "root" else name).setLevel(level.upper())
+
+
+def log_report() -> dict:
+    levels = {"root": logging.getLevelName(logging.getLogger().level)}
+    for name, logger in sorted(logging.Logger.manager.loggerDict.items()):
+        if isinstance(logger, logging.Logger) and logger.level:
+            levels[name] = logging.getLevelName(logger.level)
+    queued = _handler.queue.qsize() if _handler is not None else 0
+    return dict(_stats, queued=queued, levels=levels)
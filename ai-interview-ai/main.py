@@ -1,27 +1,52 @@
-
-
-import os
-import io
 import uuid
 import json
-import shutil
+import time
 import random
-import base64
 from typing import Optional
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import resources
+# Thread counts are read when numpy/TensorFlow load, so this runs first
+resources.configure()
+
+from fastapi import (
+    FastAPI, Request, UploadFile, File, Form, Header, HTTPException, WebSocket,
+    WebSocketDisconnect
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from pydub import AudioSegment
 from pypdf import PdfReader
 
-from question_bank import QUESTION_BANK
-from evaluator import evaluate_multimodal, sanitize_for_json
+from question_index import questions_for, has_domain, round_questions, get_question_index
+from evaluator import sanitize_for_json
+import admin
+import jobs
+import audio_decoder
+import internal_api
+from profiling import should_profile, request_profiler, begin_request_timings
+from logs import get_logger, request_id_var
+from memory import track_request, enforce_budgets
+from uploads import receive_upload, SpooledUpload, UploadRejected, BodyLimitMiddleware, UploadRoute
+from admission import AdmissionRejected, run_admitted
+from recorder import recording, store_blob, question_refs, score_summary
+from submissions import submit_answer, stream_answer, holding
+from profiles import PROFILES, DEFAULT_PROFILE, get_profile
+from live_scoring import get_draft, apply_draft_edit, DraftTooLarge
+from live_audio import open_stream, close_stream, LiveAudioRejected
+from session_store import (
+    save_session, load_session, session_lock, empty_score_slots, filled_scores
+)
+
+log = get_logger("main")
 
 app = FastAPI(
     title="AI Interview Evaluation Service",
     version="2.3.0"
 )
+# Uploads are spooled and size-checked while the multipart body is parsed
+app.router.route_class = UploadRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,11 +55,84 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-SESSIONS_DIR = "saved_sessions"
-TEMP_DIR = "temp_eval"
-
-os.makedirs(SESSIONS_DIR, exist_ok=True)
-os.makedirs(TEMP_DIR, exist_ok=True)
+app.include_router(admin.router)
+app.include_router(internal_api.router)
+app.add_middleware(BodyLimitMiddleware)
+
+@app.on_event("startup")
+async def report_resources():
+    resources.limit_loaded_libraries()
+    log.info("Resource settings", extra={"resources": resources.resource_report()})
+
+@app.on_event("startup")
+async def load_question_bank():
+    # Already loaded when gunicorn preloaded the app; later reloads run in
+    # a background thread
+    await run_in_threadpool(get_question_index)
+
+@app.on_event("startup")
+async def start_job_runners():
+    jobs.start_runners()
+
+@app.on_event("startup")
+async def start_audio_decoders():
+    # Per worker process, after the fork; spawning takes a moment
+    await run_in_threadpool(audio_decoder.get_pool)
+
+@app.on_event("shutdown")
+async def stop_job_runners():
+    await jobs.stop_runners()
+
+@app.on_event("shutdown")
+async def stop_audio_decoders():
+    audio_decoder.stop_pool()
+
+@app.exception_handler(UploadRejected)
+async def upload_rejected(request: Request, exc: UploadRejected):
+    return JSONResponse(status_code=exc.status, content={"detail": exc.detail})
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(status_code=exc.status, content={"detail": exc.detail},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    if not should_profile(request.headers):
+        return await call_next(request)
+    with request_profiler(request.method, request.url.path) as meta:
+        response = await call_next(request)
+        if meta is not None:
+            meta["status"] = response.status_code
+            response.headers["X-Profile-Id"] = meta["id"]
+        return response
+
+@app.middleware("http")
+async def account_memory(request: Request, call_next):
+    try:
+        with track_request():
+            return await call_next(request)
+    finally:
+        enforce_budgets()
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # Outermost: every log record of the request carries its id and timings
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    begin_request_timings()
+    status = 500
+    t0 = time.perf_counter()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        log.info("request", extra={
+            "method": request.method, "path": request.url.path, "status": status,
+            "duration": round(time.perf_counter() - t0, 6)
+        })
 
 # -------------------------
 # ROOT ROUTE
@@ -57,65 +155,41 @@ async def health():
 class StartRequest(BaseModel):
     domain: str
     level: Optional[str] = "all"
+    profile: Optional[str] = None   # evaluation profile, see /interview/profiles
 
-# -------------------------
-# Helpers
-# -------------------------
-def save_session(session_id, data):
-    path = os.path.join(SESSIONS_DIR, f"{session_id}.json")
-    with open(path, "w") as f:
-        json.dump(sanitize_for_json(data), f, indent=4)
-
-def load_session(session_id):
-    path = os.path.join(SESSIONS_DIR, f"{session_id.strip()}.json")
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            return json.load(f)
-    return None
-
-def check_ffmpeg():
-    if not shutil.which("ffmpeg"):
-        print("WARNING: FFmpeg not found on server path")
-
-def save_uploaded_audio_as_wav(upload: UploadFile, audio_bytes: bytes) -> str:
-    check_ffmpeg()
-    wav_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}.wav")
-    try:
-        fmt = "webm"
-        if upload.filename.lower().endswith(".wav"): fmt = "wav"
-        if upload.filename.lower().endswith(".mp3"): fmt = "mp3"
-        
-        audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format=fmt)
-        audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-        audio.export(wav_path, format="wav")
-    except Exception as e:
-        print(f"Audio conversion error: {e}")
-        with open(wav_path, "wb") as f: f.write(audio_bytes)
-            
-    return wav_path
+class DraftUpdate(BaseModel):
+    session_id: str
+    index: int
+    keep: int = 0
+    append: str = ""
 
 # -------------------------
 # Start Interview
 # -------------------------
 @app.post("/interview/start")
 async def start(req: StartRequest):
+    request = {"domain": req.domain, "level": req.level, "profile": req.profile}
+    with recording("start", request) as rec:
+        response = await _start_session(req)
+        if rec is not None: rec["response"] = _recorded_session(response["session_id"])
+        return response
+
+def _session_profile_name(profile: Optional[str]) -> str:
+    try:
+        # Resolved now, so changing EVAL_PROFILE later leaves the session alone
+        return get_profile(profile)["name"]
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+async def _start_session(req: StartRequest):
     session_id = str(uuid.uuid4())
+    profile = _session_profile_name(req.profile)
     domain_key = req.domain.lower().replace(" ", "").replace("-", "")
 
-    if domain_key not in QUESTION_BANK:
+    if not has_domain(domain_key):
         domain_key = "backend"
 
-    raw_rounds = QUESTION_BANK[domain_key]
-    flattened_questions = []
-
-    if req.level and req.level != "all":
-        level_map = {"easy": "round_1_background", "medium": "round_2_domain", "hard": "round_3_project"}
-        rk = level_map.get(req.level)
-        if rk: flattened_questions = list(raw_rounds[rk])
-        else:
-            for r in raw_rounds: flattened_questions.extend(raw_rounds[r])
-    else:
-        for r in raw_rounds: flattened_questions.extend(raw_rounds[r])
+    flattened_questions = questions_for(domain_key, req.level)
 
     random.shuffle(flattened_questions)
     if req.level == "all": flattened_questions = flattened_questions[:10]
@@ -124,8 +198,10 @@ async def start(req: StartRequest):
         "session_id": session_id,
         "domain": domain_key,
         "level": req.level,
+        "profile": profile,
         "questions": flattened_questions,
-        "scores": [],
+        "scores": empty_score_slots(len(flattened_questions)),
+        "idempotency": {},
         "total_questions": len(flattened_questions)
     }
     save_session(session_id, session_data)
@@ -135,6 +211,7 @@ async def start(req: StartRequest):
     return {
         "session_id": session_id,
         "domain": domain_key,
+        "profile": profile,
         "total_questions": len(flattened_questions),
         "questions": safe_q
     }
@@ -143,16 +220,22 @@ async def start(req: StartRequest):
 # Resume Start
 # -------------------------
 @app.post("/interview/resume/start")
-async def start_resume(file: UploadFile = File(...)):
+async def start_resume(file: UploadFile = File(...), profile: Optional[str] = Form(None)):
+    with recording("resume", {"profile": profile}) as rec:
+        response = await _start_resume_session(file, profile, rec)
+        if rec is not None: rec["response"] = _recorded_session(response["session_id"])
+        return response
+
+async def _start_resume_session(file: UploadFile, profile: Optional[str] = None, rec=None):
     session_id = str(uuid.uuid4())
-    pdf_path = os.path.join(TEMP_DIR, f"{session_id}.pdf")
-    content = await file.read()
-    with open(pdf_path, "wb") as f: f.write(content)
+    profile = _session_profile_name(profile)
+    pdf = await receive_upload(file, "pdf")
+    if pdf is None: raise HTTPException(400, "Empty resume upload")
+    if rec is not None: rec["request"]["pdf"] = await run_in_threadpool(store_blob, pdf)
 
     try:
-        reader = PdfReader(pdf_path)
-        text = "".join([p.extract_text() for p in reader.pages]).lower()
-    except: text = ""
+        text = await run_admitted("pdf", _extract_resume_text, pdf)
+    finally: pdf.close()
 
     questions = []
     keywords = {
@@ -166,8 +249,8 @@ async def start_resume(file: UploadFile = File(...)):
     if not found: found.add("fullstack")
 
     for d in found:
-        if d in QUESTION_BANK:
-            rounds = QUESTION_BANK[d].get("round_2_domain", [])
+        if has_domain(d):
+            rounds = round_questions(d, "round_2_domain")
             if rounds: questions.extend(random.sample(rounds, min(2, len(rounds))))
 
     questions.append({
@@ -179,14 +262,25 @@ async def start_resume(file: UploadFile = File(...)):
         "session_id": session_id,
         "domain": "resume",
         "level": "custom",
+        "profile": profile,
         "questions": questions,
-        "scores": [],
+        "scores": empty_score_slots(len(questions)),
+        "idempotency": {},
         "total_questions": len(questions)
     }
     save_session(session_id, session_data)
-    if os.path.exists(pdf_path): os.remove(pdf_path)
 
-    return {"session_id": session_id, "total_questions": len(questions)}
+    return {"session_id": session_id, "profile": profile, "total_questions": len(questions)}
+
+def _extract_resume_text(pdf: SpooledUpload) -> str:
+    try:
+        reader = PdfReader(pdf.stream())
+        return "".join([p.extract_text() for p in reader.pages]).lower()
+    except: return ""
+
+def _recorded_session(session_id: str) -> dict:
+    session = load_session(session_id)
+    return {"session_id": session_id, "questions": question_refs(session["questions"])}
 
 # -------------------------
 # Evaluate (UPDATED for TEXT MODE)
@@ -197,71 +291,223 @@ async def evaluate(
     index: int = Form(...),
     answer_text: str = Form(""),
     image: UploadFile = File(None), # ✅ Optional
-    audio: UploadFile = File(None)  # ✅ Optional
+    audio: UploadFile = File(None), # ✅ Optional
+    profile: Optional[str] = Form(None), # overrides the session's profile
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
+    request = {"session_id": session_id, "index": index, "answer_text": answer_text,
+               "profile": profile}
+    with recording("evaluate", request) as rec:
+        img = await receive_upload(image, "image")
+        aud = await receive_upload(audio, "audio")
+        if rec is not None:
+            rec["request"].update(
+                image=await run_in_threadpool(store_blob, img),
+                audio=await run_in_threadpool(store_blob, aud),
+                question=_recorded_question(session_id, index)
+            )
+        response = await submit_answer(session_id, index, answer_text, img, aud,
+                                       idempotency_key, profile)
+        if rec is not None: rec["response"] = score_summary(response["current_score"])
+        return response
+
+def _recorded_question(session_id: str, index: int):
     session = load_session(session_id)
-    if not session: raise HTTPException(404, "Session not found")
+    if not session or not 0 <= int(index) < len(session["questions"]):
+        return None
+    return question_refs([session["questions"][int(index)]])[0]
 
-    q_data = session["questions"][int(index)]
+# -------------------------
+# Evaluate (Async Jobs)
+# -------------------------
+@app.post("/interview/jobs", status_code=202)
+async def submit_job(
+    session_id: str = Form(...),
+    index: int = Form(...),
+    answer_text: str = Form(""),
+    image: UploadFile = File(None),
+    audio: UploadFile = File(None),
+    callback_url: Optional[str] = Form(None)
+):
+    """
+    Queue an evaluation and return its job id at once. Poll
+    /interview/jobs/{job_id}, or pass callback_url (or configure
+    JOB_CALLBACK_URL) to be notified when it finishes.
+    """
+    if callback_url and not jobs.callback_allowed(callback_url):
+        raise HTTPException(400, "callback_url is not an allowed callback target")
+
+    img = await receive_upload(image, "image")
+    aud = await receive_upload(audio, "audio")
+    with holding(img, aud):
+        session = load_session(session_id)
+        if not session: raise HTTPException(404, "Session not found")
+        if not 0 <= int(index) < len(session["questions"]):
+            raise HTTPException(400, "Question index out of range")
+        job_id = await run_in_threadpool(jobs.enqueue, session_id, index, answer_text,
+                                         img, aud, callback_url)
+
+    return {"job_id": job_id, "status": "queued", "poll": f"/interview/jobs/{job_id}"}
+
+@app.get("/interview/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get_job(job_id)
+    if not job: raise HTTPException(404, "Job not found")
+    return job
 
-    # Defaults
-    img_path = ""
-    audio_path = ""
+# -------------------------
+# Evaluate (Streaming, SSE)
+# -------------------------
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(sanitize_for_json(data))}\n\n"
+
+@app.post("/interview/evaluate/stream")
+async def evaluate_stream(
+    session_id: str = Form(...),
+    index: int = Form(...),
+    answer_text: str = Form(""),
+    image: UploadFile = File(None),
+    audio: UploadFile = File(None),
+    profile: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Same contract as /interview/evaluate, delivered as Server-Sent Events:
+    "text", "face" and "voice" partials as each stage completes, then a
+    "result" event carrying the usual evaluate response.
+    """
+    img = await receive_upload(image, "image")
+    aud = await receive_upload(audio, "audio")
+    ticket, stages = await stream_answer(session_id, index, answer_text, img, aud,
+                                         idempotency_key, profile)
+
+    async def events():
+        try:
+            async for stage, payload in stages:
+                yield _sse(stage, payload)
+        except HTTPException as e:
+            yield _sse("error", {"status": e.status_code, "detail": e.detail})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also frees the slot if the stream is never started
+        background=BackgroundTask(ticket.aclose)
+    )
 
-    # ✅ Handle Image (If provided)
-    if image:
-        img_bytes = await image.read()
-        if len(img_bytes) > 0:
-            img_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}.jpg")
-            with open(img_path, "wb") as f: f.write(img_bytes)
+# -------------------------
+# Evaluation Profiles
+# -------------------------
+@app.get("/interview/profiles")
+async def list_profiles():
+    """Selectable evaluation profiles with their engines and latency budgets."""
+    return {"default": DEFAULT_PROFILE, "profiles": PROFILES}
 
-    # ✅ Handle Audio (If provided)
-    if audio:
-        audio_bytes = await audio.read()
-        if len(audio_bytes) > 100:
-            audio_path = save_uploaded_audio_as_wav(audio, audio_bytes)
+# -------------------------
+# Live Draft Scoring
+# -------------------------
+@app.post("/interview/draft")
+async def update_draft(req: DraftUpdate):
+    """
+    Apply one edit to the candidate's draft and return live keyword and
+    clarity hints. `keep` is how many characters of the previous draft
+    survive; `append` replaces the rest. Send keep=0 to resync.
+    """
+    q_data = None
+    if get_draft(req.session_id, req.index) is None:
+        # First edit this worker sees; the draft itself may live on already
+        session = await run_in_threadpool(load_session, req.session_id)
+        if not session: raise HTTPException(404, "Session not found")
+        if not 0 <= req.index < len(session["questions"]):
+            raise HTTPException(400, "Question index out of range")
+        q_data = session["questions"][req.index]
 
     try:
-        # Run AI Evaluation
-        eval_res = evaluate_multimodal(
-            answer_text=answer_text,
-            keywords=q_data.get("keywords", []),
-            weight=q_data.get("weight", 1.0),
-            image_path=img_path,
-            audio_path=audio_path,
-            model_answer=q_data.get("model_answer", "")
-        )
-
-        result = sanitize_for_json(eval_res)
-        session["scores"].append(result)
-
-        is_finished = int(index) >= len(session["questions"]) - 1
-        final_summary = None
-
-        if is_finished:
-            total = sum(s["overall_marks"] for s in session["scores"])
-            final_summary = {
-                "total_marks": total,
-                "percentage": (total / (len(session["questions"]) * 10)) * 100,
-                "grade": "A" if total > 40 else "B"
-            }
-            session["final_result"] = final_summary
-
-        save_session(session_id, session)
-
-        return {
-            "finished": is_finished,
-            "current_score": result,
-            "final_result": final_summary
-        }
+        return await run_in_threadpool(apply_draft_edit, req.session_id, req.index,
+                                       req.keep, req.append, q_data)
+    except DraftTooLarge as e:
+        raise HTTPException(413, str(e))
+    except ValueError as e:
+        raise HTTPException(409, str(e))
 
+# -------------------------
+# Live Audio (WebSocket)
+# -------------------------
+@app.websocket("/interview/audio/live")
+async def live_audio(ws: WebSocket):
+    """
+    Stream an answer's audio while it is recorded and get it scored the
+    moment the candidate submits:
+
+      -> {"session_id", "index", "sample_rate", "channels", "format"}
+      <- {"type": "ready"}
+      -> binary PCM chunks ("format" s16le or f32le, interleaved)
+      <- {"type": "partial", "transcript", "duration", "wpm", "pace", ...}
+      -> {"type": "submit", "answer_text"?, "profile"?, "idempotency_key"?}
+      <- {"type": "result", ...same body as /interview/evaluate}
+
+    Failures send {"type": "error", "status", "detail"} and close.
+    """
+    await ws.accept()
+    request_id_var.set(ws.headers.get("x-request-id") or uuid.uuid4().hex)
+    live = None
+    try:
+        start = await ws.receive_json()
+        session_id, index = start.get("session_id"), int(start.get("index", -1))
+        session = load_session(session_id)
+        if not session: raise HTTPException(404, "Session not found")
+        if not 0 <= index < len(session["questions"]):
+            raise HTTPException(400, "Question index out of range")
+
+        async def send_partial(snapshot):
+            await ws.send_json(dict(sanitize_for_json(snapshot), type="partial"))
+
+        live = open_stream(sample_rate=start.get("sample_rate", 16000),
+                           channels=start.get("channels", 1),
+                           sample_format=start.get("format", "s16le"),
+                           on_update=send_partial)
+        await ws.send_json({"type": "ready"})
+
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                live.feed(message["bytes"])
+                continue
+            control = json.loads(message.get("text") or "{}")
+            if isinstance(control, dict) and control.get("type") == "submit":
+                break
+
+        outcome = await live.finish()
+        response = await submit_answer(session_id, index, control.get("answer_text", ""),
+                                       idempotency_key=control.get("idempotency_key"),
+                                       profile=control.get("profile"),
+                                       live_audio=outcome)
+        await ws.send_json(dict(sanitize_for_json(response), type="result"))
+        await ws.close()
+
+    except WebSocketDisconnect:
+        return
+    except (HTTPException, LiveAudioRejected, AdmissionRejected) as e:
+        status = getattr(e, "status_code", None) or e.status
+        await ws.send_json({"type": "error", "status": status, "detail": e.detail})
+        await ws.close(code=1013 if status in (429, 503) else 1008)
+    except (ValueError, TypeError, AttributeError):
+        await ws.send_json({"type": "error", "status": 400, "detail": "Malformed message"})
+        await ws.close(code=1008)
     finally:
-        if img_path and os.path.exists(img_path): os.remove(img_path)
-        if audio_path and os.path.exists(audio_path): os.remove(audio_path)
+        if live is not None:
+            close_stream(live)
 
 @app.get("/interview/session/{session_id}")
 async def get_session(session_id: str):
-    return load_session(session_id)
+    session = load_session(session_id)
+    if session:
+        session["scores"] = filled_scores(session)
+        session.pop("idempotency", None)
+    return session
 
 if __name__ == "__main__":
     import uvicorn
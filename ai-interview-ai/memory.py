@@ -0,0 +1,281 @@
+# memory.py - Memory accounting for engines, caches and requests
+
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from itertools import islice
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_SAMPLE_ENTRIES = 32
+_ENFORCE_INTERVAL = 1.0
+
+# name -> {"bytes": int, "seconds": float}, RSS growth while loading
+ENGINE_MEMORY = {}
+
+_caches = {}
+_lock = threading.Lock()
+_last_enforced = 0.0
+_baseline_snapshot = None
+
+_requests = {"count": 0, "peak_bytes": 0, "last_bytes": 0}
+_buffers = {"in_flight": 0, "peak": 0}
+
+
+def env_bytes(name: str) -> int:
+    """Read a size like 64MB / 512k / 1G from the environment (0 = unset)."""
+    raw = os.getenv(name, "").strip().upper()
+    if not raw:
+        return 0
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    raw = raw.rstrip("B")
+    mult = units.get(raw[-1:], 1)
+    return int(float(raw.rstrip("KMG")) * mult)
+
+
+PROCESS_SOFT_LIMIT = env_bytes("MEMORY_SOFT_LIMIT")
+
+
+# ============================
+# PROCESS & SIZE ESTIMATES
+# ============================
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def deep_sizeof(obj, seen=None, depth: int = 6) -> int:
+    """Approximate retained size of a Python object graph."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen or depth < 0:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += deep_sizeof(k, seen, depth - 1) + deep_sizeof(v, seen, depth - 1)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_sizeof(item, seen, depth - 1)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen, depth - 1)
+    elif hasattr(obj, "__slots__"):
+        for name in obj.__slots__:
+            if hasattr(obj, name):
+                size += deep_sizeof(getattr(obj, name), seen, depth - 1)
+    return size
+
+
+def sampled_size(values, count: int) -> int:
+    """Estimate a container's size from a sample of its entries."""
+    if not count:
+        return 0
+    sample = list(islice(values, _SAMPLE_ENTRIES))
+    if not sample:
+        return 0
+    return int(sum(deep_sizeof(v) for v in sample) / len(sample) * count)
+
+
+@contextmanager
+def track_load(name: str):
+    """Attribute the RSS growth of the enclosed import or model load to `name`."""
+    if name in ENGINE_MEMORY:
+        yield
+        return
+    before = rss_bytes()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ENGINE_MEMORY[name] = {
+            "bytes": max(rss_bytes() - before, 0),
+            "seconds": round(time.perf_counter() - t0, 3),
+        }
+
+
+# ============================
+# CACHE REGISTRY
+# ============================
+def register_cache(name: str, count, size, evict=None):
+    """
+    Expose a cache to accounting. `count()` returns entries, `size()`
+    estimated bytes and `evict()` drops the least valuable entry (returns
+    False when nothing is left). Its budget comes from MEMORY_BUDGET_<NAME>.
+    """
+    _caches[name] = {
+        "count": count,
+        "size": size,
+        "evict": evict,
+        "budget": env_bytes(f"MEMORY_BUDGET_{name.upper()}"),
+    }
+
+
+def set_budget(name: str, budget: int):
+    _caches[name]["budget"] = int(budget)
+
+
+def cache_report() -> dict:
+    out = {}
+    for name, c in _caches.items():
+        out[name] = {
+            "entries": c["count"](),
+            "bytes": c["size"](),
+            "budget": c["budget"] or None,
+            "evictable": c["evict"] is not None,
+        }
+    return out
+
+
+def _evict_until(cache: dict, target: int) -> int:
+    count, size = cache["count"](), cache["size"]()
+    if not count or size <= target:
+        return 0
+    # Sizes are sampled estimates, so evict by average entry size in one go
+    per_entry = max(size / count, 1)
+    needed = min(count, int((size - target) / per_entry) + 1)
+    evicted = 0
+    while evicted < needed and cache["evict"]() is not False:
+        evicted += 1
+    return evicted
+
+
+def enforce_budgets(force: bool = False) -> dict:
+    """
+    Evict from caches over their budget, then, if the process is above
+    MEMORY_SOFT_LIMIT, shrink the largest evictable caches by half until
+    it is back under. Rate limited unless forced.
+    """
+    global _last_enforced
+    now = time.monotonic()
+    if not force and now - _last_enforced < _ENFORCE_INTERVAL:
+        return {}
+    if not _lock.acquire(blocking=False):
+        return {}
+
+    evicted = {}
+    try:
+        _last_enforced = now
+        for name, c in _caches.items():
+            if c["evict"] and c["budget"] and c["size"]() > c["budget"]:
+                evicted[name] = _evict_until(c, c["budget"])
+
+        if PROCESS_SOFT_LIMIT and rss_bytes() > PROCESS_SOFT_LIMIT:
+            by_size = sorted(
+                ((c["size"](), name) for name, c in _caches.items() if c["evict"]),
+                reverse=True
+            )
+            for size, name in by_size:
+                if rss_bytes() <= PROCESS_SOFT_LIMIT:
+                    break
+                evicted[name] = evicted.get(name, 0) + _evict_until(_caches[name], size // 2)
+    finally:
+        _lock.release()
+    return evicted
+
+
+# ============================
+# PER-REQUEST ACCOUNTING
+# ============================
+@contextmanager
+def track_request():
+    """
+    Record the allocation peak of a request: exact Python-heap peak while
+    tracemalloc is tracing, otherwise RSS growth (noisy under concurrency).
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+    else:
+        start = rss_bytes()
+    try:
+        yield
+    finally:
+        if tracing and tracemalloc.is_tracing():
+            used = tracemalloc.get_traced_memory()[1] - start
+        else:
+            used = rss_bytes() - start
+        used = max(used, 0)
+        _requests["count"] += 1
+        _requests["last_bytes"] = used
+        _requests["peak_bytes"] = max(_requests["peak_bytes"], used)
+
+
+@contextmanager
+def hold_buffer(nbytes: int):
+    """Account request payload bytes held in memory for the enclosed block."""
+    _buffers["in_flight"] += nbytes
+    _buffers["peak"] = max(_buffers["peak"], _buffers["in_flight"])
+    try:
+        yield
+    finally:
+        _buffers["in_flight"] -= nbytes
+
+
+# ============================
+# TRACEMALLOC SNAPSHOTS
+# ============================
+def start_tracing(frames: int = 1):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_tracing():
+    global _baseline_snapshot
+    _baseline_snapshot = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def take_baseline():
+    global _baseline_snapshot
+    start_tracing()
+    _baseline_snapshot = tracemalloc.take_snapshot()
+    return len(_baseline_snapshot.traces)
+
+
+def snapshot_diff(top: int = 20, key_type: str = "lineno"):
+    """Top allocation changes since the baseline (or absolute top if none)."""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    if _baseline_snapshot is not None:
+        stats = snapshot.compare_to(_baseline_snapshot, key_type)
+        return [{"where": str(s.traceback), "size_diff": s.size_diff,
+                 "count_diff": s.count_diff, "size": s.size} for s in stats[:top]]
+    stats = snapshot.statistics(key_type)
+    return [{"where": str(s.traceback), "size": s.size, "count": s.count}
+            for s in stats[:top]]
+
+
+# ============================
+# REPORT
+# ============================
+def memory_report() -> dict:
+    traced = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+    return {
+        "rss_bytes": rss_bytes(),
+        "soft_limit_bytes": PROCESS_SOFT_LIMIT or None,
+        "engines": dict(ENGINE_MEMORY),
+        "caches": cache_report(),
+        "requests": dict(_requests),
+        "upload_buffers": {
+            "in_flight_bytes": _buffers["in_flight"],
+            "peak_bytes": _buffers["peak"],
+        },
+        "tracemalloc": {
+            "tracing": traced is not None,
+            "current_bytes": traced[0] if traced else None,
+            "peak_bytes": traced[1] if traced else None,
+            "baseline": _baseline_snapshot is not None,
+        },
+    }
@@ -0,0 +1,301 @@
+# polarity.py - Lexicon polarity scorer (drop-in for TextBlob's PatternAnalyzer)
+#
+#   python polarity.py build [--out polarity_lexicon.tsv]
+#   python polarity.py calibrate [--tolerance 0.02]
+#
+# Scores an answer's polarity in [-1, 1] the way TextBlob's default
+# analyzer does: tokens found in the pattern adjective lexicon (with
+# "-ly" adverbs derived from it) are averaged, an adverb in front scales
+# the next word by its intensity ("very good"), "no"/"not"/"never" flips
+# and halves it ("not good" = slightly bad), "!" boosts the word before it
+# and emoticons count as words of their own.
+#
+# The lexicon is compiled once into a dict (word -> slot) and flat arrays
+# (polarity, intensity, modifier flag) read from polarity_lexicon.tsv, so
+# scoring is one pass over the tokens with no TextBlob/NLTK import.
+# `build` regenerates the TSV from an installed TextBlob; the lexicon is
+# Tom De Smedt and Walter Daelemans' en-sentiment.xml, released as PDDL.
+#
+# `calibrate` scores every model answer (and every sentence of one) in
+# the question bank with both engines and exits non-zero when the mean
+# absolute difference exceeds --tolerance or a sentiment label
+# (positive / neutral / negative at +-0.1) differs.
+
+import os
+import re
+import sys
+import argparse
+import threading
+from array import array
+
+LEXICON_PATH = os.getenv(
+    "POLARITY_LEXICON",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "polarity_lexicon.tsv")
+)
+
+NEGATIONS = frozenset(("no", "not", "n't", "never"))
+# Everything but "." is split off either end of a token; "." only when it
+# does not end an abbreviation
+_PUNCTUATION = ".,;:!?()[]{}`''\"@#$^&*+-|=~_"
+_EDGE = tuple(_PUNCTUATION.replace(".", ""))
+_ABBREVIATIONS = frozenset((
+    "a.", "adj.", "adv.", "al.", "a.m.", "c.", "cf.", "comp.", "conf.", "def.",
+    "ed.", "e.g.", "esp.", "etc.", "ex.", "f.", "fig.", "gen.", "id.", "i.e.",
+    "int.", "l.", "m.", "Med.", "Mil.", "Mr.", "n.", "n.q.", "orig.", "pl.",
+    "pred.", "pres.", "p.m.", "ref.", "v.", "vs.", "w/",
+))
+_ABBR_RES = (re.compile(r"^[A-Za-z]\.$"), re.compile(r"^([A-Za-z]\.)+$"),
+             re.compile(r"^[A-Z][bcdfghjklmnpqrstvwxz]+.$"))
+_CONTRACTION_RE = re.compile(r"(?=n't|'d|'m|'s|'ll|'re|'ve)")
+_QUOTES = str.maketrans({q: f" {q} " for q in "“”‘’'\""})
+_SARCASM_RE = re.compile(r"\( ?! ?\)")
+
+EMOTICONS = {}
+for _polarity, _faces in (
+    (1.0, ("<3", "♥", ">:d", ":-d", ":d", "=-d", "=d", "x-d", "8-d")),
+    (0.75, (">:p", ":-p", ":p", ":-b", ":b", ":c)", ":o)", ":^)")),
+    (0.5, (">:)", ":-)", ":)", "=)", "=]", ":]", ":}", ":>", ":3", "8)", "8-)")),
+    (0.25, (">;]", ";-)", ";)", ";-]", ";]", ";d", ";^)", "*-)", "*)")),
+    (0.05, (">:o", ":-o", ":o", "o_o", "o.o", "°o°")),
+    (-0.25, (">:/", ":-/", ":/", ":\\", ">:\\", ":-.", ":-s", ":s", ">.>")),
+    (-0.75, (">:[", ":-(", ":(", "=(", ":-[", ":[", ":{", ":-<", ":c", ":-c", "=/")),
+    (-1.0, (":'(", ";'(")),
+):
+    EMOTICONS.update(dict.fromkeys(_faces, _polarity))
+
+
+# ============================
+# LEXICON TABLE
+# ============================
+class Lexicon:
+    """word -> slot in parallel polarity / intensity / modifier arrays."""
+
+    __slots__ = ("index", "polarity", "intensity", "modifier")
+
+    def __init__(self, rows):
+        self.index = {}
+        self.polarity = array("d")
+        self.intensity = array("d")
+        self.modifier = bytearray()
+        for word, p, i, is_modifier in rows:
+            self.index[word] = len(self.polarity)
+            self.polarity.append(p)
+            self.intensity.append(i)
+            self.modifier.append(1 if is_modifier else 0)
+
+    @classmethod
+    def load(cls, path: str = LEXICON_PATH) -> "Lexicon":
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#") or not line.strip():
+                    continue
+                word, p, i, m = line.rstrip("\n").split("\t")
+                rows.append((word, float(p), float(i), m == "1"))
+        return cls(rows)
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon() -> Lexicon:
+    global _lexicon
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                _lexicon = Lexicon.load()
+    return _lexicon
+
+
+# ============================
+# TOKENS
+# ============================
+def _split_chunk(t: str, out: list):
+    """Split one whitespace-separated chunk like pattern's find_tokens."""
+    tail = []
+    while t.startswith(_EDGE):
+        out.append(t[0])
+        t = t[1:]
+    while t.endswith(_EDGE + (".",)):
+        if t.endswith(_EDGE):
+            tail.append(t[-1])
+            t = t[:-1]
+        if t.endswith("..."):
+            tail.append("...")
+            t = t[:-3].rstrip(".")
+        if t.endswith("."):
+            if t in _ABBREVIATIONS or any(r.match(t) for r in _ABBR_RES):
+                break
+            tail.append(".")
+            t = t[:-1]
+    if t:
+        out.append(t)
+    out.extend(reversed(tail))
+
+
+def tokenize(text: str) -> list:
+    """Lowercased tokens with punctuation split off, as TextBlob scores them."""
+    text = _CONTRACTION_RE.sub(" ", text).translate(_QUOTES)
+    text = _SARCASM_RE.sub("(!)", text)
+    tokens = []
+    for chunk in text.split():
+        if chunk.isalnum():
+            tokens.append(chunk.lower())
+        elif chunk.lower() in EMOTICONS or chunk == "(!)":
+            tokens.append(chunk.lower())
+        else:
+            start = len(tokens)
+            _split_chunk(chunk, tokens)
+            tokens[start:] = [t.lower() for t in tokens[start:]]
+    return tokens
+
+
+# ============================
+# SCORING
+# ============================
+def polarity(text: str, lexicon: Lexicon = None) -> float:
+    """Polarity of text in [-1, 1]; 0.0 when no token carries sentiment."""
+    lex = lexicon or get_lexicon()
+    index, pol, inten, modifier = lex.index, lex.polarity, lex.intensity, lex.modifier
+
+    scores, intensities, negated = [], [], []
+    mod = None      # preceding modifier word ("really good")
+    neg = None      # preceding negation ("not good")
+    for w in tokenize(text):
+        slot = index.get(w)
+        if slot is not None:
+            if mod is None:
+                scores.append(pol[slot])
+                intensities.append(inten[slot])
+                negated.append(False)
+            else:
+                scores[-1] = max(-1.0, min(pol[slot] * intensities[-1], 1.0))
+                intensities[-1] = inten[slot]
+            if neg is not None:
+                intensities[-1] = 1.0 / intensities[-1]
+                negated[-1] = True
+            mod = w if modifier[slot] else None
+            neg = w if w in NEGATIONS else None
+            continue
+
+        if w in NEGATIONS:
+            neg = w
+        elif neg and len(w.strip("'")) > 1:
+            neg = None
+        if neg is not None and mod is not None and mod.endswith("ly"):
+            # "really not good"
+            negated[-1] = True
+            neg = None
+        elif mod and len(w) > 2:
+            mod = None
+        if w == "!" and scores:
+            scores[-1] = max(-1.0, min(scores[-1] * 1.25, 1.0))
+        elif w == "(!)":
+            scores.append(0.0)
+            intensities.append(1.0)
+            negated.append(False)
+        elif w in EMOTICONS:
+            scores.append(EMOTICONS[w])
+            intensities.append(1.0)
+            negated.append(False)
+
+    if not scores:
+        return 0.0
+    return sum(s * -0.5 if n else s for s, n in zip(scores, negated)) / len(scores)
+
+
+def polarities(texts) -> list:
+    """polarity() for many texts, sharing one lexicon lookup."""
+    lexicon = get_lexicon()
+    return [polarity(t, lexicon) for t in texts]
+
+
+def sentiment_label(p: float) -> str:
+    if p > 0.1:
+        return "positive"
+    if p < -0.1:
+        return "negative"
+    return "neutral"
+
+
+# ============================
+# CLI
+# ============================
+def build_lexicon(out: str = LEXICON_PATH) -> int:
+    """Write the TSV from TextBlob's loaded lexicon (adverbs included)."""
+    from textblob.en import sentiment
+
+    len(sentiment)      # loads the XML and derives the "-ly" adverbs
+    with open(out, "w", encoding="utf-8") as f:
+        f.write("# word\tpolarity\tintensity\tmodifier -- from pattern's en-sentiment.xml "
+                "(PDDL) via `python polarity.py build`\n")
+        for word in sorted(dict.keys(sentiment)):
+            entry = dict.__getitem__(sentiment, word)
+            p, _, i = entry[None]
+            f.write(f"{word}\t{p!r}\t{i!r}\t{1 if 'RB' in entry else 0}\n")
+    return len(sentiment)
+
+
+def calibration_corpus() -> list:
+    from question_index import load_bank
+
+    bank, _ = load_bank()
+    texts = []
+    for rounds in bank.values():
+        for questions in rounds.values():
+            for q in questions:
+                answer = q.get("model_answer") or ""
+                if not answer:
+                    continue
+                texts.append(answer)
+                texts.extend(s.strip() for s in re.split(r"(?<=[.!?])\s+", answer)
+                             if len(s.strip()) >= 5)
+    return texts
+
+
+def calibrate(tolerance: float) -> dict:
+    from textblob import TextBlob
+
+    texts = calibration_corpus()
+    ours = polarities(texts)
+    theirs = [float(TextBlob(t).sentiment.polarity) for t in texts]
+    diffs = [abs(a - b) for a, b in zip(ours, theirs)]
+    label_mismatches = [
+        {"text": t[:120], "lexicon": round(a, 4), "textblob": round(b, 4)}
+        for t, a, b in zip(texts, ours, theirs) if sentiment_label(a) != sentiment_label(b)
+    ]
+    mean_abs = sum(diffs) / len(diffs) if diffs else 0.0
+    return {
+        "texts": len(texts),
+        "tolerance": tolerance,
+        "mean_abs_diff": round(mean_abs, 6),
+        "max_abs_diff": round(max(diffs, default=0.0), 6),
+        "exact": sum(1 for d in diffs if d < 1e-9),
+        "label_mismatches": label_mismatches,
+        "ok": mean_abs <= tolerance and not label_mismatches,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lexicon polarity scorer")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_p = sub.add_parser("build", help="regenerate the lexicon TSV from TextBlob")
+    build_p.add_argument("--out", default=LEXICON_PATH)
+    cal_p = sub.add_parser("calibrate", help="compare with TextBlob on the question bank")
+    cal_p.add_argument("--tolerance", type=float, default=0.02,
+                       help="largest acceptable mean absolute polarity difference")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print(f"Wrote {build_lexicon(args.out)} entries to {args.out}")
+        return 0
+
+    import json
+    report = calibrate(args.tolerance)
+    print(json.dumps(report, indent=2))
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
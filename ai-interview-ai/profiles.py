@@ -0,0 +1,61 @@
+# profiles.py - Named evaluation profiles: which stages run, and how
+#
+# A profile picks the engine for every stage of evaluate_multimodal_stages.
+# It is chosen when a session starts (StartRequest.profile), stored with the
+# session and may be overridden per answer; every result reports the
+# profile and the engines that actually ran.
+#
+#   profile    stt      relevance  face  voice   budget: text only / all media
+#   fast       sphinx   keywords   off   off     0.1 s / 1.6 s
+#   standard   google   tfidf      on    on      0.25 s / 5.05 s
+#   full       google   semantic   on    on      1 s / 5.8 s
+#
+# stt:       "google" is the remote Web Speech API, "sphinx" runs locally
+#            (no network round trip, lower accuracy on accented speech).
+# relevance: "keywords" is the overlap of the answer's terms with the model
+#            answer's; "tfidf" the TF-IDF cosine; "semantic" the cosine of
+#            sentence embeddings (falls back to tfidf if the model is missing).
+# Skipped face/voice stages score like an answer without that media.
+#
+# The budgets are the sums of the per-stage p95 targets in budget_ms
+# ("text" covers relevance, keywords, clarity and sentiment), set for
+# one worker core and answers under two minutes of audio.
+
+import os
+
+PROFILES = {
+    "fast": {
+        "stt": "sphinx", "relevance": "keywords", "face": False, "voice": False,
+        "budget_ms": {"transcribe": 1500, "text": 100, "face": 0, "voice": 0},
+    },
+    "standard": {
+        "stt": "google", "relevance": "tfidf", "face": True, "voice": True,
+        "budget_ms": {"transcribe": 3000, "text": 250, "face": 1200, "voice": 600},
+    },
+    "full": {
+        "stt": "google", "relevance": "semantic", "face": True, "voice": True,
+        "budget_ms": {"transcribe": 3000, "text": 1000, "face": 1200, "voice": 600},
+    },
+}
+
+DEFAULT_PROFILE = os.getenv("EVAL_PROFILE", "standard")
+if DEFAULT_PROFILE not in PROFILES:
+    DEFAULT_PROFILE = "standard"
+
+
+def get_profile(name: str = None) -> dict:
+    """The named profile (default when None) with its name filled in."""
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown evaluation profile: {name}")
+    return dict(PROFILES[name], name=name)
+
+
+def session_profile(session: dict, override: str = None) -> dict:
+    """The profile for one answer: the request's override, else the session's."""
+    return get_profile(override or session.get("profile"))
+
+
+def profile_report(profile: dict, engines: dict) -> dict:
+    """What a result records about how it was produced."""
+    return {"name": profile["name"], "engines": engines}
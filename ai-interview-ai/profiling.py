@@ -0,0 +1,192 @@
+# profiling.py - Opt-in per-request profiling and stage timings
+
+import io
+import os
+import json
+import time
+import uuid
+import random
+import pstats
+import logging
+import cProfile
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profile_artifacts")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_MAX_ARTIFACTS = int(os.getenv("PROFILE_MAX_ARTIFACTS", "50"))
+PROFILE_HEADER = "x-profile-token"
+
+# logs.py imports this module, so use the stdlib logger (same handlers)
+log = logging.getLogger(__name__)
+
+# Stage name -> seconds for the current request. The dict object itself is
+# shared, so stages that run in the threadpool still report into it.
+_stage_timings = ContextVar("stage_timings", default=None)
+# Profiles recorded by the threads doing the current request's work (a list
+# shared like the timings dict), or None when the request is not profiled
+_profiling = ContextVar("profiling", default=None)
+
+# Only one request is profiled at once
+_profiler_busy = threading.Lock()
+# The profiler enabled on this thread, so nested calls do not replace it
+_thread_profiler = threading.local()
+
+
+# ============================
+# STAGE TIMINGS
+# ============================
+@contextmanager
+def stage_timer(name: str):
+    timings = _stage_timings.get()
+    if timings is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round(timings.get(name, 0.0) + time.perf_counter() - t0, 6)
+
+
+def begin_request_timings() -> dict:
+    """Start collecting stage timings for this request (or keep collecting)."""
+    timings = _stage_timings.get()
+    if timings is None:
+        timings = {}
+        _stage_timings.set(timings)
+    return timings
+
+
+def current_timings():
+    """This request's stage timings so far, or None outside a request."""
+    return _stage_timings.get()
+
+
+# ============================
+# SAMPLING
+# ============================
+def should_profile(headers) -> bool:
+    token = headers.get(PROFILE_HEADER)
+    if token and PROFILE_TOKEN and token == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def request_profiler(method: str, path: str):
+    """
+    Profile the enclosed request if no other request is being profiled.
+    Yields a dict the caller may add fields to (e.g. status); the artifact
+    is written when the block exits.
+
+    Nothing is profiled on the event loop, where other requests' coroutines
+    interleave. The blocking work the request hands to worker threads
+    (run_admitted, guarded stages) is profiled there by profiled_call, and
+    those per-thread profiles are merged into the artifact.
+    """
+    if not _profiler_busy.acquire(blocking=False):
+        yield None
+        return
+
+    meta = {
+        "id": f"{int(time.time())}-{uuid.uuid4().hex[:8]}",
+        "method": method,
+        "path": path,
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    timings = begin_request_timings()
+    profiles = []
+    token = _profiling.set(profiles)
+    t0 = time.perf_counter()
+    try:
+        yield meta
+    finally:
+        _profiling.reset(token)
+        _profiler_busy.release()
+        meta["duration"] = round(time.perf_counter() - t0, 6)
+        meta["stage_timings"] = timings
+        meta["profiled_calls"] = len(profiles)
+        try:
+            _save_artifact(meta, profiles)
+        except Exception as e:
+            log.warning("Profile artifact write failed", extra={"error": str(e)})
+
+
+def profiled_call(fn, *args, **kwargs):
+    """
+    Call fn; inside a profiled request, record it with a profiler enabled on
+    this (worker) thread. Pass this to the threadpool in place of fn.
+    """
+    profiles = _profiling.get()
+    if profiles is None or getattr(_thread_profiler, "active", None) is not None:
+        return fn(*args, **kwargs)
+    profiler = cProfile.Profile()
+    _thread_profiler.active = profiler
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        _thread_profiler.active = None
+        profiles.append(profiler)
+
+
+# ============================
+# ARTIFACT RING
+# ============================
+def _save_artifact(meta: dict, profiles: list):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, meta["id"])
+    if profiles:
+        # A request that offloaded nothing has only its metadata
+        stats = pstats.Stats(profiles[0])
+        stats.add(*profiles[1:])
+        stats.dump_stats(base + ".prof")
+    with open(base + ".json", "w") as f:
+        json.dump(meta, f, indent=2)
+    _trim_ring()
+
+
+def _trim_ring():
+    metas = sorted(n for n in os.listdir(PROFILE_DIR) if n.endswith(".json"))
+    for name in metas[:-PROFILE_MAX_ARTIFACTS] if PROFILE_MAX_ARTIFACTS else metas:
+        artifact_id = name[:-len(".json")]
+        for ext in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, artifact_id + ext))
+            except OSError:
+                pass
+
+
+def list_artifacts() -> list:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    out = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if name.endswith(".json"):
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                out.append(json.load(f))
+    return out
+
+
+def artifact_path(artifact_id: str, ext: str) -> str:
+    path = os.path.join(PROFILE_DIR, os.path.basename(artifact_id) + ext)
+    return path if os.path.exists(path) else None
+
+
+def artifact_summary(artifact_id: str, top: int = 40) -> dict:
+    meta_path = artifact_path(artifact_id, ".json")
+    prof_path = artifact_path(artifact_id, ".prof")
+    if not meta_path:
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    buf = io.StringIO()
+    if prof_path:
+        pstats.Stats(prof_path, stream=buf).sort_stats("cumulative").print_stats(top)
+    meta["top_functions"] = buf.getvalue()
+    return meta
@@ -0,0 +1,296 @@
+# question_index.py - Question bank loading, hot reload and derived indexes
+#
+# Banks are read from QUESTION_BANK_DIR (one <domain>.json / .yaml file per
+# domain, see export_bank) and fall back to the built-in QUESTION_BANK. The
+# structures derived from a bank are pickled under QUESTION_ARTIFACT_DIR
+# (default: the user's cache directory, never the source tree), keyed by
+# the bank's content hash and the settings compiled into them (the fuzzy
+# keyword distances), so an unchanged bank loads them directly.
+#
+# Lookups never read files. At most every QUESTION_BANK_RELOAD_SECONDS a
+# lookup starts a background thread that checks the bank files and, when
+# they changed, builds the new state completely before swapping it in as
+# one object, so a request sees either the old bank or the new one.
+
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+
+from question_bank import QUESTION_BANK
+from memory import register_cache, deep_sizeof
+from logs import get_logger
+
+log = get_logger(__name__)
+
+QUESTION_BANK_DIR = os.getenv("QUESTION_BANK_DIR", "question_banks")
+QUESTION_ARTIFACT_DIR = os.getenv(
+    "QUESTION_ARTIFACT_DIR",
+    os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                 "ai-interview", "question_banks")
+)
+RELOAD_CHECK_SECONDS = float(os.getenv("QUESTION_BANK_RELOAD_SECONDS", "5"))
+ARTIFACT_FORMAT = 2
+
+LEVEL_ROUNDS = {
+    "easy": "round_1_background",
+    "medium": "round_2_domain",
+    "hard": "round_3_project",
+}
+BANK_EXTENSIONS = (".json", ".yaml", ".yml")
+
+# {"index", "hash", "versions", "mtimes"}; replaced whole, never mutated
+_current = None
+_state_lock = threading.Lock()     # check scheduling and the swap
+_load_lock = threading.Lock()      # one build at a time
+_reload = {"running": False, "last_check": 0.0}
+
+
+# ============================
+# BANK FILES
+# ============================
+def _bank_files() -> list:
+    if not os.path.isdir(QUESTION_BANK_DIR):
+        return []
+    return sorted(
+        os.path.join(QUESTION_BANK_DIR, n) for n in os.listdir(QUESTION_BANK_DIR)
+        if n.endswith(BANK_EXTENSIONS)
+    )
+
+
+def _read_bank_file(path: str) -> dict:
+    with open(path) as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        import yaml
+        return yaml.safe_load(f)
+
+
+def load_bank():
+    """Return (bank, versions) from QUESTION_BANK_DIR, or the built-in bank."""
+    files = _bank_files()
+    if not files:
+        return QUESTION_BANK, {"builtin": "builtin"}
+
+    bank, versions = {}, {}
+    for path in files:
+        doc = _read_bank_file(path)
+        domain = doc.get("domain") or os.path.splitext(os.path.basename(path))[0]
+        bank[domain] = doc["rounds"]
+        versions[domain] = str(doc.get("version", "unversioned"))
+    return bank, versions
+
+
+def export_bank(out_dir: str, version: str = "1"):
+    """Write the built-in bank out as one versioned JSON file per domain."""
+    os.makedirs(out_dir, exist_ok=True)
+    for domain, rounds in QUESTION_BANK.items():
+        with open(os.path.join(out_dir, f"{domain}.json"), "w") as f:
+            json.dump({"domain": domain, "version": version, "rounds": rounds},
+                      f, indent=2, ensure_ascii=False)
+
+
+def bank_hash(bank: dict) -> str:
+    canonical = json.dumps(bank, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def question_id(domain: str, question: dict) -> str:
+    return hashlib.sha1(f"{domain}\x00{question['q']}".encode("utf-8")).hexdigest()[:12]
+
+
+# ============================
+# DERIVED STRUCTURES
+# ============================
+def build_question_index(bank: dict) -> dict:
+    """
+    Flatten each domain once into immutable per-round and "all" tuples so
+    request handlers only copy a ready-made sequence. Every question gets a
+    stable content-derived "id"; "by_id" maps ids back to questions.
+    """
+    index = {"by_id": {}, "domains": {}}
+    for domain, rounds in bank.items():
+        entry = {}
+        for rk, qs in rounds.items():
+            entry[rk] = tuple(dict(q, id=q.get("id") or question_id(domain, q)) for q in qs)
+            index["by_id"].update((q["id"], q) for q in entry[rk])
+        entry["all"] = tuple(q for rk in rounds for q in entry[rk])
+        index["domains"][domain] = entry
+    return index
+
+
+def _build_artifacts(bank: dict) -> dict:
+    from evaluator import compile_keywords
+    from text_analysis import AnalyzedText
+
+    index = build_question_index(bank)
+    questions = index["by_id"].values()
+    return {
+        "format": ARTIFACT_FORMAT,
+        "index": index,
+        "references": {q["model_answer"]: AnalyzedText(q["model_answer"])
+                       for q in questions if q.get("model_answer")},
+        "keywords": {tuple(q.get("keywords", [])): compile_keywords(q.get("keywords", []))
+                     for q in questions},
+    }
+
+
+def _artifact_path(content_hash: str) -> str:
+    from keyword_match import DISTANCE_STEPS
+
+    # Compiled matchers carry the edit limits; other limits need other artifacts
+    settings = hashlib.sha1(repr((ARTIFACT_FORMAT, DISTANCE_STEPS)).encode()).hexdigest()[:12]
+    return os.path.join(QUESTION_ARTIFACT_DIR, f"{content_hash}-{settings}.pkl")
+
+
+def _load_artifacts(content_hash: str):
+    path = _artifact_path(content_hash)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            artifacts = pickle.load(f)
+        return artifacts if artifacts.get("format") == ARTIFACT_FORMAT else None
+    except Exception as e:
+        log.warning("Question artifact load failed", extra={"error": str(e)})
+        return None
+
+
+def _save_artifacts(content_hash: str, artifacts: dict):
+    try:
+        os.makedirs(QUESTION_ARTIFACT_DIR, exist_ok=True)
+        path = _artifact_path(content_hash)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(artifacts, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        log.warning("Question artifact save failed", extra={"error": str(e)})
+
+
+def _build_state(bank: dict, versions: dict, mtimes: dict) -> dict:
+    from evaluator import seed_keyword_matchers
+    from text_analysis import seed_references
+
+    content_hash = bank_hash(bank)
+    if _current is not None and content_hash == _current["hash"]:
+        return dict(_current, versions=versions, mtimes=mtimes)
+
+    artifacts = _load_artifacts(content_hash)
+    if artifacts is None:
+        artifacts = _build_artifacts(bank)
+        _save_artifacts(content_hash, artifacts)
+
+    # Caches only gain entries, so seeding before the swap is safe
+    seed_references(artifacts["references"])
+    seed_keyword_matchers(artifacts["keywords"])
+    return {"index": artifacts["index"], "hash": content_hash,
+            "versions": versions, "mtimes": mtimes}
+
+
+def _current_mtimes() -> dict:
+    return {p: os.stat(p).st_mtime_ns for p in _bank_files()}
+
+
+def reload_bank() -> bool:
+    """
+    Re-read the bank files if their set or mtimes changed and swap in the
+    new state. Blocking; returns True when a new state was installed.
+    """
+    global _current
+    with _load_lock:
+        try:
+            mtimes = _current_mtimes()
+            if _current is not None and mtimes == _current["mtimes"]:
+                return False
+            bank, versions = load_bank()
+            state = _build_state(bank, versions, mtimes)
+        except Exception as e:
+            # Keep serving the last good bank
+            log.error("Question bank reload failed", extra={"error": str(e)})
+            if _current is not None:
+                return False
+            state = _build_state(QUESTION_BANK, {"builtin": "builtin"}, None)
+        with _state_lock:
+            _current = state
+        return True
+
+
+def _reload_in_background():
+    try:
+        reload_bank()
+    finally:
+        with _state_lock:
+            _reload["running"] = False
+
+
+def _maybe_reload():
+    """Schedule a background check of the bank files (throttled)."""
+    now = time.monotonic()
+    with _state_lock:
+        if (_reload["running"] or _current is None
+                or now - _reload["last_check"] < RELOAD_CHECK_SECONDS):
+            return
+        _reload["running"] = True
+        _reload["last_check"] = now
+    threading.Thread(target=_reload_in_background, daemon=True,
+                     name="question-bank-reload").start()
+
+
+# ============================
+# LOOKUPS
+# ============================
+def _state() -> dict:
+    state = _current
+    if state is None:
+        # First use only; the app loads the bank at startup (preload or the
+        # startup hook), so requests normally never get here
+        reload_bank()
+        state = _current
+    _maybe_reload()
+    return state
+
+
+def get_question_index() -> dict:
+    return _state()["index"]
+
+
+def bank_info() -> dict:
+    state = _state()
+    return {"hash": state["hash"], "versions": dict(state["versions"])}
+
+
+def has_domain(domain_key: str) -> bool:
+    return domain_key in get_question_index()["domains"]
+
+
+def round_questions(domain_key: str, round_key: str) -> tuple:
+    return get_question_index()["domains"].get(domain_key, {}).get(round_key, ())
+
+
+def get_question(question_id: str):
+    return get_question_index()["by_id"].get(question_id)
+
+
+def questions_for(domain_key: str, level: str) -> list:
+    """Fresh, mutable list of questions for a domain and difficulty level."""
+    domain = get_question_index()["domains"][domain_key]
+    rk = LEVEL_ROUNDS.get(level) if level and level != "all" else None
+    return list(domain.get(rk, domain["all"]) if rk else domain["all"])
+
+
+register_cache(
+    "question_index",
+    count=lambda: len(_current["index"]["by_id"]) if _current else 0,
+    size=lambda: deep_sizeof(_current["index"], depth=8) if _current else 0,
+)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 3 or sys.argv[1] != "export":
+        print("usage: python question_index.py export <dir> [version]")
+        sys.exit(1)
+    export_bank(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else "1")
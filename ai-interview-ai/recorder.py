@@ -0,0 +1,96 @@
+# recorder.py - Opt-in capture of real traffic for replay.py
+#
+# With RECORD_DIR set, /interview/start, /interview/resume/start and
+# /interview/evaluate append one event per request to RECORD_DIR/events.jsonl:
+# the request fields needed to reproduce it (text, question ids, media by
+# sha256), the status, the latency and the scores it produced. Media bodies
+# are stored once per hash under RECORD_DIR/blobs/; set RECORD_MEDIA=0 to
+# keep only their hashes. Nothing else about the caller (headers, client
+# address, idempotency keys) is kept.
+
+import os
+import json
+import time
+import fcntl
+import random
+from contextlib import contextmanager
+
+from logs import get_logger
+
+RECORD_DIR = os.getenv("RECORD_DIR", "")
+RECORD_SAMPLE_RATE = float(os.getenv("RECORD_SAMPLE_RATE", "1"))
+RECORD_MEDIA = os.getenv("RECORD_MEDIA", "1") == "1"
+EVENTS_FILE = "events.jsonl"
+BLOBS_DIR = "blobs"
+BREAKDOWN_FIELDS = ("technical_accuracy", "relevance", "completeness", "clarity",
+                    "visual_confidence", "vocal_confidence", "text_confidence")
+
+log = get_logger(__name__)
+
+
+def enabled() -> bool:
+    return bool(RECORD_DIR)
+
+
+def question_refs(questions: list) -> list:
+    """Bank questions by id; custom ones (e.g. from resumes) in full."""
+    return [q["id"] if q.get("id") else q for q in questions]
+
+
+def score_summary(result: dict) -> dict:
+    breakdown = (result or {}).get("breakdown", {})
+    return {
+        "overall_marks": (result or {}).get("overall_marks"),
+        "breakdown": {f: breakdown.get(f) for f in BREAKDOWN_FIELDS},
+    }
+
+
+def store_blob(upload):
+    """Keep an upload's body under its sha256 once; returns the hash."""
+    if upload is None:
+        return None
+    if RECORD_MEDIA:
+        path = os.path.join(RECORD_DIR, BLOBS_DIR, upload.digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            upload.save_to(tmp_path)
+            os.replace(tmp_path, path)
+    return upload.digest
+
+
+def _append(event: dict):
+    os.makedirs(RECORD_DIR, exist_ok=True)
+    line = json.dumps(event, separators=(",", ":")) + "\n"
+    with open(os.path.join(RECORD_DIR, EVENTS_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.write(line)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def recording(endpoint: str, request: dict = None):
+    """
+    Record the enclosed request. Yields the event dict (or None when not
+    recording) so the handler can add request fields and the response.
+    """
+    if not RECORD_DIR or random.random() >= RECORD_SAMPLE_RATE:
+        yield None
+        return
+
+    event = {"t": time.time(), "endpoint": endpoint, "request": dict(request or {}),
+             "status": 200, "response": None}
+    t0 = time.perf_counter()
+    try:
+        yield event
+    except Exception as e:
+        event["status"] = getattr(e, "status_code", None) or getattr(e, "status", 500)
+        raise
+    finally:
+        event["latency"] = round(time.perf_counter() - t0, 6)
+        try:
+            _append(event)
+        except OSError as e:
+            log.warning("Traffic record write failed", extra={"error": str(e)})
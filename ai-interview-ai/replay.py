@@ -0,0 +1,315 @@
+# replay.py - Replay recorded traffic against a build and compare the runs
+#
+#   python replay.py run --archive recordings/ --app-dir /path/to/build \
+#       [--speed 1.0] [--concurrency 8] --out candidate.json
+#   python replay.py compare candidate.json [other.json]
+#
+# `run` imports main.app from --app-dir in a scratch working directory and
+# drives every event recorded by recorder.py against it in-process, at the
+# recorded pace divided by --speed (0 = as fast as possible). Replayed
+# sessions get exactly the questions that were recorded, so each answer
+# is scored against the same question as in production.
+#
+# `compare` prints per-endpoint latency deltas and per-answer overall_marks
+# and breakdown drift: between the recording and one run, or between two
+# runs (e.g. the current build and a candidate).
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from statistics import mean, median
+
+from recorder import EVENTS_FILE, BLOBS_DIR, BREAKDOWN_FIELDS, score_summary
+
+TOP_DRIFT = 10
+
+
+# ============================
+# ARCHIVE
+# ============================
+def load_events(archive: str) -> list:
+    events = []
+    with open(os.path.join(archive, EVENTS_FILE)) as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    events.sort(key=lambda e: e["t"])
+    for seq, event in enumerate(events):
+        event["seq"] = seq
+    return events
+
+
+def read_blob(archive: str, digest: str):
+    path = os.path.join(archive, BLOBS_DIR, digest)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# ============================
+# REPLAY
+# ============================
+def load_app(app_dir: str):
+    """Import the build under test from a scratch directory."""
+    app_dir = os.path.abspath(app_dir)
+    os.environ.pop("RECORD_DIR", None)
+    os.chdir(tempfile.mkdtemp(prefix="replay-"))
+    sys.path.insert(0, app_dir)
+    for name in ("main", "recorder"):
+        sys.modules.pop(name, None)
+    import main
+    import question_index
+    import session_store
+    return main.app, question_index, session_store
+
+
+class Replayer:
+    def __init__(self, archive: str, app_dir: str, speed: float, concurrency: int):
+        import httpx
+
+        self.archive = archive
+        self.speed = speed
+        self.slots = asyncio.Semaphore(concurrency)
+        app, self.question_index, self.session_store = load_app(app_dir)
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://replay", timeout=None
+        )
+        self.sessions = {}     # recorded session id -> future of replayed id
+
+    def _session_future(self, recorded_id: str):
+        if recorded_id not in self.sessions:
+            self.sessions[recorded_id] = asyncio.get_running_loop().create_future()
+        return self.sessions[recorded_id]
+
+    def _pin_questions(self, session_id: str, refs: list) -> bool:
+        """Give the replayed session the recorded questions, in order."""
+        questions = []
+        for ref in refs:
+            q = self.question_index.get_question(ref) if isinstance(ref, str) else ref
+            if q is None:
+                return False
+            questions.append(dict(q))
+        session = self.session_store.load_session(session_id)
+        session["questions"] = questions
+        session["scores"] = self.session_store.empty_score_slots(len(questions))
+        session["total_questions"] = len(questions)
+        self.session_store.save_session(session_id, session)
+        return True
+
+    async def _prepare(self, event: dict):
+        """(path, request kwargs) for an event, or a reason to skip it."""
+        req = event["request"]
+        if event["endpoint"] == "start":
+            return "/interview/start", {"json": req}
+
+        if event["endpoint"] == "resume":
+            pdf = read_blob(self.archive, req.get("pdf") or "")
+            if pdf is None:
+                return "missing_media"
+            return "/interview/resume/start", {
+                "files": {"file": ("resume.pdf", pdf, "application/pdf")}
+            }
+
+        future = self.sessions.get(req["session_id"])
+        session_id = await future if future is not None else None
+        if session_id is None:
+            return "unknown_session"
+        files = {}
+        for kind in ("image", "audio"):
+            if req.get(kind):
+                blob = read_blob(self.archive, req[kind])
+                if blob is None:
+                    return "missing_media"
+                files[kind] = (kind, blob, "application/octet-stream")
+        data = {"session_id": session_id, "index": str(req["index"]),
+                "answer_text": req.get("answer_text", "")}
+        if req.get("profile"):
+            data["profile"] = req["profile"]
+        return "/interview/evaluate", {"data": data, "files": files or None}
+
+    async def replay_event(self, event: dict, started: float, t0: float) -> dict:
+        if self.speed > 0:
+            await asyncio.sleep(max(started + (event["t"] - t0) / self.speed - time.monotonic(), 0))
+
+        record = {
+            "seq": event["seq"], "endpoint": event["endpoint"],
+            "question": event["request"].get("question"),
+            "recorded_status": event["status"], "recorded_latency": event["latency"],
+            "recorded_scores": event["response"] if event["endpoint"] == "evaluate" else None,
+            "status": None, "latency": None, "scores": None, "skipped": None,
+        }
+        is_start = event["endpoint"] in ("start", "resume")
+        recorded_sid = (event.get("response") or {}).get("session_id") if is_start else None
+
+        try:
+            # Answers wait for their session here, before taking a slot
+            prepared = await self._prepare(event)
+            if isinstance(prepared, str):
+                record["skipped"] = prepared
+                return record
+
+            path, kwargs = prepared
+            async with self.slots:
+                t = time.perf_counter()
+                resp = await self.client.post(path, **kwargs)
+                record["latency"] = round(time.perf_counter() - t, 6)
+            record["status"] = resp.status_code
+
+            body = resp.json() if resp.status_code == 200 else None
+            if body and event["endpoint"] == "evaluate":
+                record["scores"] = score_summary(body["current_score"])
+            if body and recorded_sid:
+                refs = event["response"]["questions"]
+                if await asyncio.to_thread(self._pin_questions, body["session_id"], refs):
+                    self._session_future(recorded_sid).set_result(body["session_id"])
+                else:
+                    record["skipped"] = "questions_not_in_build"
+            return record
+        finally:
+            # Answers to a session that could not be replayed are skipped
+            if recorded_sid and not self._session_future(recorded_sid).done():
+                self._session_future(recorded_sid).set_result(None)
+
+    async def run(self, events: list) -> list:
+        # Register sessions up front so answers wait for their start event
+        for event in events:
+            if event["endpoint"] in ("start", "resume") and event.get("response"):
+                self._session_future(event["response"]["session_id"])
+
+        t0 = events[0]["t"] if events else 0.0
+        started = time.monotonic()
+        try:
+            return list(await asyncio.gather(
+                *(self.replay_event(e, started, t0) for e in events)
+            ))
+        finally:
+            await self.client.aclose()
+
+
+# ============================
+# COMPARISON
+# ============================
+def _percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * pct), len(values) - 1)]
+
+
+def _latency_stats(values: list) -> dict:
+    if not values:
+        return {"n": 0}
+    return {"n": len(values), "mean": round(mean(values), 4),
+            "p50": round(median(values), 4), "p95": round(_percentile(values, 0.95), 4)}
+
+
+def compare(base: list, cand: list = None) -> dict:
+    """
+    Compare one run against the recording (cand=None) or two runs matched
+    by event sequence number.
+    """
+    if cand is None:
+        pairs = [({"status": r["recorded_status"], "latency": r["recorded_latency"],
+                   "scores": r["recorded_scores"]}, r) for r in base]
+    else:
+        by_seq = {r["seq"]: r for r in cand}
+        pairs = [(r, by_seq[r["seq"]]) for r in base if r["seq"] in by_seq]
+
+    latency = {}
+    for endpoint in ("start", "resume", "evaluate"):
+        rows = [(b["latency"], c["latency"]) for b, c in pairs
+                if c["endpoint"] == endpoint
+                and b["latency"] is not None and c["latency"] is not None]
+        if not rows:
+            continue
+        b_stats = _latency_stats([b for b, _ in rows])
+        c_stats = _latency_stats([c for _, c in rows])
+        latency[endpoint] = {
+            "baseline": b_stats, "candidate": c_stats,
+            "mean_delta": round(c_stats["mean"] - b_stats["mean"], 4),
+            "p95_delta": round(c_stats["p95"] - b_stats["p95"], 4),
+        }
+
+    drifts = []
+    field_abs = {f: [] for f in BREAKDOWN_FIELDS}
+    for b, c in pairs:
+        if not (b.get("scores") and c.get("scores")):
+            continue
+        before, after = b["scores"], c["scores"]
+        delta = (after["overall_marks"] or 0) - (before["overall_marks"] or 0)
+        drifts.append({"seq": c["seq"], "question": c.get("question"),
+                       "before": before["overall_marks"], "after": after["overall_marks"],
+                       "delta": round(delta, 3)})
+        for f in BREAKDOWN_FIELDS:
+            field_abs[f].append(abs((after["breakdown"].get(f) or 0) -
+                                    (before["breakdown"].get(f) or 0)))
+
+    abs_deltas = [abs(d["delta"]) for d in drifts]
+    return {
+        "events": len(pairs),
+        "status_mismatches": sum(1 for b, c in pairs
+                                 if c["status"] is not None and b["status"] != c["status"]),
+        "skipped": sum(1 for _, c in pairs if c["skipped"]),
+        "latency": latency,
+        "drift": {
+            "answers": len(drifts),
+            "changed": sum(1 for d in abs_deltas if d > 0),
+            "mean_abs_overall_marks": round(mean(abs_deltas), 3) if drifts else 0.0,
+            "max_abs_overall_marks": round(max(abs_deltas), 3) if drifts else 0.0,
+            "mean_abs_breakdown": {f: round(mean(v), 3) if v else 0.0
+                                   for f, v in field_abs.items()},
+            "largest": sorted(drifts, key=lambda d: abs(d["delta"]), reverse=True)[:TOP_DRIFT],
+        },
+    }
+
+
+# ============================
+# CLI
+# ============================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded interview traffic")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="replay an archive against a build")
+    run_p.add_argument("--archive", required=True)
+    run_p.add_argument("--app-dir", default=os.path.dirname(os.path.abspath(__file__)),
+                       help="directory containing the build's main.py")
+    run_p.add_argument("--speed", type=float, default=1.0,
+                       help="pace multiplier; 0 replays as fast as possible")
+    run_p.add_argument("--concurrency", type=int, default=8)
+    run_p.add_argument("--out", required=True)
+
+    cmp_p = sub.add_parser("compare", help="compare a run with the recording or another run")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("candidate", nargs="?")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        archive = os.path.abspath(args.archive)
+        out = os.path.abspath(args.out)
+        events = load_events(archive)
+        replayer = Replayer(archive, args.app_dir, args.speed, args.concurrency)
+        records = asyncio.run(replayer.run(events))
+        with open(out, "w") as f:
+            json.dump(records, f)
+        print(f"Replayed {len(records)} events into {out}", file=sys.stderr)
+        print(json.dumps(compare(records), indent=2))
+        return
+
+    with open(args.baseline) as f:
+        base = json.load(f)
+    cand = None
+    if args.candidate:
+        with open(args.candidate) as f:
+            cand = json.load(f)
+    print(json.dumps(compare(base, cand), indent=2))
+
+
+if __name__ == "__main__":
+    main()
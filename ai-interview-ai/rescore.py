@@ -0,0 +1,218 @@
+# rescore.py - Offline bulk re-scoring of saved sessions
+#
+#   python rescore.py --tag v2 [--sessions-dir saved_sessions] [--workers 8]
+#
+# Recomputes every stored answer with the current scoring code, writes the
+# results to <sessions-dir>/rescored/<tag>/ and prints a drift summary.
+# Progress is checkpointed in drift.jsonl there, so an interrupted run
+# resumes where it stopped when started again with the same tag. A session
+# that cannot be rescored (corrupt file, malformed scores) is checkpointed
+# with its error and listed in the summary; the run carries on without it.
+
+import os
+import sys
+import json
+import time
+import argparse
+from itertools import islice
+from collections import deque
+from multiprocessing import Pool, cpu_count
+
+from evaluator import rescore_result, sanitize_for_json
+from session_store import (
+    SESSIONS_DIR, iter_session_ids, load_session, final_summary
+)
+
+BREAKDOWN_FIELDS = ("technical_accuracy", "relevance", "completeness",
+                    "clarity", "text_confidence")
+CHECKPOINT_FILE = "drift.jsonl"
+MAX_REPORTED_ERRORS = 20
+
+
+# ============================
+# RESCORING (runs in workers)
+# ============================
+def rescore_session(session: dict, tag: str):
+    """Return (rescored session, drift record) for one stored session."""
+    drift = {
+        "session_id": session["session_id"],
+        "answers": 0, "changed": 0,
+        "overall_abs": 0.0, "overall_max": 0.0,
+        "fields_abs": {f: 0.0 for f in BREAKDOWN_FIELDS},
+        "total_before": 0.0, "total_after": 0.0,
+    }
+
+    new_scores = []
+    for q_data, old in zip(session["questions"], session["scores"]):
+        if old is None:
+            new_scores.append(None)
+            continue
+
+        new = rescore_result(old, q_data.get("keywords", []),
+                             q_data.get("model_answer", ""))
+        new_scores.append(new)
+
+        delta = abs(new["overall_marks"] - old.get("overall_marks", 0.0))
+        drift["answers"] += 1
+        drift["changed"] += 1 if delta > 0 else 0
+        drift["overall_abs"] += delta
+        drift["overall_max"] = max(drift["overall_max"], delta)
+        for f in BREAKDOWN_FIELDS:
+            drift["fields_abs"][f] += abs(
+                new["breakdown"][f] - old.get("breakdown", {}).get(f, 0.0)
+            )
+
+    rescored = dict(session)
+    rescored["scores"] = new_scores
+    # Cached responses describe the old scores; never replay them
+    rescored.pop("idempotency", None)
+    if session.get("final_result"):
+        rescored["final_result"] = final_summary(rescored)
+        drift["total_before"] = session["final_result"].get("total_marks", 0.0)
+        drift["total_after"] = rescored["final_result"]["total_marks"]
+    rescored["rescored"] = {"tag": tag, "at": time.strftime("%Y-%m-%d %H:%M")}
+
+    return rescored, drift
+
+
+def _rescore_batch(args):
+    session_ids, sessions_dir, out_dir, tag = args
+    records = []
+    for session_id in session_ids:
+        try:
+            session = load_session(session_id, sessions_dir)
+            if not session:
+                continue
+            rescored, drift = rescore_session(session, tag)
+
+            out_path = os.path.join(out_dir, f"{session_id}.json")
+            tmp_path = f"{out_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(sanitize_for_json(rescored), f)
+            os.replace(tmp_path, out_path)
+        except Exception as e:
+            # Recorded like a finished session, so a resume does not retry it
+            records.append({"session_id": session_id, "error": f"{type(e).__name__}: {e}"})
+            continue
+        records.append(drift)
+    return records
+
+
+# ============================
+# CHECKPOINT & SUMMARY
+# ============================
+def _read_checkpoint(path: str):
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A torn final line from a crash; that session is redone
+                continue
+
+
+def summarize(checkpoint_path: str) -> dict:
+    sessions = answers = changed = 0
+    overall_abs = overall_max = total_abs = 0.0
+    fields_abs = {f: 0.0 for f in BREAKDOWN_FIELDS}
+    errors = []
+
+    for rec in _read_checkpoint(checkpoint_path):
+        if "error" in rec:
+            errors.append(rec)
+            continue
+        sessions += 1
+        answers += rec["answers"]
+        changed += rec["changed"]
+        overall_abs += rec["overall_abs"]
+        overall_max = max(overall_max, rec["overall_max"])
+        total_abs += abs(rec["total_after"] - rec["total_before"])
+        for f in BREAKDOWN_FIELDS:
+            fields_abs[f] += rec["fields_abs"][f]
+
+    per_answer = max(answers, 1)
+    return {
+        "sessions": sessions,
+        "answers": answers,
+        "answers_changed": changed,
+        "mean_abs_overall_marks_drift": round(overall_abs / per_answer, 3),
+        "max_abs_overall_marks_drift": round(overall_max, 3),
+        "mean_abs_total_marks_drift": round(total_abs / max(sessions, 1), 3),
+        "mean_abs_breakdown_drift": {
+            f: round(v / per_answer, 3) for f, v in fields_abs.items()
+        },
+        "failed_sessions": len(errors),
+        "errors": errors[:MAX_REPORTED_ERRORS],
+    }
+
+
+# ============================
+# DRIVER
+# ============================
+def _batches(ids, size):
+    it = iter(ids)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def run(sessions_dir: str, tag: str, workers: int, batch_size: int) -> dict:
+    out_dir = os.path.join(sessions_dir, "rescored", tag)
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint_path = os.path.join(out_dir, CHECKPOINT_FILE)
+
+    done = {rec["session_id"] for rec in _read_checkpoint(checkpoint_path)}
+    pending = (sid for sid in iter_session_ids(sessions_dir) if sid not in done)
+    tasks = ((batch, sessions_dir, out_dir, tag)
+             for batch in _batches(pending, batch_size))
+
+    processed = 0
+    started = time.perf_counter()
+    with Pool(workers) as pool, open(checkpoint_path, "a") as checkpoint:
+        # Keep a bounded window in flight so millions of ids are never
+        # materialised in the pool's task queue at once
+        in_flight = deque()
+        for task in tasks:
+            in_flight.append(pool.apply_async(_rescore_batch, (task,)))
+            if len(in_flight) >= workers * 2:
+                processed += _drain(in_flight.popleft(), checkpoint)
+        while in_flight:
+            processed += _drain(in_flight.popleft(), checkpoint)
+
+    elapsed = time.perf_counter() - started
+    print(f"Rescored {processed} sessions in {elapsed:.1f}s "
+          f"({len(done)} already done)", file=sys.stderr)
+    return summarize(checkpoint_path)
+
+
+def _drain(async_result, checkpoint) -> int:
+    records = async_result.get()
+    for rec in records:
+        checkpoint.write(json.dumps(rec) + "\n")
+    checkpoint.flush()
+    return len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score saved interview sessions")
+    parser.add_argument("--tag", required=True,
+                        help="version label for this scoring run, e.g. v2")
+    parser.add_argument("--sessions-dir", default=SESSIONS_DIR)
+    parser.add_argument("--workers", type=int, default=cpu_count())
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="sessions per worker task")
+    args = parser.parse_args(argv)
+
+    summary = run(args.sessions_dir, args.tag, args.workers, args.batch_size)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# resources.py - One CPU budget per worker for every thread pool in the service
+#
+# Each web worker gets AI_CPU_BUDGET cores (default: the cores this
+# container may use, divided by WEB_CONCURRENCY) and every pool that would
+# otherwise size itself to the whole machine is derived from it:
+#
+#   blas_threads           OpenMP / OpenBLAS / MKL / numexpr threads (numpy,
+#                          scipy, scikit-learn, librosa, torch)
+#   tf_intra_op            TensorFlow threads inside one op (DeepFace)
+#   tf_inter_op            TensorFlow ops run in parallel
+#   stage_engine_workers   threads per guarded engine (stage_guard.py)
+#   audio_decoder_workers  decoder processes (audio_decoder.py)
+#
+# An explicitly set variable (OMP_NUM_THREADS, STAGE_ENGINE_WORKERS, ...)
+# always wins over the derived value. configure() must run before numpy or
+# TensorFlow is imported, because they read their thread counts at load;
+# limit_loaded_libraries() then re-applies the BLAS limit with threadpoolctl
+# in case a library was loaded earlier.
+#
+# With AI_CPU_AFFINITY=1 each gunicorn worker is pinned to its own slice of
+# AI_CPU_BUDGET cores (worker N gets slice N mod the number of slices).
+
+import os
+import sys
+
+BLAS_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+            "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+AFFINITY = os.getenv("AI_CPU_AFFINITY", "0") == "1"
+
+_settings = {}
+
+
+# ============================
+# BUDGET
+# ============================
+def _cgroup_cores():
+    """CPU quota of this cgroup (v2, then v1) in cores, or None when unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return float(quota) / float(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def usable_cpus() -> list:
+    """CPU ids this process may run on."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def available_cores() -> int:
+    cores = len(usable_cpus())
+    quota = _cgroup_cores()
+    if quota is not None:
+        cores = min(cores, max(int(quota), 1))
+    return cores
+
+
+def compute_settings(budget: int = None, workers: int = None) -> dict:
+    cores = available_cores()
+    workers = workers or max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+    budget = budget or int(os.getenv("AI_CPU_BUDGET", "0")) or max(cores // workers, 1)
+    return {
+        "available_cores": cores,
+        "web_workers": workers,
+        "cpu_budget": budget,
+        "blas_threads": budget,
+        "tf_intra_op": budget,
+        "tf_inter_op": min(budget, 2),
+        "stage_engine_workers": max(budget, 2),
+        "audio_decoder_workers": max(budget // 2, 1),
+    }
+
+
+# ============================
+# APPLY
+# ============================
+def configure(budget: int = None, workers: int = None) -> dict:
+    """Export the derived thread counts (explicit variables win). Idempotent."""
+    if _settings:
+        return dict(_settings)
+    settings = compute_settings(budget, workers)
+
+    for name in BLAS_ENV:
+        os.environ.setdefault(name, str(settings["blas_threads"]))
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(settings["tf_intra_op"]))
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", str(settings["tf_inter_op"]))
+    os.environ.setdefault("STAGE_ENGINE_WORKERS", str(settings["stage_engine_workers"]))
+    os.environ.setdefault("AUDIO_DECODER_WORKERS", str(settings["audio_decoder_workers"]))
+
+    # Report what is actually in force, overrides included
+    settings.update(
+        blas_threads=int(os.environ["OMP_NUM_THREADS"]),
+        tf_intra_op=int(os.environ["TF_NUM_INTRAOP_THREADS"]),
+        tf_inter_op=int(os.environ["TF_NUM_INTEROP_THREADS"]),
+        stage_engine_workers=int(os.environ["STAGE_ENGINE_WORKERS"]),
+        audio_decoder_workers=int(os.environ["AUDIO_DECODER_WORKERS"]),
+    )
+    _settings.update(settings)
+    return dict(_settings)
+
+
+def limit_tensorflow():
+    """Pin TensorFlow's pools; only possible before its runtime starts."""
+    if "tensorflow" not in sys.modules:
+        return
+    import tensorflow as tf
+    settings = configure()
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(settings["tf_intra_op"])
+        tf.config.threading.set_inter_op_parallelism_threads(settings["tf_inter_op"])
+    except RuntimeError:
+        # Already initialized; the environment variables applied at load
+        pass
+
+
+def limit_torch():
+    if "torch" not in sys.modules:
+        return
+    import torch
+    torch.set_num_threads(configure()["blas_threads"])
+
+
+def limit_loaded_libraries():
+    """Enforce the BLAS/OpenMP limit on libraries already loaded in this process."""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(configure()["blas_threads"])
+
+
+def pin_worker(index: int):
+    """With AI_CPU_AFFINITY=1, pin this process to worker slice `index`."""
+    if not AFFINITY or not hasattr(os, "sched_setaffinity"):
+        return None
+    cpus = usable_cpus()
+    budget = configure()["cpu_budget"]
+    slices = max(len(cpus) // budget, 1)
+    start = (index % slices) * budget
+    pinned = cpus[start:start + budget] or cpus
+    os.sched_setaffinity(0, pinned)
+    return pinned
+
+
+# ============================
+# REPORT
+# ============================
+def resource_report() -> dict:
+    report = dict(configure(), affinity=usable_cpus(), pid=os.getpid())
+    try:
+        from threadpoolctl import threadpool_info
+        report["loaded_pools"] = [
+            {"library": p.get("internal_api"), "threads": p.get("num_threads")}
+            for p in threadpool_info()
+        ]
+    except ImportError:
+        pass
+    return report
@@ -0,0 +1,234 @@
+# session_store.py - Session persistence with per-session locking
+
+import os
+import re
+import json
+import fcntl
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager, contextmanager
+
+from evaluator import sanitize_for_json
+from memory import register_cache, sampled_size
+
+SESSIONS_DIR = "saved_sessions"
+LOCK_DIR = os.path.join(SESSIONS_DIR, ".locks")
+
+# Session ids are uuid4 strings; anything else never reaches the filesystem
+SESSION_ID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+os.makedirs(LOCK_DIR, exist_ok=True)
+
+
+# ============================
+# FILE I/O
+# ============================
+def valid_session_id(session_id) -> bool:
+    return isinstance(session_id, str) and bool(SESSION_ID_RE.fullmatch(session_id.strip()))
+
+
+def session_path(session_id: str, root: str = None) -> str:
+    if not valid_session_id(session_id):
+        raise ValueError("Malformed session id")
+    return os.path.join(root or SESSIONS_DIR, f"{session_id.strip()}.json")
+
+
+def session_exists(session_id) -> bool:
+    return valid_session_id(session_id) and os.path.exists(session_path(session_id))
+
+
+def save_session(session_id, data):
+    """
+    Write the session atomically (temp file + rename) so a concurrent
+    reader never observes a half-written JSON document.
+    """
+    path = session_path(session_id)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(sanitize_for_json(data), f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def iter_session_ids(root: str = None):
+    """Lazily yield every stored session id, skipping lock and temp files."""
+    with os.scandir(root or SESSIONS_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".json"):
+                yield entry.name[:-len(".json")]
+
+
+def load_session(session_id, root: str = None):
+    if not valid_session_id(session_id):
+        return None
+    path = session_path(session_id, root)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return _upgrade_scores(json.load(f))
+    return None
+
+
+def _upgrade_scores(session: dict) -> dict:
+    """
+    Sessions written before score slots existed hold an appended list.
+    Pad it out to one slot per question so it can be indexed directly.
+    """
+    total = len(session.get("questions", []))
+    scores = session.get("scores") or []
+    if len(scores) < total:
+        scores = scores + [None] * (total - len(scores))
+    session["scores"] = scores
+    session.setdefault("idempotency", {})
+    return session
+
+
+def empty_score_slots(total: int) -> list:
+    return [None] * total
+
+
+def filled_scores(session: dict) -> list:
+    """Recorded results in question order, skipping unanswered slots."""
+    return [s for s in session.get("scores", []) if s is not None]
+
+
+def final_summary(session: dict) -> dict:
+    total = sum(s["overall_marks"] for s in filled_scores(session))
+    return {
+        "total_marks": total,
+        "percentage": (total / (len(session["questions"]) * 10)) * 100,
+        "grade": "A" if total > 40 else "B"
+    }
+
+
+# ============================
+# IDEMPOTENCY
+# ============================
+def request_fingerprint(index: int, answer_text: str, *payload_digests: str) -> str:
+    """
+    Stable digest of everything that determines an evaluation result.
+    Media payloads are passed as their own sha256 hex digests ("" if absent).
+    """
+    h = hashlib.sha256()
+    h.update(str(int(index)).encode())
+    h.update(b"\x00")
+    h.update((answer_text or "").encode("utf-8"))
+    for digest in payload_digests:
+        h.update(b"\x00")
+        h.update((digest or "").encode())
+    return h.hexdigest()
+
+
+def cached_response(session: dict, key: str, fingerprint: str):
+    """
+    Return the stored response for an idempotency key, or None.
+    Raises ValueError if the key was already used for a different payload.
+    """
+    entry = session.get("idempotency", {}).get(key)
+    if entry is None:
+        return None
+    if entry["fingerprint"] != fingerprint:
+        raise ValueError("Idempotency key reused with a different request")
+    return entry["response"]
+
+
+def remember_response(session: dict, key: str, fingerprint: str, response: dict,
+                      index: int):
+    """
+    Keep the response for retries of this key. Only the latest response per
+    answer index is kept, so the map is bounded by the number of questions.
+    """
+    entries = session.setdefault("idempotency", {})
+    for old_key in [k for k, e in entries.items() if e.get("index") in (index, None)]:
+        del entries[old_key]
+    entries[key] = {
+        "index": int(index),
+        "fingerprint": fingerprint,
+        "response": sanitize_for_json(response),
+    }
+
+
+# ============================
+# LOCKING
+# ============================
+# One asyncio.Lock per live session (reference counted so the table does
+# not grow without bound) plus an flock on a lock file of its own under
+# LOCK_DIR (named by a hash of the session id), so concurrent requests for
+# the same session serialise across workers and different sessions never
+# wait on each other. flock belongs to the open file, so two opens of one
+# path exclude each other even inside a process. The holder removes the
+# file before unlocking; a waiter that then gets the lock on the removed
+# file notices and retries on a fresh one, so lock files do not pile up.
+_session_locks = {}
+
+register_cache(
+    "session_locks",
+    count=lambda: len(_session_locks),
+    size=lambda: sampled_size(iter(list(_session_locks.values())), len(_session_locks)),
+)
+
+
+def lock_path(name: str) -> str:
+    return os.path.join(LOCK_DIR, f"{hashlib.sha256(name.encode()).hexdigest()[:32]}.lock")
+
+
+def _acquire_file_lock(path: str) -> int:
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # Still the file at `path`, not one its last holder removed
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        except Exception:
+            os.close(fd)
+            raise
+        os.close(fd)
+
+
+def _release_file_lock(fd: int, path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+@asynccontextmanager
+async def session_lock(session_id: str):
+    if not valid_session_id(session_id):
+        raise ValueError("Malformed session id")
+    key = session_id.strip()
+    entry = _session_locks.get(key)
+    if entry is None:
+        entry = _session_locks[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+
+    try:
+        async with entry[0]:
+            path = lock_path(key)
+            fd = await asyncio.to_thread(_acquire_file_lock, path)
+            try:
+                yield
+            finally:
+                _release_file_lock(fd, path)
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            _session_locks.pop(key, None)
+
+
+@contextmanager
+def file_lock(name: str):
+    """
+    Blocking cross-worker lock for `name` (e.g. one live draft). Names are
+    not session ids, so it can be taken while holding session_lock.
+    """
+    path = lock_path(name)
+    fd = _acquire_file_lock(path)
+    try:
+        yield
+    finally:
+        _release_file_lock(fd, path)
@@ -0,0 +1,372 @@
+# similarity.py - Near-duplicate answer detection (MinHash + LSH)
+#
+# Each evaluated answer gets a MinHash signature over its word 3-gram
+# shingles. Signatures are indexed per question id in LSH band buckets, so
+# "similar prior submissions" only compares against answers sharing a
+# bucket instead of every stored answer.
+#
+# The index is persisted as an append-only log (SIMILARITY_LOG) that every
+# worker appends to and replays from, so workers see each other's answers.
+# Each question keeps its SIMILARITY_MAX_PER_QUESTION most recent answers;
+# once the log is over SIMILARITY_LOG_MAX_BYTES and mostly superseded or
+# dropped entries, it is rewritten from the index.
+#
+# Candidates only ever get the score and the flag. Which sessions matched
+# is for reviewers (session_matches, behind /admin).
+#
+#   python similarity.py rebuild [--sessions-dir saved_sessions]
+#
+# regenerates the log from stored sessions.
+
+import os
+import re
+import sys
+import json
+import zlib
+import fcntl
+import hashlib
+import argparse
+import threading
+
+import numpy as np
+
+from memory import register_cache, env_bytes
+from text_analysis import bound_answer
+from logs import get_logger
+
+log = get_logger(__name__)
+
+SIMILARITY_LOG = os.getenv("SIMILARITY_LOG", "similarity_index.jsonl")
+# Pairs estimated at least this similar are reported as matches
+MATCH_THRESHOLD = float(os.getenv("SIMILARITY_MATCH_THRESHOLD", "0.5"))
+# ...and at least this similar are flagged for proctoring review
+FLAG_THRESHOLD = float(os.getenv("SIMILARITY_FLAG_THRESHOLD", "0.8"))
+MAX_MATCHES = 5
+MAX_PER_QUESTION = int(os.getenv("SIMILARITY_MAX_PER_QUESTION", "5000"))
+LOG_MAX_BYTES = env_bytes("SIMILARITY_LOG_MAX_BYTES") or 256 << 20
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS       # candidate threshold ~ (1/BANDS) ** (1/ROWS) = 0.42
+SHINGLE_SIZE = 3
+_PRIME = (1 << 31) - 1
+
+# Fixed seed: signatures must be comparable across processes and restarts
+_rng = np.random.RandomState(20240601)
+_PERM_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# question key -> {"signatures": {session_id: sig}, "buckets": [dict per band]}
+_indexes = {}
+_model_signatures = {}
+_log_state = {"offset": 0, "inode": None, "lines": 0}
+_lock = threading.Lock()
+
+
+# ============================
+# SIGNATURES
+# ============================
+def question_key(q_data: dict) -> str:
+    """Bank questions carry a stable id; custom ones are keyed by their text."""
+    return q_data.get("id") or hashlib.sha1(q_data.get("q", "").encode("utf-8")).hexdigest()[:12]
+
+
+def shingles(text: str) -> set:
+    words = _TOKEN_RE.findall((text or "").lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text: str):
+    """MinHash signature (NUM_PERM uint32s), or None for empty text."""
+    # Same bounded sample the scorer sees, so huge pastes cost the same
+    items = shingles(bound_answer(text)[0])
+    if not items:
+        return None
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) & _PRIME for s in items),
+        dtype=np.uint64, count=len(items)
+    )
+    # (a * x + b) mod p for every permutation/shingle pair, min per permutation
+    permuted = (np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % np.uint64(_PRIME)
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def estimate_similarity(sig_a, sig_b) -> float:
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return float(np.mean(sig_a == sig_b))
+
+
+def _band_keys(sig) -> list:
+    return [sig[b * ROWS:(b + 1) * ROWS].tobytes() for b in range(BANDS)]
+
+
+# ============================
+# INDEX
+# ============================
+def _index_for(qkey: str) -> dict:
+    index = _indexes.get(qkey)
+    if index is None:
+        index = _indexes[qkey] = {"signatures": {}, "buckets": [{} for _ in range(BANDS)]}
+    return index
+
+
+def _remove(index: dict, session_id: str):
+    old = index["signatures"].pop(session_id, None)
+    if old is None:
+        return
+    for bucket, key in zip(index["buckets"], _band_keys(old)):
+        members = bucket.get(key)
+        if members:
+            members.discard(session_id)
+            if not members:
+                del bucket[key]
+
+
+def _add(qkey: str, session_id: str, sig):
+    index = _index_for(qkey)
+    # A resubmitted answer replaces the session's previous one
+    _remove(index, session_id)
+    index["signatures"][session_id] = sig
+    for bucket, key in zip(index["buckets"], _band_keys(sig)):
+        bucket.setdefault(key, set()).add(session_id)
+    # Signatures are kept in submission order; the oldest go first
+    while len(index["signatures"]) > MAX_PER_QUESTION:
+        _remove(index, next(iter(index["signatures"])))
+
+
+def _query(qkey: str, session_id: str, sig) -> list:
+    index = _indexes.get(qkey)
+    if index is None:
+        return []
+    candidates = set()
+    for bucket, key in zip(index["buckets"], _band_keys(sig)):
+        candidates.update(bucket.get(key, ()))
+    candidates.discard(session_id)
+
+    matches = []
+    for other in candidates:
+        score = estimate_similarity(sig, index["signatures"][other])
+        if score >= MATCH_THRESHOLD:
+            matches.append({"session_id": other, "similarity": round(score, 3)})
+    matches.sort(key=lambda m: m["similarity"], reverse=True)
+    return matches[:MAX_MATCHES]
+
+
+def _model_signature(qkey: str, model_answer: str):
+    entry = _model_signatures.get(qkey)
+    if entry is None or entry[0] != model_answer:
+        entry = _model_signatures[qkey] = (model_answer, minhash(model_answer))
+    return entry[1]
+
+
+# ============================
+# LOG PERSISTENCE
+# ============================
+def _encode(qkey: str, session_id: str, sig) -> str:
+    return json.dumps({"q": qkey, "s": session_id, "sig": sig.tolist()}) + "\n"
+
+
+def _sync(path: str = None):
+    """Apply entries other workers appended since the last read."""
+    path = path or SIMILARITY_LOG
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return
+    if st.st_ino != _log_state["inode"] or st.st_size < _log_state["offset"]:
+        # Rebuilt or truncated: start over from the new file
+        _indexes.clear()
+        _log_state.update(offset=0, inode=st.st_ino, lines=0)
+    if st.st_size == _log_state["offset"]:
+        return
+
+    with open(path, "rb") as f:
+        f.seek(_log_state["offset"])
+        data = f.read()
+    # Stop at the last complete line; a write in progress is picked up later
+    end = data.rfind(b"\n") + 1
+    for line in data[:end].splitlines():
+        try:
+            entry = json.loads(line)
+            _add(entry["q"], entry["s"], np.array(entry["sig"], dtype=np.uint32))
+        except (ValueError, KeyError):
+            continue
+        _log_state["lines"] += 1
+    _log_state["offset"] += end
+
+
+def _open_locked(path: str):
+    """The log opened for append and flocked, reopened if it was replaced meanwhile."""
+    while True:
+        f = open(path, "a")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        f.close()
+
+
+def _append(line: str, path: str = None):
+    f = _open_locked(path or SIMILARITY_LOG)
+    try:
+        f.write(line)
+    finally:
+        f.close()
+
+
+def _compact(path: str = None):
+    """Rewrite the log from the index; other workers reload on the new inode."""
+    path = path or SIMILARITY_LOG
+    f = _open_locked(path)
+    try:
+        _sync(path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as out:
+            for qkey, index in _indexes.items():
+                for session_id, sig in index["signatures"].items():
+                    out.write(_encode(qkey, session_id, sig))
+        os.replace(tmp_path, path)
+        st = os.stat(path)
+        _log_state.update(offset=st.st_size, inode=st.st_ino, lines=_index_entries())
+    finally:
+        f.close()
+
+
+def _needs_compaction() -> bool:
+    return (_log_state["offset"] > LOG_MAX_BYTES
+            and _log_state["lines"] > 2 * _index_entries())
+
+
+def load_index():
+    """Replay the log now (e.g. before fork) rather than on the first answer."""
+    with _lock:
+        _sync()
+    return _index_entries()
+
+
+def check_answer(q_data: dict, session_id: str, answer: str) -> dict:
+    """
+    Compare an answer against prior submissions to the same question and
+    the question's model answer, then index it for later submissions.
+    """
+    report = {"score": 0.0, "matches": [], "model_answer_similarity": 0.0,
+              "flagged": False}
+    sig = minhash(answer)
+    if sig is None:
+        return report
+
+    qkey = question_key(q_data)
+    with _lock:
+        _sync()
+        matches = _query(qkey, session_id, sig)
+        _add(qkey, session_id, sig)
+        try:
+            _append(_encode(qkey, session_id, sig))
+            if _needs_compaction():
+                _compact()
+        except OSError as e:
+            log.warning("Similarity log write failed", extra={"error": str(e)})
+
+    model_sig = _model_signature(qkey, q_data.get("model_answer", ""))
+    model_score = estimate_similarity(sig, model_sig) if model_sig is not None else 0.0
+
+    report["matches"] = matches
+    report["score"] = matches[0]["similarity"] if matches else 0.0
+    report["model_answer_similarity"] = round(model_score, 3)
+    report["flagged"] = max(report["score"], model_score) >= FLAG_THRESHOLD
+    return report
+
+
+def public_report(report: dict) -> dict:
+    """What the candidate sees: never which other sessions matched."""
+    return {"score": report["score"], "flagged": report["flagged"]}
+
+
+def session_matches(session: dict) -> list:
+    """Per question of `session`, the prior answers that match its answer."""
+    session_id = session["session_id"]
+    out = []
+    with _lock:
+        _sync()
+        for q_data in session["questions"]:
+            qkey = question_key(q_data)
+            sig = _indexes.get(qkey, {}).get("signatures", {}).get(session_id)
+            out.append({"question": qkey,
+                        "matches": _query(qkey, session_id, sig) if sig is not None else []})
+    return out
+
+
+def _index_entries() -> int:
+    return sum(len(i["signatures"]) for i in _indexes.values())
+
+
+def _evict_oldest_signature() -> bool:
+    """Drop the oldest answer of the question with the most answers."""
+    with _lock:
+        if not _indexes:
+            return False
+        qkey = max(_indexes, key=lambda k: len(_indexes[k]["signatures"]))
+        index = _indexes[qkey]
+        if not index["signatures"]:
+            return False
+        _remove(index, next(iter(index["signatures"])))
+        if not index["signatures"]:
+            del _indexes[qkey]
+        return True
+
+
+register_cache(
+    "similarity_index",
+    count=_index_entries,
+    # Signature array plus its share of band bucket entries
+    size=lambda: _index_entries() * (NUM_PERM * 4 + BANDS * 120),
+    evict=_evict_oldest_signature,
+)
+
+
+# ============================
+# REBUILD
+# ============================
+def rebuild(sessions_dir: str, path: str = None) -> int:
+    """Regenerate the log from every answer stored in sessions_dir."""
+    from session_store import iter_session_ids, load_session
+
+    path = path or SIMILARITY_LOG
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    count = 0
+    with open(tmp_path, "w") as out:
+        for session_id in iter_session_ids(sessions_dir):
+            session = load_session(session_id, sessions_dir)
+            if not session:
+                continue
+            for q_data, result in zip(session["questions"], session["scores"]):
+                sig = minhash(result.get("transcript", "")) if result else None
+                if sig is None:
+                    continue
+                out.write(_encode(question_key(q_data), session_id, sig))
+                count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def main(argv=None):
+    from session_store import SESSIONS_DIR
+
+    parser = argparse.ArgumentParser(description="Near-duplicate answer index")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--sessions-dir", default=SESSIONS_DIR)
+    parser.add_argument("--log", default=SIMILARITY_LOG)
+    args = parser.parse_args(argv)
+
+    count = rebuild(args.sessions_dir, args.log)
+    print(f"Indexed {count} answers into {args.log}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# stage_guard.py - Deadlines and circuit breakers for evaluation engines
+#
+# Every call into an external or hang-prone engine (Google/Sphinx STT,
+# DeepFace, librosa, the audio decoders, the sentence-embedding model) goes
+# through guarded(engine, fn, ...). The call runs on the engine's own small
+# thread pool and the caller waits at most STAGE_DEADLINE_<ENGINE> seconds
+# for it. "inline" engines enforce that deadline themselves (the decoder
+# pool kills an overrunning decoder) and only use the breaker here.
+#
+# After BREAKER_FAILURES consecutive failures (timeouts or errors) the
+# engine's breaker opens and calls fail at once for BREAKER_COOLDOWN_SECONDS;
+# then one trial call is let through and its outcome closes or reopens the
+# breaker. A call that misses its deadline keeps its worker thread until it
+# returns, so each engine gets its own pool and a hung engine cannot starve
+# the others.
+
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from profiling import profiled_call
+from logs import get_logger
+
+ENGINES = {
+    "stt_google": {"deadline": 15.0},
+    "stt_sphinx": {"deadline": 15.0},
+    "audio_decoder": {"deadline": 10.0, "inline": True},
+    "deepface": {"deadline": 8.0},
+    "librosa": {"deadline": 8.0},
+    "semantic": {"deadline": 10.0},
+}
+for _name, _engine in ENGINES.items():
+    _engine["deadline"] = float(os.getenv(f"STAGE_DEADLINE_{_name.upper()}", _engine["deadline"]))
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+ENGINE_WORKERS = int(os.getenv("STAGE_ENGINE_WORKERS", "4"))
+
+log = get_logger(__name__)
+
+_lock = threading.Lock()
+_state = {
+    name: {"failures": 0, "open_until": 0.0, "trial": False,
+           "calls": 0, "timeouts": 0, "errors": 0, "rejected": 0}
+    for name in ENGINES
+}
+_pools = {}
+
+
+class StageUnavailable(Exception):
+    """An engine call missed its deadline, failed, or its breaker is open."""
+
+    def __init__(self, engine: str, reason: str):
+        super().__init__(f"{engine}: {reason}")
+        self.engine = engine
+        self.reason = reason
+
+
+# ============================
+# BREAKERS
+# ============================
+def _admit(engine: str) -> bool:
+    state = _state[engine]
+    with _lock:
+        if state["failures"] < BREAKER_FAILURES:
+            return True
+        if time.monotonic() < state["open_until"] or state["trial"]:
+            state["rejected"] += 1
+            return False
+        # Cooldown over: let one trial call through (half-open)
+        state["trial"] = True
+        return True
+
+
+def _record(engine: str, outcome: str):
+    state = _state[engine]
+    with _lock:
+        state["calls"] += 1
+        state["trial"] = False
+        if outcome == "ok":
+            state["failures"] = 0
+            return
+        state[outcome + "s"] += 1
+        state["failures"] += 1
+        if state["failures"] >= BREAKER_FAILURES:
+            state["open_until"] = time.monotonic() + BREAKER_COOLDOWN_SECONDS
+            log.warning("Circuit open", extra={"engine": engine, "outcome": outcome,
+                                               "retry_in": BREAKER_COOLDOWN_SECONDS})
+
+
+def _pool(engine: str) -> ThreadPoolExecutor:
+    with _lock:
+        if engine not in _pools:
+            _pools[engine] = ThreadPoolExecutor(ENGINE_WORKERS, thread_name_prefix=f"stage-{engine}")
+        return _pools[engine]
+
+
+# ============================
+# GUARDED CALLS
+# ============================
+def guarded(engine: str, fn, *args, **kwargs):
+    """
+    Run fn under the engine's deadline and breaker. Returns its result or
+    raises StageUnavailable (reason "circuit_open", "timeout" or "error").
+    """
+    if not _admit(engine):
+        raise StageUnavailable(engine, "circuit_open")
+
+    if ENGINES[engine].get("inline"):
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            _record(engine, "error")
+            raise StageUnavailable(engine, "error") from e
+        _record(engine, "ok")
+        return result
+
+    # Carry the request context (stage timings) into the worker
+    ctx = contextvars.copy_context()
+    future = _pool(engine).submit(ctx.run, profiled_call, fn, *args, **kwargs)
+    try:
+        result = future.result(timeout=ENGINES[engine]["deadline"])
+    except FutureTimeout:
+        future.cancel()
+        _record(engine, "timeout")
+        log.warning("Stage deadline missed", extra={"engine": engine,
+                                                    "deadline": ENGINES[engine]["deadline"]})
+        raise StageUnavailable(engine, "timeout")
+    except Exception as e:
+        _record(engine, "error")
+        raise StageUnavailable(engine, "error") from e
+    _record(engine, "ok")
+    return result
+
+
+def breaker_report() -> dict:
+    now = time.monotonic()
+    with _lock:
+        return {
+            name: {
+                "state": ("closed" if s["failures"] < BREAKER_FAILURES
+                          else "half_open" if s["trial"] or now >= s["open_until"]
+                          else "open"),
+                "deadline": ENGINES[name]["deadline"],
+                "consecutive_failures": s["failures"],
+                "calls": s["calls"], "timeouts": s["timeouts"],
+                "errors": s["errors"], "rejected": s["rejected"],
+            }
+            for name, s in _state.items()
+        }
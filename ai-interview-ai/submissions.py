@@ -0,0 +1,309 @@
+# submissions.py - Evaluating one submitted answer against a stored session
+#
+# Shared by the public multipart endpoints (blocking and streamed) and the
+# internal binary API: idempotency, the per-session lock, admission, media
+# staging and recording the result in the session's score slot.
+
+import os
+import uuid
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from evaluator import evaluate_multimodal, evaluate_multimodal_stages, sanitize_for_json
+from profiling import stage_timer
+from memory import hold_buffer
+from uploads import SpooledUpload
+from admission import cost_class_for, admit, run_admitted
+from profiles import session_profile
+from stage_guard import guarded
+from audio_decoder import to_wav_file
+from similarity import check_answer, public_report
+from live_scoring import take_draft_text_eval
+from logs import get_logger, session_id_var
+from session_store import (
+    save_session, load_session, session_exists, session_lock, final_summary,
+    request_fingerprint, cached_response, remember_response
+)
+
+TEMP_DIR = "temp_eval"
+
+log = get_logger(__name__)
+
+os.makedirs(TEMP_DIR, exist_ok=True)
+
+
+# ============================
+# MEDIA
+# ============================
+def save_uploaded_audio_as_wav(upload: SpooledUpload) -> str:
+    """16 kHz mono WAV of the upload (see audio_decoder), or the raw bytes."""
+    wav_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}.wav")
+    try:
+        with stage_timer("audio_conversion"):
+            # Format comes from the magic bytes checked on upload
+            guarded("audio_decoder", to_wav_file, upload.read_bytes(), upload.format, wav_path)
+    except Exception as e:
+        log.warning("Audio conversion failed, evaluating raw upload", extra={"error": str(e)})
+        upload.save_to(wav_path)
+
+    return wav_path
+
+
+def payload_digest(upload) -> str:
+    return upload.digest if upload else ""
+
+
+@contextmanager
+def holding(*uploads):
+    """Account in-memory upload bytes and release the spools afterwards."""
+    uploads = [u for u in uploads if u]
+    try:
+        with hold_buffer(sum(u.in_memory_bytes for u in uploads)):
+            yield
+    finally:
+        for u in uploads: u.close()
+
+
+def stage_media(img, aud):
+    """
+    Prepare uploaded media for evaluation; returns (image_data, audio_path).
+    Images stay in memory, audio is converted to a temp WAV file.
+    """
+    image_data = img.read_bytes() if img else None
+    audio_path = ""
+
+    # ✅ Handle Audio (If provided)
+    if aud and aud.size > 100:
+        audio_path = save_uploaded_audio_as_wav(aud)
+
+    return image_data, audio_path
+
+
+def media_used(profile: dict, answer_text: str, img, aud):
+    """The uploads the profile's stages will actually read (others are ignored)."""
+    if not profile["face"]:
+        img = None
+    # Audio is only transcribed when there is no typed answer
+    if not profile["voice"] and len((answer_text or "").strip()) >= 3:
+        aud = None
+    return img, aud
+
+
+def cleanup_media(*paths):
+    for path in paths:
+        if path and os.path.exists(path): os.remove(path)
+
+
+# ============================
+# EVALUATION
+# ============================
+def eval_kwargs(session, q_data, answer_text, image_data, audio_path, text_eval=None,
+                profile=None, live_audio=None):
+    return dict(
+        profile=profile,
+        live_audio=live_audio,
+        text_eval=text_eval,
+        image_data=image_data,
+        face_key=session["session_id"],
+        answer_text=answer_text,
+        keywords=q_data.get("keywords", []),
+        weight=q_data.get("weight", 1.0),
+        image_path="",
+        audio_path=audio_path,
+        model_answer=q_data.get("model_answer", "")
+    )
+
+
+def record_result(session, index, eval_res):
+    result = sanitize_for_json(eval_res)
+    # One slot per question: a resubmitted index replaces, never duplicates
+    session["scores"][index] = result
+
+    is_finished = index >= len(session["questions"]) - 1
+    summary = None
+
+    if is_finished:
+        summary = final_summary(session)
+        session["final_result"] = summary
+
+    with stage_timer("similarity"):
+        similarity = check_answer(session["questions"][index], session["session_id"],
+                                  result.get("transcript", ""))
+
+    return {
+        "finished": is_finished,
+        "current_score": result,
+        "final_result": summary,
+        "similarity": public_report(similarity)
+    }
+
+
+def stage_answer(session, index, answer_text, img, aud):
+    """The draft's text evaluation and the staged media: (text_eval, image_data, audio_path)."""
+    text_eval = take_draft_text_eval(session["session_id"], index, answer_text)
+    with stage_timer("media_staging"):
+        image_data, audio_path = stage_media(img, aud)
+    return text_eval, image_data, audio_path
+
+
+def evaluate_answer(session, index, answer_text, img, aud, profile, live_audio=None):
+    q_data = session["questions"][index]
+    text_eval, image_data, audio_path = stage_answer(session, index, answer_text, img, aud)
+
+    try:
+        # Run AI Evaluation
+        eval_res = evaluate_multimodal(
+            **eval_kwargs(session, q_data, answer_text, image_data, audio_path, text_eval,
+                          profile, live_audio)
+        )
+        return record_result(session, index, eval_res)
+
+    finally:
+        cleanup_media(audio_path)
+
+
+def answer_fingerprint(index, answer_text, img, aud, profile: str = None,
+                       live_audio: dict = None) -> str:
+    # A profile override is part of the request; the session default is not
+    extra = [f"profile:{profile}"] if profile else []
+    if live_audio is not None:
+        # Streamed audio is not kept; its transcript and metrics stand for it
+        extra.append("live:{transcript}:{duration}:{energy}".format(**live_audio))
+    return request_fingerprint(index, answer_text, payload_digest(img),
+                               payload_digest(aud), *extra)
+
+
+# ============================
+# SUBMISSION
+# ============================
+def answer_key(session_id, index, answer_text, img, aud, idempotency_key=None,
+               profile=None, live_audio=None):
+    """(idempotency key, fingerprint) of a submission; tags the log context too."""
+    session_id_var.set(session_id)
+    fingerprint = answer_fingerprint(index, answer_text, img, aud, profile, live_audio)
+    # Retries without an explicit key still dedupe on identical payloads
+    return idempotency_key or f"auto-{fingerprint}", fingerprint
+
+
+async def load_for_answer(session_id: str, index: int) -> dict:
+    with stage_timer("session_load"):
+        session = await run_in_threadpool(load_session, session_id)
+    if not session: raise HTTPException(404, "Session not found")
+    if not 0 <= index < len(session["questions"]):
+        raise HTTPException(400, "Question index out of range")
+    return session
+
+
+def replay_cached(session, key, fingerprint):
+    try:
+        return cached_response(session, key, fingerprint)
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+
+
+def answer_profile(session, profile: str = None) -> dict:
+    try:
+        return session_profile(session, profile)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+async def store_response(session, index, key, fingerprint, response):
+    remember_response(session, key, fingerprint, response, index)
+    with stage_timer("session_save"):
+        await run_in_threadpool(save_session, session["session_id"], session)
+
+
+async def submit_answer(session_id: str, index: int, answer_text: str,
+                        img=None, aud=None, idempotency_key: str = None,
+                        profile: str = None, live_audio: dict = None) -> dict:
+    """
+    Evaluate one answer and record it in its session slot. Takes ownership
+    of the spooled uploads. `profile` overrides the session's evaluation
+    profile for this answer. `live_audio` is the outcome of a streamed
+    recording (LiveAudio.outcome) in place of an audio upload. Raises HTTPException for unknown sessions
+    (404), bad indexes or profiles (400) and reused idempotency keys (409).
+    """
+    key, fingerprint = answer_key(session_id, index, answer_text, img, aud,
+                                  idempotency_key, profile, live_audio)
+    index = int(index)
+
+    with holding(img, aud):
+        # Unknown and malformed ids never create lock state
+        if not session_exists(session_id): raise HTTPException(404, "Session not found")
+        async with session_lock(session_id):
+            session = await load_for_answer(session_id, index)
+            cached = replay_cached(session, key, fingerprint)
+            if cached is not None:
+                return cached
+
+            eval_profile = answer_profile(session, profile)
+            img, aud = media_used(eval_profile, answer_text, img, aud)
+            response = await run_admitted(cost_class_for(img, aud), evaluate_answer,
+                                          session, index, answer_text, img, aud,
+                                          eval_profile, live_audio)
+
+            await store_response(session, index, key, fingerprint, response)
+            return response
+
+
+async def stream_answer(session_id: str, index: int, answer_text: str,
+                        img=None, aud=None, idempotency_key: str = None,
+                        profile: str = None):
+    """
+    submit_answer, stage by stage. The request is validated and admitted
+    before anything is streamed, so those errors keep their status codes
+    (AdmissionRejected for overload). Returns (ticket, events): `events`
+    yields (stage, payload) for the "text", "face" and "voice" partials and
+    then ("result", response); it raises HTTPException for a reused
+    idempotency key. Release the ticket if `events` is never started.
+    """
+    key, fingerprint = answer_key(session_id, index, answer_text, img, aud,
+                                  idempotency_key, profile)
+    index = int(index)
+
+    try:
+        session = await load_for_answer(session_id, index)
+        eval_profile = answer_profile(session, profile)
+        used_img, used_aud = media_used(eval_profile, answer_text, img, aud)
+        ticket = await admit(cost_class_for(used_img, used_aud))
+    except BaseException:
+        for u in (img, aud):
+            if u: u.close()
+        raise
+
+    async def events():
+        try:
+            with holding(img, aud):
+                async with session_lock(session_id):
+                    session = await load_for_answer(session_id, index)
+                    cached = replay_cached(session, key, fingerprint)
+                    if cached is not None:
+                        yield "result", cached
+                        return
+
+                    q_data = session["questions"][index]
+                    # Decoding, temp files, the similarity log and the session
+                    # write all block, so none of them run on the event loop
+                    text_eval, image_data, audio_path = await run_in_threadpool(
+                        stage_answer, session, index, answer_text, used_img, used_aud)
+                    try:
+                        stages = evaluate_multimodal_stages(
+                            **eval_kwargs(session, q_data, answer_text, image_data, audio_path,
+                                          text_eval, eval_profile)
+                        )
+                        # Each stage blocks, so step the generator off the event loop
+                        async for stage, payload in iterate_in_threadpool(stages):
+                            if stage == "result":
+                                payload = await run_in_threadpool(record_result, session,
+                                                                  index, payload)
+                                await store_response(session, index, key, fingerprint, payload)
+                            yield stage, payload
+                    finally:
+                        await run_in_threadpool(cleanup_media, audio_path)
+        finally:
+            ticket.release()
+
+    return ticket, events()
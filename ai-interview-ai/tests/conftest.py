@@ -0,0 +1,16 @@
+# conftest.py - Import the service modules from a scratch working directory
+#
+# The modules keep their state (saved_sessions/, eval_jobs/, ...) relative
+# to the working directory, so the tests run from a fresh temp directory.
+# The question-bank artifact cache lives in the user's cache directory, so
+# it is moved too.
+
+import os
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, APP_DIR)
+os.chdir(tempfile.mkdtemp(prefix="ai-interview-tests-"))
+os.environ.setdefault("QUESTION_ARTIFACT_DIR", tempfile.mkdtemp(prefix="ai-interview-bank-cache-"))
@@ -0,0 +1,20 @@
+import cost_check
+from text_analysis import bound_answer, MAX_ANSWER_CHARS
+
+
+def test_scoring_cost_does_not_grow_with_paste_size():
+    result = cost_check.run(budget=0.5, scale=10)
+    assert result["failures"] == [], result["cases"]
+
+
+def test_word_count_of_a_long_paste_is_estimated_from_the_sample():
+    paste = cost_check.adversarial_corpus(MAX_ANSWER_CHARS * 50)["plain_paste"]
+    scored, truncation = bound_answer(paste)
+    assert len(scored) <= MAX_ANSWER_CHARS
+    words = len(paste.split())
+    assert abs(truncation["estimated_words"] - words) <= words * 0.02
+
+
+def test_short_answer_is_scored_whole():
+    assert bound_answer("We cached the REST API responses.") == (
+        "We cached the REST API responses.", None)
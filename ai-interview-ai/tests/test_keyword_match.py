@@ -0,0 +1,60 @@
+import pytest
+
+from keyword_match import KeywordMatcher, deletions, edit_distance, max_edits, _parse_distances
+
+KEYWORDS = ["Kubernetes", "reconciliation", "design system", "hydration", "cache", "API"]
+
+
+def match(answer: str, keywords=KEYWORDS):
+    text = answer.lower()
+    return KeywordMatcher(keywords).match(text)
+
+
+def test_exact_whole_words_and_long_word_parts():
+    matched, missed, fuzzy = match("The API sits behind a cache; our designs stay consistent.")
+    # "design" (a word of "design system") occurs inside "designs"
+    assert matched == ["design system", "cache", "API"]
+    assert missed == ["Kubernetes", "reconciliation", "hydration"]
+    assert fuzzy == []
+
+
+def test_misspellings_within_the_allowed_edits_match_fuzzily():
+    matched, missed, fuzzy = match("kubernets runs a reconcilation loop; hydartion too")
+    assert matched == ["Kubernetes", "reconciliation", "hydration"]
+    assert fuzzy == [
+        {"keyword": "Kubernetes", "word": "kubernets", "distance": 1},
+        {"keyword": "reconciliation", "word": "reconcilation", "distance": 1},
+        # A swap of two adjacent letters is one edit
+        {"keyword": "hydration", "word": "hydartion", "distance": 1},
+    ]
+
+
+def test_fuzzy_match_must_keep_the_first_letter():
+    matched, missed, _ = match("we had to resign from that project, and ydration")
+    assert "design system" in missed
+    assert "hydration" in missed
+
+
+@pytest.mark.parametrize("answer", [
+    "cachr misses",          # five letters: exact only
+    "kubrnts everywhere",    # three edits from kubernetes
+    "hydrtoin",              # two edits, but nine letters allow one
+])
+def test_beyond_the_allowed_edits_is_missed(answer):
+    _, missed, fuzzy = match(answer)
+    assert fuzzy == []
+    assert missed == KEYWORDS
+
+
+def test_edits_allowed_by_word_length():
+    assert [max_edits(n) for n in (3, 5, 6, 9, 10, 14)] == [0, 0, 1, 1, 2, 2]
+    assert _parse_distances("") == []
+    assert _parse_distances("10:5, 4:1") == [(4, 1), (10, 2)]
+
+
+def test_edit_distance_is_bounded():
+    assert edit_distance("reconcilation", "reconciliation", 2) == 1
+    assert edit_distance("hydartion", "hydration", 1) == 1
+    assert edit_distance("kubernetes", "kubrnts", 2) == 3
+    assert edit_distance("a", "abcdef", 2) == 3
+    assert deletions("abc", 1) == {"abc", "bc", "ac", "ab"}
@@ -0,0 +1,106 @@
+import os
+import random
+from collections import OrderedDict
+
+import pytest
+
+import live_scoring
+from live_scoring import LiveDraft, apply_draft_edit, take_draft_text_eval
+from evaluator import evaluate_text_nlp
+
+SESSION_ID = "11111111-1111-4111-8111-111111111111"
+QUESTION = {
+    "keywords": ["kubernetes", "reconciliation", "design system", "cache", "api"],
+    "model_answer": "Kubernetes controllers run a reconciliation loop against the API.",
+}
+TEXT = (
+    "Basically the controller watches the API server. It runs a reconcilation loop "
+    "and, um, compares desired and actual state! Then kubernets restarts pods... "
+    "We also used a design system and a cache. Is that clear? Yes."
+)
+
+
+def full_score(text: str) -> dict:
+    result = evaluate_text_nlp(text, QUESTION["model_answer"], QUESTION["keywords"])
+    result.pop("relevance_engine")
+    return result
+
+
+def random_edits(text: str, seed: int):
+    """(keep, append) edits that type `text` with some backspacing on the way."""
+    rng = random.Random(seed)
+    typed = 0
+    while typed < len(text):
+        keep = typed
+        if typed and rng.random() < 0.3:
+            keep = max(0, typed - rng.randint(1, 8))
+        append = text[keep:typed + rng.randint(1, 12)]
+        typed = keep + len(append)
+        yield keep, append
+
+
+@pytest.fixture(autouse=True)
+def fresh_worker(monkeypatch):
+    monkeypatch.setattr(live_scoring, "_drafts", OrderedDict())
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_scores_match_a_full_rescore(seed):
+    draft = LiveDraft(QUESTION["keywords"], QUESTION["model_answer"])
+    for keep, append in random_edits(TEXT, seed):
+        draft.update(keep, append)
+        expected = full_score(draft.text) if len(draft.text.strip()) >= 5 else None
+        if expected is None:
+            continue
+        snapshot = draft.snapshot()
+        for field in ("completeness", "clarity", "matched_keywords",
+                      "missed_keywords", "fuzzy_keywords"):
+            assert snapshot[field] == expected[field], (field, draft.text)
+    assert draft.text == TEXT
+    assert draft.text_eval() == full_score(TEXT)
+
+
+# The second run compacts the log on every edit
+@pytest.mark.parametrize("compact_bytes", [live_scoring.COMPACT_BYTES, -10 ** 6])
+def test_edits_reaching_different_workers_stay_consistent(monkeypatch, compact_bytes):
+    monkeypatch.setattr(live_scoring, "COMPACT_BYTES", compact_bytes)
+    worker_a, worker_b = OrderedDict(), OrderedDict()
+    edits = list(random_edits(TEXT, 7))
+    for i, (keep, append) in enumerate(edits):
+        # Alternate the worker each edit lands on, each with its own memory
+        monkeypatch.setattr(live_scoring, "_drafts", worker_a if i % 2 else worker_b)
+        question = None if live_scoring.get_draft(SESSION_ID, 0) else QUESTION
+        snapshot = apply_draft_edit(SESSION_ID, 0, keep, append, question)
+
+    assert snapshot["matched_keywords"] == full_score(TEXT)["matched_keywords"]
+    # The submit lands on the worker whose state is stale; it catches up
+    monkeypatch.setattr(live_scoring, "_drafts", worker_a if len(edits) % 2 else worker_b)
+    assert take_draft_text_eval(SESSION_ID, 0, TEXT) == full_score(TEXT)
+
+
+def test_an_edit_appends_only_its_delta_to_the_log(monkeypatch):
+    apply_draft_edit(SESSION_ID, 3, 0, TEXT, QUESTION)
+    path = live_scoring._draft_path(SESSION_ID, 3)
+    size = os.path.getsize(path)
+    apply_draft_edit(SESSION_ID, 3, len(TEXT), " ok", QUESTION)
+    assert os.path.getsize(path) - size == len(live_scoring._edit_line(len(TEXT), " ok"))
+
+    # Another worker replays the whole log once, then only what it missed
+    monkeypatch.setattr(live_scoring, "_drafts", OrderedDict())
+    apply_draft_edit(SESSION_ID, 3, len(TEXT) + 3, "!", QUESTION)
+    draft = live_scoring.get_draft(SESSION_ID, 3)
+    assert draft.text == TEXT + " ok!"
+    assert draft.log_offset == os.path.getsize(path)
+
+
+def test_edit_that_does_not_fit_the_stored_draft_is_rejected():
+    apply_draft_edit(SESSION_ID, 1, 0, "short", QUESTION)
+    with pytest.raises(ValueError):
+        apply_draft_edit(SESSION_ID, 1, 50, " more", QUESTION)
+
+
+def test_submit_with_other_text_needs_a_fresh_evaluation():
+    apply_draft_edit(SESSION_ID, 2, 0, TEXT, QUESTION)
+    assert take_draft_text_eval(SESSION_ID, 2, TEXT + " edited") is None
+    # The draft is consumed either way
+    assert take_draft_text_eval(SESSION_ID, 2, TEXT) is None
@@ -0,0 +1,26 @@
+import pytest
+
+from polarity import calibrate, polarity
+
+textblob = pytest.importorskip("textblob")
+
+PHRASES = [
+    "This is a good answer.",
+    "This is a very good answer!",
+    "That is not good at all.",
+    "Never a great idea, honestly.",
+    "Terrible latency, but the cache is extremely helpful :)",
+    "I am not sure, it is somewhat complicated.",
+    "",
+]
+
+
+@pytest.mark.parametrize("text", PHRASES)
+def test_polarity_matches_textblob(text):
+    assert polarity(text) == pytest.approx(textblob.TextBlob(text).sentiment.polarity, abs=1e-6)
+
+
+def test_question_bank_calibrates_against_textblob():
+    report = calibrate(tolerance=0.02)
+    assert report["texts"] > 0
+    assert report["ok"], report["label_mismatches"] or report["mean_abs_diff"]
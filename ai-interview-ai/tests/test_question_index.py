@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import threading
+
+import pytest
+
+import question_index
+from question_bank import QUESTION_BANK
+from question_index import (
+    LEVEL_ROUNDS, export_bank, reload_bank, questions_for, bank_info, get_question_index
+)
+
+DOMAIN = next(iter(QUESTION_BANK))
+
+
+def join_reloads():
+    # A reload scheduled by an earlier lookup must not land in the next test
+    for t in threading.enumerate():
+        if t.name == "question-bank-reload":
+            t.join(30)
+
+
+@pytest.fixture
+def bank_dir(tmp_path, monkeypatch):
+    join_reloads()
+    banks = tmp_path / "banks"
+    export_bank(str(banks), version="1")
+    monkeypatch.setattr(question_index, "QUESTION_BANK_DIR", str(banks))
+    monkeypatch.setattr(question_index, "QUESTION_ARTIFACT_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(question_index, "_current", None)
+    monkeypatch.setattr(question_index, "_reload", {"running": False, "last_check": 0.0})
+    yield banks
+    join_reloads()
+
+
+def edit_bank(banks, domain, edit, version):
+    path = banks / f"{domain}.json"
+    doc = json.loads(path.read_text())
+    edit(doc["rounds"])
+    doc["version"] = version
+    path.write_text(json.dumps(doc))
+    # Make sure the mtime moves even on coarse filesystem clocks
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def without_ids(questions):
+    return [{k: v for k, v in q.items() if k != "id"} for q in questions]
+
+
+def expected(rounds, level):
+    if level == "all":
+        return [q for rk in rounds for q in rounds[rk]]
+    return list(rounds[LEVEL_ROUNDS[level]])
+
+
+def assert_parity(bank):
+    for domain, rounds in bank.items():
+        for level in ["all", *LEVEL_ROUNDS]:
+            assert without_ids(questions_for(domain, level)) == expected(rounds, level)
+
+
+def test_questions_for_matches_the_bank_files(bank_dir):
+    assert reload_bank()
+    assert_parity(QUESTION_BANK)
+    assert bank_info()["versions"][DOMAIN] == "1"
+
+
+def test_questions_for_matches_after_reload(bank_dir):
+    reload_bank()
+    new_question = {"q": "What changed in the new bank?", "keywords": ["release"],
+                    "model_answer": "A new release of the bank.", "weight": 1.0}
+    edit_bank(bank_dir, DOMAIN,
+              lambda rounds: rounds["round_2_domain"].append(new_question), "2")
+
+    assert reload_bank()
+    bank = json.loads(json.dumps(QUESTION_BANK))
+    bank[DOMAIN]["round_2_domain"].append(new_question)
+    assert_parity(bank)
+    assert bank_info()["versions"][DOMAIN] == "2"
+    # An unchanged bank is not rebuilt
+    assert not reload_bank()
+
+
+def test_artifacts_are_cached_outside_the_working_directory(bank_dir, tmp_path):
+    reload_bank()
+    assert os.listdir(tmp_path / "cache")
+    assert not os.path.exists(".bank_cache")
+
+
+def test_broken_bank_file_keeps_the_last_good_bank(bank_dir):
+    reload_bank()
+    before = bank_info()["hash"]
+    (bank_dir / f"{DOMAIN}.json").write_text("{ not json")
+    assert not reload_bank()
+    assert bank_info()["hash"] == before
+    assert_parity(QUESTION_BANK)
+
+
+def test_lookups_reload_in_a_background_thread(bank_dir, monkeypatch):
+    reload_bank()
+    old_index = get_question_index()
+    # That lookup may have scheduled a check already; let it finish unchanged
+    join_reloads()
+    monkeypatch.setattr(question_index, "RELOAD_CHECK_SECONDS", 0.0)
+    edit_bank(bank_dir, DOMAIN, lambda rounds: rounds["round_1_background"].pop(), "3")
+
+    loaded_on = []
+    load_bank = question_index.load_bank
+
+    def spy():
+        loaded_on.append(threading.current_thread().name)
+        return load_bank()
+
+    monkeypatch.setattr(question_index, "load_bank", spy)
+    # The lookup answers from the current state and leaves the work to a thread
+    assert get_question_index() is old_index
+
+    deadline = time.monotonic() + 30
+    while bank_info()["versions"].get(DOMAIN) != "3" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert loaded_on and "question-bank-reload" in loaded_on
+    assert get_question_index() is not old_index
+
+
+def test_changed_fuzzy_distances_rebuild_the_cached_matchers(bank_dir, tmp_path, monkeypatch):
+    import evaluator
+    import keyword_match
+
+    reload_bank()
+    keywords = next(q["keywords"] for q in questions_for(DOMAIN, "all")
+                    if any(len(k) >= 6 for k in q.get("keywords", [])))
+    assert evaluator.compile_keywords(keywords).index
+
+    # A new boot with fuzzy matching disabled must not load the old matchers
+    monkeypatch.setattr(keyword_match, "DISTANCE_STEPS", [])
+    monkeypatch.setattr(evaluator, "_keyword_matchers", {})
+    monkeypatch.setattr(question_index, "_current", None)
+    reload_bank()
+    assert len(os.listdir(tmp_path / "cache")) == 2
+    assert not evaluator.compile_keywords(keywords).index
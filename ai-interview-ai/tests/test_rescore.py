@@ -0,0 +1,36 @@
+import os
+import json
+import uuid
+
+import rescore
+from session_store import empty_score_slots
+
+
+def stored_session(root, answer="We cache the API responses with a short TTL."):
+    session_id = str(uuid.uuid4())
+    q = {"q": "How would you cache an API?", "keywords": ["cache", "TTL"],
+         "model_answer": "Cache responses with a TTL and invalidate on writes."}
+    scores = empty_score_slots(1)
+    scores[0] = {"transcript": answer, "overall_marks": 5.0,
+                 "breakdown": {f: 50.0 for f in rescore.BREAKDOWN_FIELDS}}
+    (root / f"{session_id}.json").write_text(json.dumps(
+        {"session_id": session_id, "questions": [q], "scores": scores}))
+    return session_id
+
+
+def test_corrupt_session_is_recorded_and_the_run_continues(tmp_path):
+    good = stored_session(tmp_path)
+    corrupt = str(uuid.uuid4())
+    (tmp_path / f"{corrupt}.json").write_text("{ not json")
+
+    summary = rescore.run(str(tmp_path), "t1", workers=1, batch_size=1)
+    assert summary["sessions"] == 1
+    assert summary["failed_sessions"] == 1
+    assert summary["errors"][0]["session_id"] == corrupt
+    assert os.path.exists(tmp_path / "rescored" / "t1" / f"{good}.json")
+
+    # A resume neither retries the broken session nor double counts it
+    again = rescore.run(str(tmp_path), "t1", workers=1, batch_size=1)
+    assert again["failed_sessions"] == 1 and again["sessions"] == 1
+    lines = (tmp_path / "rescored" / "t1" / rescore.CHECKPOINT_FILE).read_text().splitlines()
+    assert sorted(json.loads(line)["session_id"] for line in lines) == sorted([good, corrupt])
@@ -0,0 +1,161 @@
+import os
+import uuid
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import submissions
+import session_store
+from session_store import (
+    SESSIONS_DIR, LOCK_DIR, save_session, load_session, empty_score_slots,
+    session_lock, lock_path
+)
+
+
+def new_session(questions=2) -> str:
+    session_id = str(uuid.uuid4())
+    save_session(session_id, {
+        "session_id": session_id,
+        "profile": "fast",
+        "questions": [{"q": f"Question {i}", "keywords": []} for i in range(questions)],
+        "scores": empty_score_slots(questions),
+        "idempotency": {},
+    })
+    return session_id
+
+
+@pytest.fixture
+def evaluations(monkeypatch):
+    """Replace the evaluation with a recorder of the answers it was given."""
+    calls = []
+
+    async def fake_run_admitted(cost_class, fn, session, index, answer_text, *args):
+        calls.append((index, answer_text))
+        return {"finished": False, "current_score": {"answer": answer_text},
+                "final_result": None, "similarity": None}
+
+    monkeypatch.setattr(submissions, "run_admitted", fake_run_admitted)
+    return calls
+
+
+def submit(session_id, index, answer_text, key=None):
+    return asyncio.run(submissions.submit_answer(session_id, index, answer_text,
+                                                 idempotency_key=key))
+
+
+def test_retry_with_same_key_returns_stored_response(evaluations):
+    session_id = new_session()
+    first = submit(session_id, 0, "first answer", key="k1")
+    again = submit(session_id, 0, "first answer", key="k1")
+    assert again == first
+    assert evaluations == [(0, "first answer")]
+
+
+def test_retry_without_key_dedupes_on_payload(evaluations):
+    session_id = new_session()
+    submit(session_id, 1, "same answer")
+    submit(session_id, 1, "same answer")
+    assert evaluations == [(1, "same answer")]
+
+
+def test_key_reused_for_other_payload_is_409(evaluations):
+    session_id = new_session()
+    submit(session_id, 0, "first answer", key="k1")
+    with pytest.raises(HTTPException) as e:
+        submit(session_id, 0, "different answer", key="k1")
+    assert e.value.status_code == 409
+
+
+def test_only_latest_response_per_index_is_kept(evaluations):
+    session_id = new_session()
+    submit(session_id, 0, "draft one", key="a")
+    submit(session_id, 0, "draft two", key="b")
+    submit(session_id, 1, "other question", key="c")
+    entries = load_session(session_id)["idempotency"]
+    assert sorted(entries) == ["b", "c"]
+
+
+def stream(session_id, index, answer_text, key=None):
+    async def consume():
+        ticket, events = await submissions.stream_answer(session_id, index, answer_text,
+                                                         idempotency_key=key)
+        return [event async for event in events]
+    return asyncio.run(consume())
+
+
+def test_streamed_retry_replays_the_stored_response(evaluations):
+    session_id = new_session()
+    first = submit(session_id, 0, "first answer", key="k1")
+    assert stream(session_id, 0, "first answer", key="k1") == [("result", first)]
+    assert evaluations == [(0, "first answer")]
+
+
+def test_streamed_key_reused_for_other_payload_is_409(evaluations):
+    session_id = new_session()
+    submit(session_id, 0, "first answer", key="k1")
+    with pytest.raises(HTTPException) as e:
+        stream(session_id, 0, "different answer", key="k1")
+    assert e.value.status_code == 409
+
+
+@pytest.mark.parametrize("session_id", ["../evil", "../../tmp/evil", "", "not-a-session"])
+def test_malformed_session_id_is_404_and_touches_no_files(evaluations, session_id):
+    before = set(os.listdir(LOCK_DIR))
+    with pytest.raises(HTTPException) as e:
+        submit(session_id, 0, "answer")
+    assert e.value.status_code == 404
+    assert not os.path.exists("evil.lock")
+    assert not os.path.exists(os.path.join(SESSIONS_DIR, "..", "evil.lock"))
+    assert set(os.listdir(LOCK_DIR)) == before
+    assert evaluations == []
+
+
+def test_unknown_session_is_404_without_lock_files(evaluations):
+    before = set(os.listdir(LOCK_DIR))
+    with pytest.raises(HTTPException) as e:
+        submit(str(uuid.uuid4()), 0, "answer")
+    assert e.value.status_code == 404
+    assert set(os.listdir(LOCK_DIR)) == before
+
+
+def test_lock_files_are_removed_after_use(evaluations):
+    before = set(os.listdir(LOCK_DIR))
+    for _ in range(20):
+        submit(new_session(), 0, "answer")
+    assert set(os.listdir(LOCK_DIR)) == before
+    assert not any(name.endswith(".lock") for name in os.listdir(SESSIONS_DIR))
+
+
+def test_different_sessions_never_wait_on_each_other():
+    first, second = new_session(), new_session()
+
+    async def hold_both():
+        async with session_lock(first):
+            async with session_lock(second):
+                return True
+
+    assert asyncio.run(asyncio.wait_for(hold_both(), 5))
+
+
+def test_waiter_on_a_removed_lock_file_retries():
+    session_id = new_session()
+    path = lock_path(session_id)
+    order = []
+
+    async def holder(name):
+        async with session_lock(session_id):
+            order.append(name)
+            await asyncio.sleep(0.05)
+
+    async def contend():
+        # Separate asyncio locks, as in two workers: only the flock orders them
+        session_store._session_locks.clear()
+        first = asyncio.create_task(holder("a"))
+        await asyncio.sleep(0.01)
+        session_store._session_locks.clear()
+        await asyncio.gather(first, holder("b"))
+
+    asyncio.run(contend())
+    assert order == ["a", "b"]
+    assert not os.path.exists(path)
@@ -0,0 +1,65 @@
+import pytest
+
+import similarity
+from similarity import check_answer, public_report, session_matches
+
+QUESTION = {"id": "q-cache", "q": "How would you cache an API?",
+            "model_answer": "Put a cache in front of the slow reads."}
+ANSWER = ("We put a read-through cache in front of the product API, keyed by "
+          "the request path, with a short TTL and explicit invalidation on writes.")
+
+
+def sid(n: int) -> str:
+    return f"00000000-0000-4000-8000-{n:012d}"
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(similarity, "SIMILARITY_LOG", str(tmp_path / "similarity.jsonl"))
+    monkeypatch.setattr(similarity, "_indexes", {})
+    monkeypatch.setattr(similarity, "_log_state", {"offset": 0, "inode": None, "lines": 0})
+    return tmp_path / "similarity.jsonl"
+
+
+def test_candidates_see_no_other_session_ids():
+    check_answer(QUESTION, sid(1), ANSWER)
+    report = check_answer(QUESTION, sid(2), ANSWER)
+    assert report["flagged"] and report["matches"][0]["session_id"] == sid(1)
+    assert public_report(report) == {"score": 1.0, "flagged": True}
+
+
+def test_reviewers_get_the_matching_sessions():
+    check_answer(QUESTION, sid(1), ANSWER)
+    check_answer(QUESTION, sid(2), ANSWER)
+    found = session_matches({"session_id": sid(2), "questions": [QUESTION]})
+    assert found == [{"question": "q-cache",
+                      "matches": [{"session_id": sid(1), "similarity": 1.0}]}]
+
+
+def test_each_question_keeps_only_its_latest_answers(monkeypatch):
+    monkeypatch.setattr(similarity, "MAX_PER_QUESTION", 3)
+    for n in range(5):
+        check_answer(QUESTION, sid(n), f"{ANSWER} variant {n}")
+    assert list(similarity._indexes["q-cache"]["signatures"]) == [sid(2), sid(3), sid(4)]
+
+
+def test_log_is_rewritten_once_mostly_stale(fresh_index, monkeypatch):
+    monkeypatch.setattr(similarity, "MAX_PER_QUESTION", 2)
+    monkeypatch.setattr(similarity, "LOG_MAX_BYTES", 1)
+    for n in range(6):
+        check_answer(QUESTION, sid(n), f"{ANSWER} variant {n}")
+    assert len(fresh_index.read_text().splitlines()) <= 4
+
+    # Another worker replaying the rewritten log sees the same index
+    expected = list(similarity._indexes["q-cache"]["signatures"])
+    monkeypatch.setattr(similarity, "_indexes", {})
+    monkeypatch.setattr(similarity, "_log_state", {"offset": 0, "inode": None, "lines": 0})
+    similarity.load_index()
+    assert list(similarity._indexes["q-cache"]["signatures"]) == expected
+
+
+def test_memory_eviction_drops_the_oldest_answer():
+    for n in range(3):
+        check_answer(QUESTION, sid(n), f"{ANSWER} variant {n}")
+    assert similarity._evict_oldest_signature()
+    assert sid(0) not in similarity._indexes["q-cache"]["signatures"]
@@ -0,0 +1,125 @@
+import time
+import threading
+
+import pytest
+
+import stage_guard
+from stage_guard import guarded, breaker_report, StageUnavailable
+
+ENGINE = "librosa"
+
+
+@pytest.fixture(autouse=True)
+def fresh_breaker(monkeypatch):
+    monkeypatch.setitem(stage_guard._state, ENGINE, {
+        "failures": 0, "open_until": 0.0, "trial": False,
+        "calls": 0, "timeouts": 0, "errors": 0, "rejected": 0,
+    })
+    monkeypatch.setattr(stage_guard, "BREAKER_FAILURES", 2)
+    monkeypatch.setattr(stage_guard, "BREAKER_COOLDOWN_SECONDS", 0.1)
+    # Own pools per test: calls a test left sleeping must not hold the next one's threads
+    monkeypatch.setattr(stage_guard, "_pools", {})
+    monkeypatch.setattr(stage_guard, "ENGINE_WORKERS", 2)
+    yield
+    for pool in stage_guard._pools.values():
+        pool.shutdown(wait=True)
+
+
+def fail():
+    raise RuntimeError("engine failed")
+
+
+def state() -> str:
+    return breaker_report()[ENGINE]["state"]
+
+
+def trip():
+    for _ in range(stage_guard.BREAKER_FAILURES):
+        with pytest.raises(StageUnavailable) as e:
+            guarded(ENGINE, fail)
+        assert e.value.reason == "error"
+
+
+def test_consecutive_failures_open_the_breaker():
+    assert guarded(ENGINE, lambda: 42) == 42
+    trip()
+    assert state() == "open"
+
+    calls = []
+    with pytest.raises(StageUnavailable) as e:
+        guarded(ENGINE, calls.append, 1)
+    assert e.value.reason == "circuit_open"
+    assert calls == []
+    assert breaker_report()[ENGINE]["rejected"] == 1
+
+
+def test_success_resets_the_failure_count():
+    with pytest.raises(StageUnavailable):
+        guarded(ENGINE, fail)
+    guarded(ENGINE, lambda: None)
+    with pytest.raises(StageUnavailable):
+        guarded(ENGINE, fail)
+    assert state() == "closed"
+
+
+def test_half_open_lets_one_trial_through_and_closes_on_success():
+    trip()
+    time.sleep(0.15)
+    assert state() == "half_open"
+
+    started, release = threading.Event(), threading.Event()
+
+    def trial():
+        started.set()
+        release.wait(5)
+        return "ok"
+
+    result = []
+    t = threading.Thread(target=lambda: result.append(guarded(ENGINE, trial)))
+    t.start()
+    assert started.wait(5)
+    # While the trial runs every other call is rejected
+    with pytest.raises(StageUnavailable) as e:
+        guarded(ENGINE, lambda: None)
+    assert e.value.reason == "circuit_open"
+    release.set()
+    t.join(5)
+
+    assert result == ["ok"]
+    assert state() == "closed"
+    assert guarded(ENGINE, lambda: 1) == 1
+
+
+def test_failed_trial_reopens_the_breaker():
+    trip()
+    time.sleep(0.15)
+    with pytest.raises(StageUnavailable) as e:
+        guarded(ENGINE, fail)
+    assert e.value.reason == "error"
+    assert state() == "open"
+    with pytest.raises(StageUnavailable) as e:
+        guarded(ENGINE, lambda: None)
+    assert e.value.reason == "circuit_open"
+
+
+def test_missed_deadline_counts_as_a_failure(monkeypatch):
+    monkeypatch.setitem(stage_guard.ENGINES, ENGINE, {"deadline": 0.05})
+    for _ in range(stage_guard.BREAKER_FAILURES):
+        with pytest.raises(StageUnavailable) as e:
+            guarded(ENGINE, time.sleep, 0.3)
+        assert e.value.reason == "timeout"
+    assert state() == "open"
+    assert breaker_report()[ENGINE]["timeouts"] == stage_guard.BREAKER_FAILURES
+
+
+def test_profiled_request_keeps_the_pool_and_deadline(monkeypatch):
+    from profiling import request_profiler
+
+    monkeypatch.setitem(stage_guard.ENGINES, ENGINE, {"deadline": 0.05})
+    caller = threading.get_ident()
+    with request_profiler("POST", "/test") as meta:
+        assert guarded(ENGINE, threading.get_ident) != caller
+        with pytest.raises(StageUnavailable) as e:
+            guarded(ENGINE, time.sleep, 0.3)
+    assert e.value.reason == "timeout"
+    assert meta["profiled_calls"] >= 1
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, File, Form, UploadFile
+from fastapi.testclient import TestClient
+
+import uploads
+from uploads import BodyLimitMiddleware, UploadRoute, receive_upload
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 200
+WAV = b"RIFF\x24\x00\x00\x00WAVEfmt " + b"\x00" * 200
+
+received = []
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.router.route_class = UploadRoute
+    app.add_middleware(BodyLimitMiddleware)
+
+    @app.post("/interview/evaluate")
+    async def evaluate(answer_text: str = Form(""), image: UploadFile = File(None),
+                       audio: UploadFile = File(None)):
+        img = await receive_upload(image, "image")
+        aud = await receive_upload(audio, "audio")
+        received.append((img, aud))
+        out = {"answer_text": answer_text,
+               "image": img and [img.format, img.size, img.read_bytes() == PNG],
+               "audio": aud and [aud.format, aud.size]}
+        for u in (img, aud):
+            if u: u.close()
+        return out
+
+    return app
+
+
+@pytest.fixture
+def client():
+    received.clear()
+    return TestClient(make_app())
+
+
+def test_parts_are_spooled_once_while_parsing(client):
+    r = client.post("/interview/evaluate", data={"answer_text": "hi"},
+                    files={"image": ("a.png", PNG), "audio": ("a.wav", WAV)})
+    assert r.status_code == 200
+    assert r.json() == {"answer_text": "hi", "image": ["png", len(PNG), True],
+                        "audio": ["wav", len(WAV)]}
+    img, aud = received[0]
+    # The parser's spool is the one handed over, not a copy of it
+    assert isinstance(img, uploads.SpooledUpload) and img.digest
+
+
+def test_empty_upload_is_none(client):
+    r = client.post("/interview/evaluate", files={"image": ("a.png", b"")})
+    assert r.status_code == 200 and r.json()["image"] is None
+
+
+def test_oversized_part_is_refused_during_the_parse(client, monkeypatch):
+    monkeypatch.setitem(uploads.UPLOAD_LIMITS, "image", 100)
+    r = client.post("/interview/evaluate", files={"image": ("a.png", PNG)})
+    assert r.status_code == 413
+    assert received == []
+
+
+def test_mistyped_part_is_refused_during_the_parse(client):
+    r = client.post("/interview/evaluate", files={"image": ("a.png", WAV)})
+    assert r.status_code == 415
+    assert received == []
+
+
+def test_unexpected_file_field_is_refused(client):
+    r = client.post("/interview/evaluate", files={"resume": ("a.pdf", b"%PDF-1.4")})
+    assert r.status_code == 400
+
+
+def call_middleware(path: str, content_length: bytes):
+    sent = []
+
+    async def app(scope, receive, send):
+        sent.append("app")
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "path": path, "headers": [(b"content-length", content_length)]}
+    asyncio.run(BodyLimitMiddleware(app, limit=1000)(scope, receive, send))
+    return sent[0]["status"] if sent[0] != "app" else "app"
+
+
+@pytest.mark.parametrize("value", [b"abc", b"-5", b""])
+def test_malformed_content_length_is_a_bad_request(value):
+    assert call_middleware("/interview/evaluate", value) == 400
+
+
+def test_jobs_uploads_are_limited_too():
+    assert call_middleware("/interview/jobs", b"5000") == 413
+    assert call_middleware("/interview/jobs", b"500") == "app"
@@ -0,0 +1,194 @@
+# text_analysis.py - One-pass analysis of an answer shared by every text stage
+
+import os
+import re
+from collections import Counter, OrderedDict
+
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+from memory import register_cache, sampled_size
+
+# Cost model: scoring never sees more than this much of an answer
+MAX_ANSWER_CHARS = int(os.getenv("ANSWER_MAX_CHARS", "20000"))
+MAX_ANSWER_TOKENS = int(os.getenv("ANSWER_MAX_TOKENS", "3000"))
+SAMPLE_WINDOWS = max(int(os.getenv("ANSWER_SAMPLE_WINDOWS", "4")), 1)
+# How far a window edge may move back to land on whitespace
+_SNAP_CHARS = 64
+
+_WORD_RE = re.compile(r"\S+")
+_SENTENCE_RE = re.compile(r"[^.!?]+")
+# Same token pattern TfidfVectorizer uses by default
+_TERM_RE = re.compile(r"(?u)\b\w\w+\b")
+
+
+class AnalyzedText:
+    """
+    Everything the text stages derive from an answer, computed once.
+
+    `words` follows str.split() on the normalized text (word counts,
+    diversity), `sentences` follows re.split(r'[.!?]+') and `terms` follows
+    TfidfVectorizer's default analyzer, so scores are identical to deriving
+    each of them separately.
+    """
+
+    __slots__ = ("raw", "lower", "normalized", "words", "word_offsets",
+                 "sentences", "word_counts", "_terms")
+
+    def __init__(self, raw: str):
+        self.raw = raw or ""
+        self.lower = self.raw.lower()
+        self.normalized = self.lower.strip()
+
+        self.words = []
+        self.word_offsets = []
+        for m in _WORD_RE.finditer(self.lower):
+            self.words.append(m.group())
+            self.word_offsets.append((m.start(), m.end()))
+        self.word_counts = Counter(self.words)
+
+        self.sentences = []
+        for m in _SENTENCE_RE.finditer(self.raw):
+            if not m.group().strip():
+                continue
+            start, end = m.span()
+            while self.raw[start].isspace(): start += 1
+            while self.raw[end - 1].isspace(): end -= 1
+            self.sentences.append((start, end))
+
+        self._terms = None
+
+    @property
+    def word_count(self) -> int:
+        return len(self.words)
+
+    @property
+    def unique_count(self) -> int:
+        return len(self.word_counts)
+
+    @property
+    def sentence_count(self) -> int:
+        return len(self.sentences)
+
+    def is_blank(self, min_chars: int = 5) -> bool:
+        return len(self.normalized) < min_chars
+
+    @property
+    def terms(self) -> list:
+        """Stop-word filtered unigrams and bigrams, as TfidfVectorizer builds them."""
+        if self._terms is None:
+            tokens = [t for t in _TERM_RE.findall(self.lower)
+                      if t not in ENGLISH_STOP_WORDS]
+            self._terms = tokens + [" ".join(p) for p in zip(tokens, tokens[1:])]
+        return self._terms
+
+
+_references = OrderedDict()
+REFERENCE_CACHE_SIZE = 1024
+
+
+def analyze_reference(text: str) -> AnalyzedText:
+    """Model answers repeat across candidates, so keep their analysis (LRU)."""
+    doc = _references.get(text)
+    if doc is None:
+        doc = _references[text] = AnalyzedText(text)
+        while len(_references) > REFERENCE_CACHE_SIZE:
+            _references.popitem(last=False)
+    else:
+        _references.move_to_end(text)
+    return doc
+
+
+def seed_references(docs: dict):
+    """Install model-answer analyses precomputed from the question bank."""
+    for text, doc in docs.items():
+        _references[text] = doc
+    while len(_references) > REFERENCE_CACHE_SIZE:
+        _references.popitem(last=False)
+
+
+def _evict_reference():
+    if not _references:
+        return False
+    _references.popitem(last=False)
+
+
+register_cache(
+    "reference_analysis",
+    count=lambda: len(_references),
+    size=lambda: sampled_size(iter(list(_references.values())), len(_references)),
+    evict=_evict_reference,
+)
+
+
+def terms_of(doc: AnalyzedText) -> list:
+    """Analyzer hook for TfidfVectorizer over AnalyzedText documents."""
+    return doc.terms
+
+
+# ============================
+# COST BOUNDS
+# ============================
+def _snap_back(text: str, pos: int, floor: int) -> int:
+    """Move a cut point back onto whitespace, within _SNAP_CHARS."""
+    for i in range(pos, max(pos - _SNAP_CHARS, floor), -1):
+        if text[i - 1].isspace():
+            return i
+    return pos
+
+
+def _windows(n: int, size: int) -> list:
+    """Start offsets of SAMPLE_WINDOWS evenly spaced windows of `size` over n."""
+    if SAMPLE_WINDOWS == 1:
+        return [0]
+    return [w * (n - size) // (SAMPLE_WINDOWS - 1) for w in range(SAMPLE_WINDOWS)]
+
+
+def bound_answer(text: str):
+    """
+    Return (text to score, truncation info or None).
+
+    Answers over MAX_ANSWER_CHARS or MAX_ANSWER_TOKENS are scored on
+    SAMPLE_WINDOWS evenly spaced windows (head, tail and the middle), so
+    keyword coverage across the whole answer still counts. Sampling only
+    touches the kept characters, so its cost is bounded by the limits, not
+    by the size of the paste. The same input always yields the same sample.
+    The info carries "estimated_words" for the whole answer, scaled from the
+    sample's word density rather than counted over the paste.
+    """
+    text = text or ""
+    original_chars = len(text)
+    sampled = text
+
+    if len(sampled) > MAX_ANSWER_CHARS:
+        # Leave room for window starts snapping back onto whitespace
+        size = max(MAX_ANSWER_CHARS // SAMPLE_WINDOWS - _SNAP_CHARS, 1)
+        pieces = []
+        for offset in _windows(len(sampled), size):
+            start = _snap_back(sampled, offset, offset - size) if offset else 0
+            end = offset + size
+            if end < len(sampled):
+                end = _snap_back(sampled, end, start + 1)
+            pieces.append(sampled[start:end].strip())
+        sampled = "\n".join(pieces)
+
+    spans = [m.span() for m in _WORD_RE.finditer(sampled)]
+    if len(spans) > MAX_ANSWER_TOKENS:
+        per = max(MAX_ANSWER_TOKENS // SAMPLE_WINDOWS, 1)
+        sampled = "\n".join(
+            sampled[spans[i][0]:spans[i + per - 1][1]]
+            for i in _windows(len(spans), per)
+        )
+        spans = None
+
+    if sampled is text:
+        return text, None
+    scored_words = len(sampled.split())
+    return sampled, {
+        "truncated": True,
+        "method": "windowed" if SAMPLE_WINDOWS > 1 else "head",
+        "windows": SAMPLE_WINDOWS,
+        "original_chars": original_chars,
+        "scored_chars": len(sampled),
+        "scored_tokens": len(spans) if spans is not None else scored_words,
+        "estimated_words": round(scored_words * original_chars / max(len(sampled), 1)),
+    }
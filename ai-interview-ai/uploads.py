@@ -0,0 +1,349 @@
+# uploads.py - Bounded, spooled handling of uploaded media
+#
+# Multipart requests to the app's routes are parsed by UploadFormParser
+# (through UploadRoute): file parts are written straight into a
+# SpooledUpload while the body is read, their magic bytes are checked once
+# the first 16 bytes arrive and the per-type limit is applied to every
+# chunk, so an oversized or mistyped upload is refused without reading the
+# rest and nothing is spooled twice. BodyLimitMiddleware caps whole request
+# bodies on top of that.
+
+import os
+import shutil
+import hashlib
+import tempfile
+from contextlib import aclosing
+
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartParser, MultiPartException
+from starlette.requests import Request
+
+from evaluator import detect_audio_magic
+from memory import env_bytes
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_THRESHOLD = env_bytes("UPLOAD_SPOOL_THRESHOLD") or 1 << 20
+
+UPLOAD_LIMITS = {
+    "image": env_bytes("UPLOAD_LIMIT_IMAGE") or 5 << 20,
+    "audio": env_bytes("UPLOAD_LIMIT_AUDIO") or 25 << 20,
+    "pdf": env_bytes("UPLOAD_LIMIT_PDF") or 10 << 20,
+}
+# Whole-request cap for the multipart endpoints, checked before parsing
+BODY_LIMIT = sum(UPLOAD_LIMITS.values()) + (1 << 20)
+LIMITED_PATHS = ("/interview/evaluate", "/interview/jobs", "/interview/resume/start")
+# Multipart file field -> upload kind; any other file field is refused
+UPLOAD_FIELDS = {"image": "image", "audio": "audio", "file": "pdf"}
+
+ALLOWED_FORMATS = {
+    "image": {"jpeg", "png", "webp", "bmp"},
+    "audio": {"wav", "webm", "ogg", "flac", "mp3", "mp4"},
+    "pdf": {"pdf"},
+}
+
+
+class UploadRejected(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def detect_image_magic(header: bytes):
+    if header[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    elif header[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    elif header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    elif header[:2] == b"BM":
+        return "bmp"
+    return None
+
+
+def detect_format(kind: str, header: bytes):
+    if kind == "image":
+        return detect_image_magic(header)
+    if kind == "audio":
+        return detect_audio_magic(header)
+    if kind == "pdf":
+        return "pdf" if header[:5] == b"%PDF-" else None
+    return None
+
+
+# ============================
+# SPOOLED UPLOAD
+# ============================
+class SpooledUpload:
+    """
+    An uploaded payload copied into a buffer that stays in memory up to
+    SPOOL_THRESHOLD and spills to a temp file beyond it.
+    """
+
+    def __init__(self, kind: str, fmt: str):
+        self.kind = kind
+        self.format = fmt
+        self.size = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD)
+        self._digest = hashlib.sha256()
+
+    @property
+    def digest(self) -> str:
+        return self._digest.hexdigest()
+
+    @property
+    def in_memory_bytes(self) -> int:
+        return 0 if getattr(self.file, "_rolled", False) else self.size
+
+    def _write(self, chunk: bytes):
+        self.file.write(chunk)
+        self._digest.update(chunk)
+        self.size += len(chunk)
+
+    def stream(self):
+        self.file.seek(0)
+        return self.file
+
+    def read_bytes(self) -> bytes:
+        return self.stream().read()
+
+    def save_to(self, path: str):
+        with open(path, "wb") as f:
+            shutil.copyfileobj(self.stream(), f, CHUNK_SIZE)
+
+    def close(self):
+        self.file.close()
+
+
+async def receive_upload(upload, kind: str):
+    """
+    The SpooledUpload of an uploaded file, or None for a missing or empty
+    one. Parts parsed by UploadFormParser are handed over as they are;
+    any other UploadFile is copied chunk by chunk, rejected as soon as the
+    magic bytes don't match `kind` (415) or it grows past the per-type
+    limit (413).
+    """
+    if upload is None:
+        return None
+    if isinstance(upload, ParsedUpload) and upload.spooled.kind == kind:
+        return upload.take()
+
+    limit = UPLOAD_LIMITS[kind]
+    declared = getattr(upload, "size", None)
+    if declared is not None and declared > limit:
+        raise UploadRejected(413, f"{kind} upload exceeds {limit} bytes")
+
+    first = await upload.read(CHUNK_SIZE)
+    if not first:
+        return None
+
+    fmt = detect_format(kind, first[:16])
+    if fmt not in ALLOWED_FORMATS[kind]:
+        raise UploadRejected(415, f"Unsupported {kind} format")
+
+    spooled = SpooledUpload(kind, fmt)
+    try:
+        chunk = first
+        while chunk:
+            if spooled.size + len(chunk) > limit:
+                raise UploadRejected(413, f"{kind} upload exceeds {limit} bytes")
+            spooled._write(chunk)
+            chunk = await upload.read(CHUNK_SIZE)
+    except Exception:
+        spooled.close()
+        raise
+    return spooled
+
+
+def spool_bytes(data: bytes, kind: str):
+    """receive_upload for a payload that arrived inline (e.g. MessagePack)."""
+    if not data:
+        return None
+    limit = UPLOAD_LIMITS[kind]
+    if len(data) > limit:
+        raise UploadRejected(413, f"{kind} upload exceeds {limit} bytes")
+    fmt = detect_format(kind, data[:16])
+    if fmt not in ALLOWED_FORMATS[kind]:
+        raise UploadRejected(415, f"Unsupported {kind} format")
+
+    spooled = SpooledUpload(kind, fmt)
+    view = memoryview(data)
+    for start in range(0, len(data), CHUNK_SIZE):
+        spooled._write(view[start:start + CHUNK_SIZE])
+    return spooled
+
+
+def spool_file(path: str, kind: str):
+    """Re-spool media saved earlier with SpooledUpload.save_to."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        first = f.read(CHUNK_SIZE)
+        fmt = detect_format(kind, first[:16])
+        if not first or fmt not in ALLOWED_FORMATS[kind]:
+            return None
+        spooled = SpooledUpload(kind, fmt)
+        chunk = first
+        while chunk:
+            spooled._write(chunk)
+            chunk = f.read(CHUNK_SIZE)
+    return spooled
+
+
+# ============================
+# STREAMING MULTIPART
+# ============================
+class ParsedUpload(UploadFile):
+    """A file part that UploadFormParser wrote straight into a SpooledUpload."""
+
+    def __init__(self, spooled: SpooledUpload, filename: str, headers):
+        super().__init__(spooled.file, size=0, filename=filename, headers=headers)
+        self.spooled = spooled
+        self.taken = False
+
+    def receive(self, chunk: bytes):
+        spooled = self.spooled
+        limit = UPLOAD_LIMITS[spooled.kind]
+        if spooled.size + len(chunk) > limit:
+            raise UploadRejected(413, f"{spooled.kind} upload exceeds {limit} bytes")
+        spooled._write(chunk)
+        self.size = spooled.size
+        if spooled.format is None and spooled.size >= 16:
+            self.check_format()
+
+    def check_format(self):
+        spooled = self.spooled
+        spooled.file.seek(0)
+        header = spooled.file.read(16)
+        spooled.file.seek(0, os.SEEK_END)
+        fmt = detect_format(spooled.kind, header)
+        if fmt not in ALLOWED_FORMATS[spooled.kind]:
+            raise UploadRejected(415, f"Unsupported {spooled.kind} format")
+        spooled.format = fmt
+
+    def take(self):
+        """Hand the spool over (the caller closes it); None when empty."""
+        self.taken = True
+        if not self.spooled.size:
+            self.spooled.close()
+            return None
+        return self.spooled
+
+    async def close(self):
+        if not self.taken:
+            self.spooled.close()
+
+
+class UploadFormParser(MultiPartParser):
+    """Starlette's multipart parser, with file parts spooled as ParsedUploads."""
+
+    def on_headers_finished(self):
+        super().on_headers_finished()
+        part = self._current_part
+        if part.file is None:
+            return
+        kind = UPLOAD_FIELDS.get(part.field_name)
+        if kind is None:
+            raise UploadRejected(400, f"Unexpected upload field: {part.field_name}")
+        # Nothing was written to Starlette's own spool yet
+        part.file.file.close()
+        part.file = ParsedUpload(SpooledUpload(kind, None), part.file.filename,
+                                 part.file.headers)
+        self._files_to_close_on_error.append(part.file.spooled.file)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        part = self._current_part
+        if not isinstance(part.file, ParsedUpload):
+            return super().on_part_data(data, start, end)
+        part.file.receive(data[start:end])
+
+    def on_part_end(self):
+        part = self._current_part
+        if isinstance(part.file, ParsedUpload):
+            if part.file.spooled.size and part.file.spooled.format is None:
+                part.file.check_format()
+        super().on_part_end()
+
+
+class UploadRequest(Request):
+    async def form(self, **kwargs):
+        content_type = self.headers.get("content-type", "").split(";")[0].strip().lower()
+        if self._form is not None or content_type != "multipart/form-data":
+            return await super().form(**kwargs)
+        try:
+            async with aclosing(self.stream()) as stream:
+                self._form = await UploadFormParser(self.headers, stream).parse()
+        except UploadRejected as e:
+            raise HTTPException(e.status, e.detail)
+        except MultiPartException as e:
+            raise HTTPException(400, e.message)
+        return self._form
+
+
+class UploadRoute(APIRoute):
+    """Route class whose form bodies are parsed by UploadFormParser."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def upload_handler(request: Request):
+            return await handler(UploadRequest(request.scope, request.receive))
+
+        return upload_handler
+
+
+# ============================
+# REQUEST BODY LIMIT (ASGI)
+# ============================
+class BodyLimitMiddleware:
+    """
+    Refuse oversized upload requests before the multipart parser spools
+    them: by Content-Length up front, or mid-stream for chunked bodies.
+    """
+
+    def __init__(self, app, limit: int = BODY_LIMIT, paths=LIMITED_PATHS):
+        self.app = app
+        self.limit = limit
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            return await self.app(scope, receive, send)
+
+        for name, value in scope.get("headers", []):
+            if name != b"content-length":
+                continue
+            if not value.strip().isdigit():
+                return await _reject(send, 400, "Malformed Content-Length")
+            if int(value) > self.limit:
+                return await _reject(send, 413, "Request body too large")
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    raise UploadRejected(413, "Request body too large")
+            return message
+
+        try:
+            await self.app(scope, limited_receive, send)
+        except UploadRejected as e:
+            await _reject(send, e.status, e.detail)
+
+
+async def _reject(send, status: int, detail: str):
+    body = ('{"detail": "%s"}' % detail).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close")],
+    })
+    await send({"type": "http.response.body", "body": body})